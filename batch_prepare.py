@@ -0,0 +1,206 @@
+# FILE: batch_prepare.py (Prepare levels for many players at once, e.g. a nightly pre-generation run)
+
+"""Batch level preparation.
+
+Reads player IDs from a file or stdin (one per line, streamed, so the list can be arbitrarily long)
+and runs the same fetch persona -> decide knobs -> generate steps as ``prepare_level.py``, but
+concurrently: personas are fetched on a pool of ``fetch_workers`` threads sharing one pooled HTTP
+session, returning players are tuned by the fitted difficulty model in cohorts of ``cohort_size``
+(one trait matrix and one ``recommend`` per cohort), and adventures are generated on a smaller pool sized for the LLM's rate limits. Players
+whose generation request is identical (same prompt, or with ``--bucket`` the same trait bucket)
+share one LLM call. Each player's instructions are written atomically to
+``<out_dir>/<player_id>-<hash>.json`` (the player ID with unsafe characters replaced, plus a short
+hash of the raw ID so distinct IDs never share a file), with no summary screen or pauses, and
+progress and throughput are reported as the batch runs. A player whose persona cannot be fetched
+(backend down, no cached copy) fails rather than getting a default-persona level, so
+``--skip-existing`` retries them on the next run. At most ``max_in_flight`` players are held in
+memory at once.
+
+Usage: python batch_prepare.py players.txt [--out-dir levels] [--fetch-workers 32] [--generate-workers 4] [--bucket]
+       cat players.txt | python batch_prepare.py - --skip-existing
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+
+from content_pool import StubModel, bucket_key, bucket_persona, is_adventure_valid
+from prepare_level import build_generation_prompt, decide_knobs, fetch_persona_from_supermemory, generate_llm_content, get_difficulty_model, get_persona_cache
+
+OUT_DIR = os.path.join(os.path.dirname(__file__), "levels")
+MAX_REMEMBERED_GENERATIONS = 4096
+_UNSAFE_FILENAME = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def _errors_only(message):
+    if "ERROR" in message: print(message)
+
+
+def level_path(out_dir, player_id):
+    digest = hashlib.sha1(player_id.encode("utf-8")).hexdigest()[:10]
+    return os.path.join(out_dir, f"{_UNSAFE_FILENAME.sub('_', player_id)[:64]}-{digest}.json")
+
+
+def read_player_ids(source):
+    """Yield stripped, non-empty, non-comment lines from a path or ``-`` (stdin)."""
+    stream = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        for line in stream:
+            player_id = line.strip()
+            if player_id and not player_id.startswith("#"): yield player_id
+    finally:
+        if stream is not sys.stdin: stream.close()
+
+
+class BatchPreparer:
+    def __init__(self, out_dir=OUT_DIR, *, model=None, fetch_workers=32, generate_workers=4, max_in_flight=1024, cohort_size=256, bucket=False, skip_existing=False):
+        self.out_dir = out_dir
+        self.model = model
+        self.bucket = bucket
+        self.skip_existing = skip_existing
+        self.cohort_size = max(1, min(cohort_size, max_in_flight))  # a cohort holds its players' in-flight slots
+        self.fetch_pool = ThreadPoolExecutor(fetch_workers, thread_name_prefix="persona")
+        self.generate_pool = ThreadPoolExecutor(generate_workers, thread_name_prefix="generate")
+        self.counters = {"queued": 0, "written": 0, "skipped": 0, "failed": 0, "no_persona": 0, "generated": 0, "deduplicated": 0}
+        self.started_at = None
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._generations = OrderedDict()  # dedup key -> Future of the generated content
+        self._cohort = []  # (player_id, persona) waiting for the difficulty model
+        self._lock = threading.Lock()
+        # One keep-alive connection per fetch thread instead of requests' default pool of 10.
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=fetch_workers)
+        persona_cache = get_persona_cache()  # created here, before any fetch thread can race to create it
+        persona_cache.session.mount("http://", adapter); persona_cache.session.mount("https://", adapter)
+        os.makedirs(out_dir, exist_ok=True)
+
+    def _count(self, name, amount=1):
+        with self._lock: self.counters[name] += amount
+
+    def submit(self, player_id):
+        """Queue one player; blocks while `max_in_flight` players are already being prepared."""
+        if self.started_at is None: self.started_at = time.perf_counter()
+        if self.skip_existing and os.path.exists(level_path(self.out_dir, player_id)):
+            self._count("skipped"); return
+        self._slots.acquire()
+        self._count("queued")
+        self.fetch_pool.submit(self._prepare, player_id)
+
+    def _prepare(self, player_id):
+        try:
+            persona, is_new_player = fetch_persona_from_supermemory(player_id, log=_errors_only)
+            if persona is None:
+                self._count("no_persona"); self._count("failed"); self._slots.release(); return
+            if not is_new_player and get_difficulty_model() is not None:
+                with self._lock:
+                    self._cohort.append((player_id, persona))
+                    if len(self._cohort) < self.cohort_size: return
+                    cohort, self._cohort = self._cohort, []
+                self._tune(cohort); return
+            knobs, _ = decide_knobs(persona, is_new_player, log=_errors_only)
+            self._generate_for(player_id, persona, knobs)
+        except Exception as e:
+            print(f"AGENT ERROR: Could not prepare a level for '{player_id}'. Error: {e}")
+            self._count("failed"); self._slots.release()
+
+    def _tune(self, cohort):
+        """Knobs for a cohort of returning players from one difficulty-model pass, then their generations."""
+        try:
+            all_knobs = get_difficulty_model().knobs_for_cohort([persona for _, persona in cohort])
+        except Exception as e:
+            print(f"AGENT ERROR: Could not tune knobs for {len(cohort)} player(s). Error: {e}")
+            self._count("failed", len(cohort))
+            for _ in cohort: self._slots.release()
+            return
+        for (player_id, persona), knobs in zip(cohort, all_knobs): self._generate_for(player_id, persona, knobs)
+
+    def _generate_for(self, player_id, persona, knobs):
+        self._generation(persona).add_done_callback(lambda future: self._finish(player_id, persona, knobs, future))
+
+    def _generation(self, persona):
+        """The (possibly shared) generation future for `persona`."""
+        key = bucket_key(persona.get('traits', {})) if self.bucket else build_generation_prompt(persona)
+        with self._lock:
+            future = self._generations.get(key)
+            if future is not None:
+                self.counters["deduplicated"] += 1; self._generations.move_to_end(key); return future
+            future = self.generate_pool.submit(self._generate, key, bucket_persona(key) if self.bucket else persona)
+            self._generations[key] = future
+            while len(self._generations) > MAX_REMEMBERED_GENERATIONS: self._generations.popitem(last=False)
+        return future
+
+    def _generate(self, key, persona):
+        content = generate_llm_content(persona, self.model, log=_errors_only)
+        if is_adventure_valid(content):
+            self._count("generated"); return content
+        # Forget failures so the next player with this request tries again.
+        with self._lock: self._generations.pop(key, None)
+        return None
+
+    def _finish(self, player_id, persona, knobs, future):
+        try:
+            content = future.result()
+            if content is None: self._count("failed"); return
+            path = level_path(self.out_dir, player_id); tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"meta": {"player_id": player_id, "traits": persona.get('traits', {})}, "knobs": knobs, "content": content}, f, indent=2)
+            os.replace(tmp_path, path)
+            self._count("written")
+        except Exception as e:
+            print(f"AGENT ERROR: Could not write the level for '{player_id}'. Error: {e}")
+            self._count("failed")
+        finally:
+            self._slots.release()
+
+    def progress(self):
+        elapsed = time.perf_counter() - (self.started_at or time.perf_counter())
+        with self._lock: c = dict(self.counters)
+        done = c["written"] + c["failed"]
+        return (f"BATCH: {done}/{c['queued']} done ({c['written']} written, {c['failed']} failed, {c['no_persona']} of them without a persona, {c['skipped']} skipped), "
+                f"{c['generated']} generated, {c['deduplicated']} deduplicated, {done / elapsed if elapsed else 0.0:.1f} players/s")
+
+    def close(self):
+        """Wait for every queued player; fetches finish first since they feed the last cohort and the generation pool."""
+        self.fetch_pool.shutdown(wait=True)
+        with self._lock: cohort, self._cohort = self._cohort, []
+        if cohort: self._tune(cohort)
+        self.generate_pool.shutdown(wait=True)
+
+
+def _report_progress(preparer, interval, stop):
+    while not stop.wait(interval): print(preparer.progress(), flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prepare game_instructions files for many players concurrently.")
+    parser.add_argument("players", help="file with one player ID per line, or '-' for stdin")
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    parser.add_argument("--fetch-workers", type=int, default=32)
+    parser.add_argument("--generate-workers", type=int, default=4)
+    parser.add_argument("--max-in-flight", type=int, default=1024)
+    parser.add_argument("--cohort-size", type=int, default=256, help="returning players tuned by the difficulty model per pass")
+    parser.add_argument("--bucket", action="store_true", help="share one adventure per persona trait bucket instead of per exact persona")
+    parser.add_argument("--skip-existing", action="store_true", help="leave players that already have a level file alone")
+    parser.add_argument("--stub", action="store_true", help="generate canned adventures offline instead of calling the LLM")
+    parser.add_argument("--progress", type=float, default=5.0, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    preparer = BatchPreparer(args.out_dir, model=StubModel() if args.stub else None, fetch_workers=args.fetch_workers, generate_workers=args.generate_workers, max_in_flight=args.max_in_flight, cohort_size=args.cohort_size, bucket=args.bucket, skip_existing=args.skip_existing)
+    stop = threading.Event()
+    threading.Thread(target=_report_progress, args=(preparer, args.progress, stop), daemon=True).start()
+    try:
+        for player_id in read_player_ids(args.players): preparer.submit(player_id)
+        preparer.close()
+    finally:
+        stop.set()
+    print(preparer.progress())
+    print(f"AGENT: Persona cache {get_persona_cache().stats()}.")
+    sys.exit(1 if preparer.counters["failed"] else 0)
@@ -0,0 +1,341 @@
+# FILE: benchmarks.py (Offline performance benchmarks with a stored baseline to compare against)
+
+"""Benchmark suite.
+
+Runs entirely offline: the LLM is ``content_pool.StubModel``, the Supermemory backend is a local
+HTTP stand-in on 127.0.0.1, and every spool, archive, cache and log file goes to a temporary
+directory. Each benchmark returns named metrics, and the suffix says which way is better:
+``_per_s`` is higher-is-better; ``_ms``, ``_us`` and ``_percent`` are lower-is-better. Every
+benchmark runs ``--repeat`` times and the median of each metric is kept.
+
+    qte            CPU use and keystroke-to-handler latency of the QTE loop, through a pseudo-terminal
+    render         typewriter and clear_screen throughput, and CPU use of an animated typewriter
+    level_load     game_instructions.json parse + validation, cold and from the compile cache
+    report         generate_output_json and submit_run_report payload build and hand-off cost
+    sm_logger      log_supermemory_response entries per second, submitted and written
+    level_prep     persona fetch (stub backend) + knobs + stub LLM generation and JSON parse
+
+Results are written to ``bench_results.json``. With a baseline (``bench_baseline.json``, created
+with ``--save-baseline``), each metric is compared with it and the run exits 1 if any got worse
+by more than ``--tolerance``.
+
+Usage: python benchmarks.py [--only qte render] [--repeat 5] [--quick]
+       python benchmarks.py --save-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import game_engine
+import prepare_level
+import report_archive
+import sm_logger
+from config import Config, set_config
+from content_pool import STUB_ADVENTURE, StubModel
+from keyboard_input import KeyboardInput
+from level_compiler import compile_level, load_level
+from persona_cache import PersonaCache
+from renderer import Renderer
+from report_outbox import ReportOutbox
+from session_io import SessionIO, run_sync
+
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), "bench_results.json")
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "bench_baseline.json")
+DEFAULT_TOLERANCE = 0.25
+HIGHER_IS_BETTER = ("_per_s",)
+LOWER_IS_BETTER = ("_ms", "_us", "_percent")
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register `func(workdir, quick)` returning ``{metric: value}`` as benchmark `name`."""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _rate(func, count):
+    """Calls per second of `func()` over `count` calls."""
+    started = time.perf_counter()
+    for _ in range(count): func()
+    return count / (time.perf_counter() - started)
+
+
+# --- Offline stand-ins ---
+class _StubBackend(BaseHTTPRequestHandler):
+    """Acknowledges /sm/save posts and serves a fixed persona from /sm/personas."""
+    persona = {"total": 1, "items": [{"persona": {"traits": {"aggression": 0.7, "stealth": 0.4, "curiosity": 0.6, "puzzle_affinity": 0.5, "independence": 0.5, "resilience": 0.3, "goal_focus": 0.6}}}]}
+
+    def _reply(self, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200); self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(data))); self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._reply(self.persona)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply({"ok": True})
+
+    def log_message(self, *args):
+        pass
+
+
+class _TypedKeyboard:
+    """A real ``KeyboardInput`` reading a pseudo-terminal that a typist thread writes `presses` of
+    `char` into at `rate` per second, so the keys go through selectors, termios, ``os.read`` and UTF-8
+    decoding like a player's would. Records each key's latency from the write to the handler."""
+
+    def __init__(self, char, presses, rate):
+        self.char = char; self.presses = presses; self.rate = rate
+        self.latencies = []
+        self._written = []
+        self._writer, reader = os.openpty() if hasattr(os, "openpty") else os.pipe()
+        self._stream = open(reader, "rb", buffering=0)
+        self._keyboard = KeyboardInput(stream=self._stream)
+
+    def _type(self):
+        data = self.char.encode("utf-8")
+        for _ in range(self.presses):
+            time.sleep(1.0 / self.rate)
+            self._written.append(time.monotonic()); os.write(self._writer, data)
+
+    def __enter__(self):
+        self._keyboard.__enter__()
+        threading.Thread(target=self._type, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._keyboard.__exit__(*exc_info)
+        os.close(self._writer); self._stream.close()
+        return False
+
+    async def next_event(self, deadline):
+        event = self._keyboard.next_event(deadline)
+        if event is not None: self.latencies.append(time.monotonic() - self._written[len(self.latencies)])
+        return event
+
+
+class _BenchIO(SessionIO):
+    """Renders to /dev/null, answers every prompt with "1", never sleeps."""
+
+    def __init__(self, stream, keyboard=None):
+        self.out = Renderer(stream=stream, instant=True, allow_skip=False)
+        self._keyboard = keyboard
+
+    async def line(self, prompt=""):
+        return "1"
+
+    def keyboard(self):
+        return self._keyboard
+
+    def now(self):
+        return time.monotonic()
+
+    async def sleep(self, seconds):
+        pass
+
+
+def _level_document():
+    return {"meta": {"player_id": "bench_player", "traits": _StubBackend.persona["items"][0]["persona"]["traits"]}, "knobs": {"enemy_count": 3, "enemy_speed": 1.0}, "content": STUB_ADVENTURE}
+
+
+def _played_state(io):
+    """A GameState with a realistic amount of stats and events behind it."""
+    state = game_engine.GameState("bench_player", 1, seed=7, io=io)
+    for scene in range(4):
+        state.events.scene_enter(scene, "QTE"); state.events.combat_start()
+        for press in range(1, 9): state.events.combat_press(press)
+        state.events.combat_end(True); state.increment_stat('combats_initiated'); state.increment_stat('combats_won'); state.events.scene_exit()
+    state.events.death(); state.increment_stat('deaths'); state.increment_stat('retries')
+    state.run_outcome['result'] = 'win'; state.stats['time_s'] = 120
+    return state
+
+
+# --- Benchmarks ---
+@benchmark("qte")
+def bench_qte(workdir, quick):
+    presses, rate = (100, 500) if quick else (400, 500)
+    keyboard = _TypedKeyboard("s", presses, rate)
+    with open(os.devnull, "w") as devnull:
+        state = game_engine.GameState("bench_player", 1, seed=7, io=_BenchIO(devnull, keyboard))
+        challenge = {"type": "QTE", "key": "S", "presses": presses, "time_limit": 10 * presses / rate}
+        wall, cpu = time.perf_counter(), time.process_time()
+        if not run_sync(game_engine.run_challenge(state, challenge)): raise RuntimeError("the scripted QTE was lost")
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    latencies = [seconds * 1e6 for seconds in keyboard.latencies]
+    return {"qte_cpu_percent": 100.0 * cpu / wall, "qte_latency_p50_us": _percentile(latencies, 0.5), "qte_latency_p99_us": _percentile(latencies, 0.99)}
+
+
+@benchmark("render")
+def bench_render(workdir, quick):
+    paragraph = "The dragon's shadow sweeps across the bridge as the torches gutter and die. " * 6
+    count = 2000 if quick else 10000
+    with open(os.devnull, "w") as devnull:
+        instant = Renderer(stream=devnull, instant=True, allow_skip=False)
+        typewriter_chars = _rate(lambda: instant.typewriter(paragraph), count) * len(paragraph)
+        clears = _rate(instant.clear_screen, count)
+        animated = Renderer(stream=devnull, instant=False, allow_skip=False)
+        text = paragraph[:200]; delay = 0.002  # 0.4 s of animation
+        wall, cpu = time.perf_counter(), time.process_time()
+        animated.typewriter(text, delay)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return {"typewriter_chars_per_s": typewriter_chars, "clear_screen_per_s": clears, "typewriter_animated_cpu_percent": 100.0 * cpu / wall}
+
+
+@benchmark("level_load")
+def bench_level_load(workdir, quick):
+    document = _level_document()
+    path = os.path.join(workdir, "game_instructions.json")
+    with open(path, "w", encoding="utf-8") as f: json.dump(document, f, indent=2)
+    count = 500 if quick else 3000
+    cache_dir = os.path.join(workdir, "level_cache")
+    load_level(path, cache_dir=cache_dir)  # populate the compile cache
+    return {"compile_level_per_s": _rate(lambda: compile_level(document), count),
+            "load_level_cold_per_s": _rate(lambda: load_level(path, cache_dir=None), count),
+            "load_level_cached_per_s": _rate(lambda: load_level(path, cache_dir=cache_dir), count)}
+
+
+@benchmark("report")
+def bench_report(workdir, quick):
+    count = 300 if quick else 2000
+    with open(os.devnull, "w") as devnull:
+        state = _played_state(_BenchIO(devnull))
+        knobs = _level_document()["knobs"]; traits = _level_document()["meta"]["traits"]
+        build_rate = _rate(lambda: game_engine.generate_output_json(state, knobs), count * 10)
+        durations = []
+        for _ in range(count):
+            state.session_id = f"sess_{len(durations):012x}"
+            started = time.perf_counter()
+            game_engine.submit_run_report(state, knobs, game_engine.GAME_CONTEXT, traits)
+            durations.append((time.perf_counter() - started) * 1000)
+    game_engine.get_report_outbox().flush(timeout=30.0)
+    return {"generate_output_json_per_s": build_rate, "submit_run_report_p50_ms": _percentile(durations, 0.5), "submit_run_report_p99_ms": _percentile(durations, 0.99)}
+
+
+@benchmark("sm_logger")
+def bench_sm_logger(workdir, quick):
+    count = 5000 if quick else 50000
+    path = os.path.join(workdir, "logs", f"sm_responses_{time.monotonic_ns()}.log")
+    body = {"status": "ok", "session_id": "sess_0123456789ab", "persona": _StubBackend.persona}
+    started = time.perf_counter()
+    for _ in range(count): sm_logger.log_supermemory_response(body, filename=path)
+    submitted = time.perf_counter() - started
+    sm_logger.flush_logs(timeout=60.0)
+    written = time.perf_counter() - started
+    return {"log_submit_per_s": count / submitted, "log_written_per_s": count / written}
+
+
+@benchmark("level_prep")
+def bench_level_prep(workdir, quick):
+    count = 50 if quick else 300
+    model = StubModel(seed=1)
+    def prepare(player_id):
+        persona, is_new_player = prepare_level.fetch_persona_from_supermemory(player_id, log=lambda message: None)
+        prepare_level.decide_knobs(persona, is_new_player, log=lambda message: None)
+        if prepare_level.generate_llm_content(persona, model, log=lambda message: None) is None: raise RuntimeError("stub generation failed")
+    uncached = _rate(lambda: prepare(f"bench_{time.monotonic_ns()}"), count)  # a new player each call: persona fetched from the stub backend
+    cached = _rate(lambda: prepare("bench_player"), count * 10)
+    return {"level_prep_uncached_per_s": uncached, "level_prep_cached_per_s": cached}
+
+
+# --- Harness ---
+def _stand_ins(workdir):
+    """Point every network and disk side effect at the stub backend and `workdir`; returns the server."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubBackend)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    set_config(Config(backend_url=url, chronicle_api_key="bench", gemini_api_key="bench"))
+    game_engine.EVENTS_DIR = os.path.join(workdir, "events")
+    sm_logger.DEFAULT_LOG_FILE = os.path.join(workdir, "logs", "sm_responses.log")  # the outbox logs every /sm/save response
+    game_engine._report_outbox = ReportOutbox(f"{url}/sm/save", "bench", spool_dir=os.path.join(workdir, "spool")).start()
+    report_archive._archive = report_archive.ReportArchive(os.path.join(workdir, "archive"))
+    prepare_level._persona_cache = PersonaCache(f"{url}/sm/personas", api_key="bench", cache_dir=os.path.join(workdir, "personas"))
+    prepare_level._difficulty_model = None  # the hand-written thresholds, not whatever model is fitted locally
+    return server
+
+
+def run(names, repeat, quick):
+    workdir = tempfile.mkdtemp(prefix="chronicle-bench-")
+    server = _stand_ins(workdir)
+    results = {}
+    try:
+        for name in names:
+            runs = [BENCHMARKS[name](workdir, quick) for _ in range(repeat)]
+            results[name] = {metric: statistics.median(run[metric] for run in runs) for metric in runs[0]}
+            print(f"BENCH: {name} done", file=sys.stderr)
+    finally:
+        game_engine._report_outbox.close(timeout=5.0); server.shutdown(); server.server_close()
+        sm_logger.flush_logs(timeout=10.0)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def _commit():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError: return None
+
+
+def compare(results, baseline, tolerance):
+    """Rows of (benchmark, metric, value, baseline value, relative change, regressed)."""
+    rows = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(name, {}).get(metric)
+            if not before: rows.append((name, metric, value, None, None, False)); continue
+            change = (value - before) / before
+            if metric.endswith(HIGHER_IS_BETTER): regressed = change < -tolerance
+            elif metric.endswith(LOWER_IS_BETTER): regressed = change > tolerance
+            else: regressed = False
+            rows.append((name, metric, value, before, change, regressed))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite and compare it with a stored baseline.")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for a smoke test")
+    parser.add_argument("--out", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="also store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="relative slowdown allowed before a metric counts as a regression")
+    args = parser.parse_args()
+
+    results = run(args.only or list(BENCHMARKS), args.repeat, args.quick)
+    document = {"meta": {"recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "commit": _commit(), "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(), "repeat": args.repeat, "quick": args.quick}, "results": results}
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+    rows = compare(results, baseline["results"] if baseline else {}, args.tolerance)
+    document["comparison"] = {"baseline": os.path.basename(args.baseline) if baseline else None, "baseline_commit": baseline["meta"].get("commit") if baseline else None, "tolerance": args.tolerance,
+                              "regressions": [f"{name}.{metric}" for name, metric, *_, regressed in rows if regressed],
+                              "changes": {f"{name}.{metric}": change for name, metric, _, _, change, _ in rows if change is not None}}
+    with open(args.out, "w", encoding="utf-8") as f: json.dump(document, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f: json.dump({"meta": document["meta"], "results": results}, f, indent=2)
+
+    for name, metric, value, before, change, regressed in rows:
+        versus = f"  baseline {before:12.2f}  {change:+7.1%}{'  REGRESSED' if regressed else ''}" if change is not None else ""
+        print(f"{name:11} {metric:34} {value:12.2f}{versus}")
+    regressions = document["comparison"]["regressions"]
+    print(f"BENCH: Results written to '{args.out}'." + (f" Baseline saved to '{args.baseline}'." if args.save_baseline else ""))
+    if baseline: print(f"BENCH: {len(regressions)} regression(s) beyond {args.tolerance:.0%} against the baseline{': ' + ', '.join(regressions) if regressions else '.'}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,59 @@
+# FILE: config.py (Runtime configuration, read on first use instead of at import)
+
+"""Process-wide configuration.
+
+Nothing here runs at import: ``get_config()`` loads ``.env`` and the environment the first time
+something asks for a setting, and a missing key only fails when the feature that needs it is used
+(``config.require("gemini_api_key")`` when the LLM is first called, for example), so offline play,
+replays and tooling import the game modules without any keys set. Tools can install their own
+``Config`` with ``set_config`` before the first call.
+
+Environment: BACKEND_URL, CHRONICLE_API_KEY, GEMINI_API_KEY, GEMINI_MODEL, REPORT_BATCH_URL
+"""
+
+import os
+
+DEFAULT_BACKEND_URL = "http://192.168.0.199:7769"
+DEFAULT_GEMINI_MODEL = "gemini-pro-latest"
+ENVIRONMENT = {"backend_url": "BACKEND_URL", "chronicle_api_key": "CHRONICLE_API_KEY", "gemini_api_key": "GEMINI_API_KEY", "gemini_model": "GEMINI_MODEL", "report_batch_url": "REPORT_BATCH_URL"}
+
+
+class ConfigError(ValueError):
+    """A setting a feature needs is not configured."""
+
+
+class Config:
+    def __init__(self, backend_url=DEFAULT_BACKEND_URL, chronicle_api_key=None, gemini_api_key=None, gemini_model=DEFAULT_GEMINI_MODEL, report_batch_url=None):
+        self.backend_url = backend_url
+        self.chronicle_api_key = chronicle_api_key
+        self.gemini_api_key = gemini_api_key
+        self.gemini_model = gemini_model
+        self.report_batch_url = report_batch_url  # a backend endpoint taking {"serverInputs": [...]}; unset sends one report per POST
+
+    @classmethod
+    def from_env(cls, dotenv=True):
+        """Settings from the environment, after loading ``.env`` (which never overrides real variables)."""
+        if dotenv:
+            from dotenv import load_dotenv
+            load_dotenv()
+        defaults = cls()
+        return cls(**{name: os.getenv(variable) or getattr(defaults, name) for name, variable in ENVIRONMENT.items()})
+
+    def require(self, name):
+        value = getattr(self, name)
+        if not value: raise ConfigError(f"{ENVIRONMENT[name]} not found in the environment or .env file.")
+        return value
+
+
+_config = None
+def get_config():
+    """The process-wide configuration, read from ``.env`` and the environment on first use."""
+    global _config
+    if _config is None: _config = Config.from_env()
+    return _config
+
+
+def set_config(config):
+    global _config
+    _config = config
+    return config
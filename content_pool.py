@@ -0,0 +1,283 @@
+# FILE: content_pool.py (Pre-generated adventures keyed by persona trait buckets)
+
+"""A bounded pool of validated adventures so level preparation rarely waits on the LLM.
+
+Persona ``traits`` are quantized into buckets (low/mid/high per trait by default) and each bucket
+keeps up to ``per_bucket`` adventures on disk under ``cache/content_pool/``. ``take`` pops one in
+milliseconds and the background worker tops the bucket back up, using the bucket's centre traits as
+the persona. On a miss ``take_or_generate`` calls the LLM for the player and only queues the
+bucket's refill once that call is back, so a cold miss does not start the refill's LLM calls
+alongside the player's. Least recently used buckets are evicted past ``max_buckets``, which by
+default leaves room for every bucket. Refills still queued when the pool is closed are kept in
+``refills.pending`` and picked up by the next ``start()``, so an interactive run can exit without
+waiting for the LLM. Generation goes through a plain ``generate(persona) -> dict | None`` callable,
+so ``StubModel`` can stand in for Gemini when exercising the pool offline.
+
+Usage: python content_pool.py [--timeout 600]   (run the refills left pending by earlier runs)
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+import types
+
+from game_engine import is_scene_valid
+
+POOL_DIR = os.path.join(os.path.dirname(__file__), "cache", "content_pool")
+TRAIT_LEVELS = 3
+MAX_BUCKETS = TRAIT_LEVELS ** 7  # every bucket of the seven persona traits
+PENDING_FILE = "refills.pending"
+
+
+def _written_at(path):
+    try: return os.stat(path).st_mtime
+    except OSError: return 0.0
+
+
+def bucket_key(traits, levels=TRAIT_LEVELS):
+    """Quantize a traits dict into a stable string key, e.g. ``aggression=2,curiosity=1``."""
+    parts = []
+    for name in sorted(traits):
+        try: value = float(traits[name])
+        except (TypeError, ValueError): continue
+        parts.append(f"{name}={min(levels - 1, max(0, int(value * levels)))}")
+    return ",".join(parts)
+
+
+def bucket_persona(key, levels=TRAIT_LEVELS):
+    """The representative persona for a bucket: every trait at the centre of its level."""
+    traits = {}
+    for part in filter(None, key.split(",")):
+        name, level = part.split("=")
+        traits[name] = round((int(level) + 0.5) / levels, 3)
+    return {"traits": traits}
+
+
+def is_adventure_valid(content):
+    if not isinstance(content, dict) or not isinstance(content.get('title'), str): return False
+    scenes = content.get('scenes')
+    return isinstance(scenes, list) and len(scenes) > 0 and all(is_scene_valid(scene) for scene in scenes)
+
+
+class ContentPool:
+    def __init__(self, generate, *, per_bucket=3, max_buckets=MAX_BUCKETS, levels=TRAIT_LEVELS, pool_dir=POOL_DIR):
+        self.generate = generate
+        self.per_bucket = per_bucket
+        self.max_buckets = max_buckets
+        self.levels = levels
+        self.pool_dir = pool_dir
+        self.counters = {"hits": 0, "misses": 0, "generated": 0, "rejected": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._queued = set()
+        self._thread = None
+
+    # --- Storage ---
+    def _bucket_path(self, key):
+        return os.path.join(self.pool_dir, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".json")
+
+    def _load(self, key):
+        try:
+            with open(self._bucket_path(key), "r", encoding="utf-8") as fh: return json.load(fh)["adventures"]
+        except (OSError, ValueError, KeyError):
+            return []
+
+    @staticmethod
+    def _tmp_path(path):
+        # prepare_level, batch_prepare workers and background refills may share the pool directory.
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def _save(self, key, adventures):
+        os.makedirs(self.pool_dir, exist_ok=True)
+        path = self._bucket_path(key); tmp_path = self._tmp_path(path)
+        with open(tmp_path, "w", encoding="utf-8") as fh: json.dump({"bucket": key, "adventures": adventures}, fh)
+        os.replace(tmp_path, path)
+        paths = glob.glob(os.path.join(self.pool_dir, "*.json"))
+        if len(paths) <= self.max_buckets: return
+        for stale in sorted(paths, key=_written_at)[:len(paths) - self.max_buckets]:
+            try: os.remove(stale); self.counters["evicted"] += 1
+            except FileNotFoundError: pass  # evicted by another writer since the listing
+
+    def _load_pending(self):
+        try:
+            with open(os.path.join(self.pool_dir, PENDING_FILE), encoding="utf-8") as fh: return [key for key in fh.read().split("\n") if key]
+        except OSError:
+            return []
+
+    def _save_pending(self, keys):
+        path = os.path.join(self.pool_dir, PENDING_FILE)
+        if not keys:
+            try: os.remove(path)
+            except FileNotFoundError: pass
+            return
+        os.makedirs(self.pool_dir, exist_ok=True)
+        tmp_path = self._tmp_path(path)
+        with open(tmp_path, "w", encoding="utf-8") as fh: fh.write("\n".join(keys) + "\n")
+        os.replace(tmp_path, path)
+
+    def size(self, traits):
+        with self._lock: return len(self._load(bucket_key(traits, self.levels)))
+
+    # --- Consumer side ---
+    def _pop(self, key):
+        adventures = self._load(key)
+        adventure = adventures.pop(0) if adventures else None
+        if adventure is not None: self._save(key, adventures)
+        self.counters["hits" if adventure else "misses"] += 1
+        return adventure
+
+    def take(self, persona):
+        """Pop a ready adventure for `persona`'s bucket, or return None. Either way a refill is queued."""
+        key = bucket_key(persona.get('traits', {}), self.levels)
+        with self._lock: adventure = self._pop(key)
+        self._request(key)
+        return adventure
+
+    def take_or_generate(self, persona):
+        """``take``, or on a miss call the LLM for `persona` right away. Returns ``(content, hit)``.
+
+        While that call runs it holds the bucket's place in the refill queue; the refill is queued
+        once the player's adventure is back.
+        """
+        key = bucket_key(persona.get('traits', {}), self.levels)
+        with self._lock:
+            adventure = self._pop(key)
+            claimed = adventure is None and key not in self._queued
+            if claimed: self._queued.add(key)  # refills requested meanwhile fold into the one queued below
+        if adventure is not None:
+            self._request(key); return adventure, True
+        try:
+            return self.generate(persona), False
+        finally:
+            if claimed:
+                with self._lock: self._queued.discard(key)
+            self._request(key)
+
+    def add(self, persona, content):
+        """Validate `content` and file it under `persona`'s bucket. Returns False if rejected or full."""
+        if not is_adventure_valid(content):
+            with self._lock: self.counters["rejected"] += 1
+            return False
+        key = bucket_key(persona.get('traits', {}), self.levels)
+        with self._lock:
+            adventures = self._load(key)
+            if len(adventures) >= self.per_bucket: return False
+            adventures.append(content); self._save(key, adventures)
+        return True
+
+    # --- Refilling ---
+    def fill(self, persona, max_attempts=None):
+        """Synchronously generate adventures until `persona`'s bucket is full. Returns how many were added."""
+        key = bucket_key(persona.get('traits', {}), self.levels)
+        centre = bucket_persona(key, self.levels)
+        added, attempts = 0, 0
+        while self.size(centre['traits']) < self.per_bucket and attempts < (max_attempts or self.per_bucket * 2):
+            attempts += 1
+            content = self.generate(centre)
+            if content is None: continue
+            with self._lock: self.counters["generated"] += 1
+            added += self.add(centre, content)
+        return added
+
+    def request_refill(self, persona):
+        self._request(bucket_key(persona.get('traits', {}), self.levels))
+
+    def _request(self, key):
+        with self._lock:
+            if key in self._queued: return
+            self._queued.add(key)
+        self._requests.put(key)
+
+    def _run(self):
+        while True:
+            key = self._requests.get()
+            if key is None: break
+            try: self.fill(bucket_persona(key, self.levels))
+            except Exception as e: print(f"AGENT WARNING: Content pool refill failed: {e}")
+            finally:
+                with self._lock: self._queued.discard(key)
+                self._requests.task_done()
+
+    def start(self):
+        if self._thread is None:
+            for key in self._load_pending(): self._request(key)
+            self._thread = threading.Thread(target=self._run, name="content-pool", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self, timeout=None):
+        """Let queued refills finish for up to `timeout` seconds (0 returns at once), then stop the worker.
+
+        Refills not finished by then are saved for the next ``start()``. Returns how many were left.
+        """
+        if self._thread is None: return 0
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queued and (deadline is None or time.monotonic() < deadline): time.sleep(0.05)
+        with self._lock: left = sorted(self._queued)
+        try: self._save_pending(left)
+        except OSError as e: print(f"AGENT WARNING: Could not save pending content pool refills: {e}")
+        self._requests.put(None); self._thread.join(0.1); self._thread = None
+        return len(left)
+
+    def stats(self):
+        with self._lock: return dict(self.counters)
+
+
+class StubModel:
+    """Offline stand-in for ``genai.GenerativeModel``: returns canned adventures after `latency` seconds.
+
+    With ``stream=True`` the text arrives in `chunk_size` pieces with the latency spread across them,
+    like the SDK's streaming responses.
+    """
+
+    def __init__(self, adventures=None, latency=0.0, failure_rate=0.0, seed=None, chunk_size=64):
+        self.adventures = adventures or [STUB_ADVENTURE]
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.chunk_size = chunk_size
+        self.rng = random.Random(seed)
+
+    def _text(self):
+        if self.rng.random() < self.failure_rate: return "Sorry, I can't help with that."
+        return "```json\n" + json.dumps(self.rng.choice(self.adventures), indent=2) + "\n```"
+
+    def _stream(self, text):
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        for chunk in chunks:
+            if self.latency: time.sleep(self.latency / len(chunks))
+            yield types.SimpleNamespace(text=chunk)
+
+    def generate_content(self, prompt, stream=False):
+        text = self._text()
+        if stream: return self._stream(text)
+        if self.latency: time.sleep(self.latency)
+        return types.SimpleNamespace(text=text)
+
+
+STUB_ADVENTURE = {
+    "title": "The Stub Vault",
+    "scenes": [
+        {"intro_text": "A rusted gate blocks the way.", "challenge": {"type": "QTE", "key": "E", "presses": 8, "time_limit": 6.0}},
+        {"intro_text": "A sphinx of wire and gears blinks at you.", "challenge": {"type": "RIDDLE", "riddle_text": "What has keys but opens no locks?", "answer": "piano", "time_limit": 30, "hint_text": "It makes music."}},
+        {"intro_text": "The floor falls away into darkness.", "challenge": {"type": "JUMP_CHASM", "prompt": "Leap for the far ledge.", "success_chance": 0.7}},
+        {"intro_text": "Two doors, one warm, one cold.", "challenge": {"type": "DILEMMA", "options": ["Take the warm door.", "Take the cold door."]}},
+    ],
+}
+
+
+if __name__ == "__main__":
+    # Go through prepare_level so the refills use the same pool and LLM client as level preparation.
+    from prepare_level import content_pool
+
+    parser = argparse.ArgumentParser(description="Run the content pool refills left pending by earlier runs.")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds to spend before saving what is left for later")
+    args = parser.parse_args()
+
+    left = content_pool.start().close(timeout=args.timeout)
+    print(f"AGENT: Content pool {content_pool.stats()}; {left} refill(s) still pending.")
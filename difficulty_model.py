@@ -0,0 +1,202 @@
+# FILE: difficulty_model.py (Knobs fitted from historical run reports instead of fixed thresholds)
+
+"""Vectorized difficulty tuning.
+
+Historical run reports (``stats``, ``run_outcome``, ``config_used.knobs`` and the persona traits
+the knobs were chosen for, which only the local archive keeps) are loaded into NumPy arrays, and a ridge regression predicts a run's
+retries from the trait vector ``t``, the knob vector ``k`` and their interactions::
+
+    retries ~ b + t.w_t + k.w_k + t W k
+
+For a cohort of personas ``T`` (n x traits) and the knob settings seen in the history ``G``
+(m x knobs), every prediction at once is ``b + T w_t + G w_k + T W G^T``, an n x m matrix. Each
+persona gets the setting whose predicted retries are closest to the target, so scoring a whole
+cohort is one matrix expression and an ``argmin``. The fitted model is saved to
+``cache/difficulty_model.npz``; ``prepare_level.decide_knobs`` uses it when it exists and falls
+back to its hand-written thresholds otherwise (and always for new players).
+
+Reports only reach the backend for won runs, so the target is a retry rate (mean retries per
+completed run) rather than a win rate.
+
+Usage: python difficulty_model.py fit spool/run_reports logs/sm_responses.log [--target 1.0]
+       python difficulty_model.py fit --archive
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from report_archive import iter_reports
+
+TRAITS = ("aggression", "stealth", "curiosity", "puzzle_affinity", "independence", "resilience", "goal_focus")
+KNOBS = ("enemy_count", "enemy_speed")
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "cache", "difficulty_model.npz")
+DEFAULT_TARGET_RETRIES = 1.0
+DEFAULT_RIDGE = 1.0
+MIN_RECORDS = 50
+MIN_SUPPORT = 5  # runs a knob setting needs in the history before it can be recommended
+
+
+def trait_matrix(personas):
+    """Stack persona dicts (``{"traits": {...}}``) into an n x len(TRAITS) array; missing traits are 0.5."""
+    return np.array([[float(persona.get('traits', {}).get(name, 0.5)) for name in TRAITS] for persona in personas], dtype=np.float64).reshape(-1, len(TRAITS))
+
+
+def cached_traits(cache):
+    """A ``traits_for(player_id)`` that reads personas already in a PersonaCache, never the network."""
+    def traits_for(player_id):
+        data = cache.peek(player_id)
+        if not data: return None
+        if data.get('total', 0) > 0 and data['items'][0].get('persona'): return data['items'][0]['persona'].get('traits')
+        return None
+    return traits_for
+
+
+class RunHistory:
+    """Column arrays of historical runs: traits (n x T), knobs (n x K), retries, deaths, wins."""
+
+    def __init__(self, traits, knobs, retries, deaths, wins):
+        self.traits = traits; self.knobs = knobs; self.retries = retries; self.deaths = deaths; self.wins = wins
+
+    def __len__(self):
+        return len(self.retries)
+
+    @classmethod
+    def from_reports(cls, reports, traits_for=None):
+        """Build from report dicts. Traits come from ``config_used.persona_traits`` (older reports) or `traits_for(player_id)`;
+        reports with neither, or without numeric knobs, are skipped."""
+        traits, knobs, retries, deaths, wins = [], [], [], [], []
+        for report in reports:
+            config = report['config_used']
+            persona_traits = config.get('persona_traits') or (traits_for(report.get('player_id')) if traits_for else None)
+            try: knob_row = [float(config['knobs'][name]) for name in KNOBS]
+            except (KeyError, TypeError, ValueError): continue
+            if not isinstance(persona_traits, dict): continue
+            traits.append([float(persona_traits.get(name, 0.5)) for name in TRAITS]); knobs.append(knob_row)
+            retries.append(report['stats'].get('retries', 0)); deaths.append(report['stats'].get('deaths', 0))
+            wins.append(report.get('run_outcome', {}).get('result') == 'win')
+        return cls(np.array(traits, dtype=np.float64).reshape(-1, len(TRAITS)), np.array(knobs, dtype=np.float64).reshape(-1, len(KNOBS)),
+                   np.array(retries, dtype=np.float64), np.array(deaths, dtype=np.float64), np.array(wins, dtype=bool))
+
+    @classmethod
+    def from_archive(cls, archive):
+        """Build straight from a ReportArchive's columns; rows without persona traits or numeric knobs are skipped."""
+        parts = []
+        for segment in archive.segments():
+            rows = archive.rows_in(segment)
+            if not rows: continue
+            traits = np.stack([archive.column(segment, f"trait_{name}", rows) for name in TRAITS], axis=1).astype(np.float64)
+            knob_codes = np.asarray(archive.column(segment, "knobs", rows))
+            codes, inverse = np.unique(knob_codes, return_inverse=True)
+            knob_table = np.full((len(codes), len(KNOBS)), np.nan)
+            for i, code in enumerate(codes):
+                try: knob_table[i] = [float(archive.decode("knobs", int(code))[name]) for name in KNOBS]
+                except (KeyError, TypeError, ValueError): pass
+            knobs = knob_table[inverse.reshape(-1)]
+            keep = ~np.isnan(traits).all(axis=1) & ~np.isnan(knobs).any(axis=1)
+            parts.append((np.where(np.isnan(traits), 0.5, traits)[keep], knobs[keep], np.asarray(archive.column(segment, "retries", rows))[keep],
+                          np.asarray(archive.column(segment, "deaths", rows))[keep], np.asarray(archive.column(segment, "win", rows))[keep]))
+        if not parts: return cls.from_reports([])
+        traits, knobs, retries, deaths, wins = (np.concatenate(column) for column in zip(*parts))
+        return cls(traits, knobs, retries.astype(np.float64), deaths.astype(np.float64), wins)
+
+
+def design_matrix(traits, knobs):
+    """Rows of [1, t, k, t (x) k] for paired trait and knob rows."""
+    n = len(traits)
+    interactions = (traits[:, :, None] * knobs[:, None, :]).reshape(n, -1)
+    return np.hstack([np.ones((n, 1)), traits, knobs, interactions])
+
+
+class DifficultyModel:
+    def __init__(self, intercept, trait_weights, knob_weights, interaction, knob_grid, target=DEFAULT_TARGET_RETRIES, records=0):
+        self.intercept = float(intercept)
+        self.trait_weights = trait_weights    # (T,)
+        self.knob_weights = knob_weights      # (K,)
+        self.interaction = interaction        # (T, K)
+        self.knob_grid = knob_grid            # (m, K) settings seen often enough in the history
+        self.target = target
+        self.records = records
+
+    @classmethod
+    def fit(cls, history, target=DEFAULT_TARGET_RETRIES, ridge=DEFAULT_RIDGE, min_support=MIN_SUPPORT):
+        if len(history) < MIN_RECORDS: raise ValueError(f"need at least {MIN_RECORDS} usable run reports, got {len(history)}")
+        settings, counts = np.unique(history.knobs, axis=0, return_counts=True)
+        knob_grid = settings[counts >= min_support]
+        if len(knob_grid) < 2: raise ValueError("the history needs at least two knob settings with enough runs to compare")
+        X = design_matrix(history.traits, history.knobs)
+        penalty = np.full(X.shape[1], ridge); penalty[0] = 0.0  # leave the intercept unpenalized
+        beta = np.linalg.solve(X.T @ X + np.diag(penalty), X.T @ history.retries)
+        t, k = len(TRAITS), len(KNOBS)
+        return cls(beta[0], beta[1:1 + t], beta[1 + t:1 + t + k], beta[1 + t + k:].reshape(t, k), knob_grid, target, len(history))
+
+    def predict(self, traits):
+        """Predicted retries for every persona (rows of `traits`) at every knob setting: an n x m matrix."""
+        grid = self.knob_grid
+        return self.intercept + (traits @ self.trait_weights)[:, None] + (grid @ self.knob_weights)[None, :] + traits @ self.interaction @ grid.T
+
+    def recommend(self, traits):
+        """Knob rows (n x K) whose predicted retries are closest to the target, for a whole cohort at once."""
+        return self.knob_grid[np.abs(self.predict(traits) - self.target).argmin(axis=1)]
+
+    def knobs_for(self, persona):
+        return self.knobs_for_cohort([persona])[0]
+
+    def knobs_for_cohort(self, personas):
+        """Knob dicts for many personas from one trait matrix and one ``recommend``."""
+        return [{name: (int(value) if name == "enemy_count" else round(float(value), 3)) for name, value in zip(KNOBS, row)} for row in self.recommend(trait_matrix(personas))]
+
+    def save(self, path=MODEL_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, intercept=self.intercept, trait_weights=self.trait_weights, knob_weights=self.knob_weights, interaction=self.interaction,
+                 knob_grid=self.knob_grid, target=self.target, records=self.records, traits=np.array(TRAITS), knobs=np.array(KNOBS))
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        """The saved model, or None if there is none or it was fitted for different traits/knobs."""
+        try:
+            with np.load(path) as data:
+                if tuple(data['traits']) != TRAITS or tuple(data['knobs']) != KNOBS: return None
+                return cls(data['intercept'], data['trait_weights'], data['knob_weights'], data['interaction'], data['knob_grid'], float(data['target']), int(data['records']))
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the difficulty model from historical run reports.")
+    parser.add_argument("command", choices=["fit"])
+    parser.add_argument("paths", nargs="*", help="report JSON/NDJSON files, directories of them, or sm_logger .log files")
+    parser.add_argument("--archive", nargs="?", const=True, default=None, metavar="DIR", help="fit from the run-report archive (report_archive.py) instead of parsing reports")
+    parser.add_argument("--target", type=float, default=DEFAULT_TARGET_RETRIES, help="mean retries per run to aim for")
+    parser.add_argument("--ridge", type=float, default=DEFAULT_RIDGE)
+    parser.add_argument("--min-support", type=int, default=MIN_SUPPORT)
+    parser.add_argument("--persona-cache", action="store_true", help="look up traits missing from reports in the local persona cache")
+    parser.add_argument("--out", default=MODEL_PATH)
+    args = parser.parse_args()
+
+    traits_for = None
+    if args.persona_cache:
+        from persona_cache import PersonaCache
+        traits_for = cached_traits(PersonaCache(None))
+    if args.archive:
+        from report_archive import ARCHIVE_DIR, ReportArchive
+        history = RunHistory.from_archive(ReportArchive(ARCHIVE_DIR if args.archive is True else args.archive))
+    else:
+        if not args.paths: parser.error("give report paths or --archive")
+        history = RunHistory.from_reports(iter_reports(args.paths), traits_for)
+    try:
+        model = DifficultyModel.fit(history, args.target, args.ridge, args.min_support)
+    except ValueError as e:
+        print(f"AGENT ERROR: Could not fit the difficulty model: {e}"); raise SystemExit(1)
+    predictions = model.predict(history.traits)
+    best = np.abs(predictions - model.target).argmin(axis=1)
+    chosen, predicted = model.knob_grid[best], predictions[np.arange(len(history)), best]
+    print(f"AGENT: Fitted on {len(history)} runs (observed mean retries {history.retries.mean():.2f}); {len(model.knob_grid)} knob settings eligible.")
+    for setting in model.knob_grid:
+        share = np.all(chosen == setting, axis=1).mean()
+        print(f"  {dict(zip(KNOBS, setting.tolist()))}: recommended for {share:.0%} of these players")
+    print(f"AGENT: Predicted mean retries at the recommended knobs: {predicted.mean():.2f} (target {model.target}). Saved to '{model.save(args.out)}'.")
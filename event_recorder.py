@@ -0,0 +1,165 @@
+# FILE: event_recorder.py (Per-session gameplay event stream)
+
+"""Timestamped gameplay events in a compact, bounded ring buffer.
+
+Each event is four numbers stored column-wise in ``array`` buffers (time offset, kind, scene,
+value) instead of one dict per event, and the buffer stops growing at ``capacity`` by overwriting
+the oldest entries. Counters and running sums are updated as events arrive, so ``digest`` and
+``performance_summary`` stay exact even after the ring has wrapped. The stream exports to NDJSON
+next to the run report.
+"""
+
+import json
+import os
+import time
+from array import array
+
+# Kind names double as the events_digest "type" strings sent in run reports.
+KINDS = ("scene.enter", "scene.exit", "combat.start", "combat.press", "combat.win", "combat.loss", "puzzle.attempt", "puzzle.solve", "puzzle.fail", "hint.offer", "hint.use", "jump.land", "jump.fall", "collectible.found", "dilemma.choice", "death", "fail.retry")
+KIND = {name: code for code, name in enumerate(KINDS)}
+# The kinds summarized in a run report's events_digest; the rest stay in the local event export.
+DIGEST_KINDS = ("death", "fail.retry", "combat.start", "combat.win", "puzzle.attempt")
+CHALLENGE_CODES = ("QTE", "RIDDLE", "SEQUENCE_MEMORY", "DILEMMA", "JUMP_CHASM", "FIND_COLLECTIBLE")
+DEFAULT_CAPACITY = 16384
+BOSS_SCENE = -1
+
+
+def challenge_code(challenge_type):
+    return CHALLENGE_CODES.index(challenge_type) if challenge_type in CHALLENGE_CODES else len(CHALLENGE_CODES)
+
+
+class EventRecorder:
+    def __init__(self, capacity=DEFAULT_CAPACITY, scene_count=None, clock=time.monotonic):
+        self.capacity = capacity
+        self.scene_count = scene_count
+        self.clock = clock
+        self.origin = clock()
+        self.times = array('d')
+        self.kinds = array('B')
+        self.scenes = array('h')
+        self.values = array('d')
+        self.head = 0
+        self.dropped = 0
+        self.counts = [0] * len(KINDS)
+        self.deaths = [0] * (len(CHALLENGE_CODES) + 1)  # per challenge code; the last slot is "unknown"
+        self.scene = None
+        self.scene_type = None
+        self.scenes_reached = set()
+        self._combat_started = None
+        self._puzzle_started = None
+        self._sums = {"engagement": [0.0, 0], "reaction": [0.0, 0], "press_interval": [0.0, 0], "answer": [0.0, 0]}
+        self._last_press = None
+
+    def __len__(self):
+        return len(self.kinds)
+
+    # --- Recording ---
+    def now(self):
+        """Seconds since the recorder started, on its clock."""
+        return self.clock() - self.origin
+
+    def record(self, kind, value=0.0, timestamp=None):
+        """Append one event. `timestamp` is a reading of the recorder's clock (defaults to now)."""
+        code = KIND[kind]
+        offset = (self.clock() if timestamp is None else timestamp) - self.origin
+        scene = -2 if self.scene is None else self.scene
+        if len(self.kinds) < self.capacity:
+            self.times.append(offset); self.kinds.append(code); self.scenes.append(scene); self.values.append(value)
+        else:
+            i = self.head
+            self.times[i] = offset; self.kinds[i] = code; self.scenes[i] = scene; self.values[i] = value
+            self.head = (i + 1) % self.capacity; self.dropped += 1
+        self.counts[code] += 1
+        return offset
+
+    def _add(self, name, amount):
+        total = self._sums[name]; total[0] += amount; total[1] += 1
+
+    def scene_enter(self, index, challenge_type=None):
+        self.scene = index; self.scene_type = challenge_type
+        if index != BOSS_SCENE: self.scenes_reached.add(index)
+        self.record("scene.enter", challenge_code(challenge_type))
+
+    def scene_exit(self, cleared=True):
+        """Leave the current scene; its value is 1 when the scene was cleared and 0 when the player died in it."""
+        self.record("scene.exit", 1.0 if cleared else 0.0)
+
+    def combat_start(self):
+        self._combat_started = self.record("combat.start"); self._last_press = None
+
+    def combat_press(self, count, timestamp=None):
+        offset = self.record("combat.press", count, timestamp)
+        if self._last_press is None and self._combat_started is not None: self._add("reaction", offset - self._combat_started)
+        elif self._last_press is not None: self._add("press_interval", offset - self._last_press)
+        self._last_press = offset
+
+    def combat_end(self, won):
+        offset = self.record("combat.win" if won else "combat.loss")
+        if self._combat_started is not None: self._add("engagement", offset - self._combat_started)
+        self._combat_started = None
+
+    def puzzle_start(self):
+        self._puzzle_started = self.record("puzzle.attempt")
+
+    def puzzle_answer(self, correct, started=None):
+        """Record an answer; its value is the seconds since the prompt (or since `started`)."""
+        now = self.now()
+        began = started if started is not None else self._puzzle_started
+        latency = now - began if began is not None else 0.0
+        self.record("puzzle.solve" if correct else "puzzle.fail", latency)
+        self._add("answer", latency)
+
+    def death(self):
+        """A death in the current scene; its value is the code of the challenge type that caused it."""
+        code = challenge_code(self.scene_type)
+        self.deaths[code] += 1
+        self.record("death", code); self.record("fail.retry")
+
+    # --- Reading ---
+    def iter_events(self):
+        """Yield ``(seconds since start, kind name, scene, value)`` oldest first."""
+        n = len(self.kinds)
+        for j in range(n):
+            i = (self.head + j) % n if n == self.capacity else j
+            yield self.times[i], KINDS[self.kinds[i]], self.scenes[i], self.values[i]
+
+    def count(self, kind):
+        return self.counts[KIND[kind]]
+
+    def _mean(self, name):
+        total, n = self._sums[name]
+        return total / n if n else 0.0
+
+    def deaths_by_type(self):
+        return {name: n for name, n in zip(CHALLENGE_CODES, self.deaths)}
+
+    def digest(self):
+        """``[{"type", "count"}]`` for the non-zero ``DIGEST_KINDS``, a fixed-size summary whatever the run's length."""
+        return [{"type": name, "count": self.count(name)} for name in DIGEST_KINDS if self.count(name) > 0]
+
+    def exploration_ratio(self):
+        """Share of the level's scenes the player reached (the boss does not count), from 0 to 1."""
+        # Streamed levels have no length up front; by the time a report is built every scene has arrived.
+        total = self.scene_count or (max(self.scenes_reached) + 1 if self.scenes_reached else 0)
+        return round(len(self.scenes_reached) / total, 3) if total else 0.0
+
+    def performance_summary(self, stats):
+        offers = self.count("hint.offer")
+        return {
+            "avg_enemy_engagement_time": round(self._mean("engagement"), 3),
+            "puzzle_success_rate": stats['riddles_correct'] / stats['riddles_attempted'] if stats['riddles_attempted'] > 0 else 0,
+            "exploration_ratio": self.exploration_ratio(),
+            "hint_reliance": round(self.count("hint.use") / offers, 3) if offers else 0.0,
+            "avg_reaction_time": round(self._mean("reaction"), 3),
+            "avg_press_interval": round(self._mean("press_interval"), 4),
+            "avg_puzzle_answer_time": round(self._mean("answer"), 3),
+        }
+
+    # --- Export ---
+    def export_ndjson(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as fh:
+            for t, kind, scene, value in self.iter_events():
+                fh.write(json.dumps({"t": round(t, 4), "type": kind, "scene": scene, "value": value}) + "\n")
+        return path
+
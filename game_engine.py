@@ -1,220 +1,266 @@
 # FILE: game_engine.py (Updated with API Key Header)
 
-import json
 import os
+import sys
+import threading
 import time
 import uuid
 import random
-import requests
-from dotenv import load_dotenv
+from config import get_config
+from renderer import clear_screen
+from event_recorder import BOSS_SCENE, EventRecorder
+from session_io import LIVE_IO, RecordingIO, recording_enabled, run_sync, save_recording
+from level_compiler import CHALLENGE_TYPES, CompiledLevel, compile_level, load_level, register_challenge
+from startup import FIRST_SCENE, mark
+from tracing import count, span
 
-# --- CONFIGURATION & API KEYS ---
-BACKEND_URL = "http://192.168.0.199:7769"
-load_dotenv()
-CHRONICLE_API_KEY = os.getenv("CHRONICLE_API_KEY") # <-- NEW: Load the Chronicle key
+# --- CONFIGURATION ---
+# Keys and the backend URL live in config.get_config(), read on first use; requests (report_outbox)
+# and numpy (report_archive) are only imported once a run report is submitted.
+EVENTS_DIR = os.path.join(os.path.dirname(__file__), "spool", "events")
+STAT_NAMES = ("time_s","deaths","retries","distance_traveled","jumps","hint_offers","hints_used","riddles_attempted","riddles_correct","combats_initiated","combats_won","collectibles_found")
 
-if not CHRONICLE_API_KEY:
-    raise ValueError("CHRONICLE_API_KEY not found in .env file.")
-
-# --- All helper functions and classes are unchanged ---
-try:
-    import msvcrt
-    def get_char_non_blocking():
-        if msvcrt.kbhit(): return msvcrt.getch().decode('utf-8').upper()
-        return None
-except ImportError:
-    import sys, tty, termios, select
-    def get_char_non_blocking():
-        fd = sys.stdin.fileno()
-        old_settings = termios.tcgetattr(fd)
-        try:
-            tty.setcbreak(sys.stdin.fileno())
-            if select.select([sys.stdin], [], [], 0) == ([sys.stdin], [], []):
-                return sys.stdin.read(1).upper()
-        finally:
-            termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-        return None
-def clear_screen(): os.system('cls' if os.name == 'nt' else 'clear')
-def typewriter_print(text, delay=0.03):
-    for char in text: print(char, end='', flush=True); time.sleep(delay)
-    print()
-def get_player_choice(prompt, options):
+async def get_player_choice(prompt, options, io=LIVE_IO):
     while True:
-        typewriter_print(prompt);
-        for i, text in enumerate(options, 1): print(f"  [{i}] {text}")
-        choice = input("> ").strip()
+        await io.typewriter(prompt);
+        for i, text in enumerate(options, 1): io.print(f"  [{i}] {text}")
+        choice = (await io.line("> ")).strip()
         if choice.isdigit() and 1 <= int(choice) <= len(options): return int(choice) - 1
-        else: print("\nInvalid choice."); time.sleep(1)
+        else: io.print("\nInvalid choice."); await io.sleep(1)
 class GameState:
-    def __init__(self, player_id, run_index): self.player_id=player_id; self.run_index=run_index; self.session_start_time=time.time(); self.run_outcome={"result":"loss","path":"exploration"}; self.stats={"time_s":0,"deaths":0,"retries":0,"distance_traveled":0,"jumps":0,"hint_offers":0,"hints_used":0,"riddles_attempted":0,"riddles_correct":0,"combats_initiated":0,"combats_won":0,"collectibles_found":0}
+    def __init__(self, player_id, run_index, seed=None, io=LIVE_IO): self.player_id=player_id; self.run_index=run_index; self.session_id=f"sess_{uuid.uuid4().hex[:12]}"; self.seed=random.randrange(2**32) if seed is None else seed; self._rng=None; self.io=io; self.events=EventRecorder(clock=io.now); self.run_outcome={"result":"loss","path":"exploration"}; self.stats=dict.fromkeys(STAT_NAMES,0)
+    @property
+    def rng(self):
+        # Seeded on first use; headless simulation builds many states that never roll.
+        if self._rng is None: self._rng=random.Random(self.seed)
+        return self._rng
     def increment_stat(self, key, value=1):
         if key in self.stats: self.stats[key]+=value
-    def handle_death(self, message):
-        clear_screen(); typewriter_print(message); typewriter_print("\nYou awaken back at the start."); time.sleep(3); self.increment_stat('deaths'); self.increment_stat('retries'); return False
+    async def handle_death(self, message):
+        self.io.clear_screen(); await self.io.typewriter(message); await self.io.typewriter("\nYou awaken back at the start."); await self.io.sleep(3); self.events.death(); self.increment_stat('deaths'); self.increment_stat('retries'); return False
 def generate_output_json(state, knobs):
-    events_digest=[{"type":"death","count":state.stats['deaths']},{"type":"fail.retry","count":state.stats['retries']},{"type":"combat.start","count":state.stats['combats_initiated']},{"type":"combat.win","count":state.stats['combats_won']},{"type":"puzzle.attempt","count":state.stats['riddles_attempted']}];output={"schema_version":"1.0","player_id":state.player_id,"session_id":f"sess_{uuid.uuid4().hex[:12]}","run_index":state.run_index,"completed_at":time.strftime("%Y-%m-%dT%H:%M:%SZ",time.gmtime()),"run_outcome":state.run_outcome,"stats":state.stats,"events_digest":[e for e in events_digest if e['count']>0],"config_used":{"mode":"challenge","knobs":knobs},"performance_summary":{"avg_enemy_engagement_time":3.2,"puzzle_success_rate":state.stats['riddles_correct']/state.stats['riddles_attempted'] if state.stats['riddles_attempted']>0 else 0,"exploration_ratio":0.0,"hint_reliance":0.0}};return output
+    output={"schema_version":"1.0","player_id":state.player_id,"session_id":state.session_id,"run_index":state.run_index,"completed_at":time.strftime("%Y-%m-%dT%H:%M:%SZ",time.gmtime()),"run_outcome":state.run_outcome,"stats":state.stats,"events_digest":state.events.digest(),"config_used":{"mode":"challenge","knobs":knobs},"performance_summary":state.events.performance_summary(state.stats)};return output
 def is_challenge_valid(challenge):
-    challenge_type=challenge.get('type');
-    if challenge_type=='QTE':return all(k in challenge for k in['key','presses','time_limit'])
-    elif challenge_type=='RIDDLE':return all(k in challenge for k in['riddle_text','answer','time_limit'])
-    elif challenge_type=='SEQUENCE_MEMORY':return'sequence'in challenge and isinstance(challenge['sequence'],list)
-    elif challenge_type=='DILEMMA':return'options'in challenge and isinstance(challenge['options'],list)
-    elif challenge_type=='JUMP_CHASM':return'success_chance'in challenge
-    elif challenge_type=='FIND_COLLECTIBLE':return'description'in challenge
-    return False
-def run_challenge(state, challenge):
+    entry=CHALLENGE_TYPES.get(challenge.get('type'))
+    return entry is not None and entry[0](challenge)
+def is_scene_valid(scene):
+    return isinstance(scene,dict) and isinstance(scene.get('intro_text'),str) and isinstance(scene.get('challenge'),dict) and is_challenge_valid(scene['challenge'])
+async def run_challenge(state, challenge):
     if not is_challenge_valid(challenge):
-        print(f"WARNING: Challenge of type '{challenge.get('type')}' is missing data. Skipping.")
-        time.sleep(3)
+        state.io.print(f"WARNING: Challenge of type '{challenge.get('type')}' is missing data. Skipping.")
+        await state.io.sleep(3)
         return True
+    return await CHALLENGE_TYPES[challenge['type']][2](state, challenge)
 
-    challenge_type = challenge.get('type')
-    
-    if challenge_type == 'QTE':
-        state.increment_stat('combats_initiated')
-        typewriter_print(challenge.get('prompt', 'Prepare!'))
-        key, presses, time_limit = challenge['key'], challenge['presses'], challenge['time_limit']
-        print(f"MASH '{key}' {presses} TIMES IN {time_limit} SECONDS!", flush=True)
-        start_time = time.time()
-        press_count = 0
-        while time.time() - start_time < time_limit:
-            if get_char_non_blocking() == key:
+# --- Challenge handlers (validator, normalizer and player per type; see level_compiler) ---
+@register_challenge('QTE', lambda c: all(k in c for k in['key','presses','time_limit']), lambda c: {**c,'key':str(c['key']).upper(),'presses':int(c['presses']),'time_limit':float(c['time_limit'])})
+async def run_qte(state, challenge):
+    state.increment_stat('combats_initiated')
+    await state.io.typewriter(challenge.get('prompt', 'Prepare!'))
+    key, presses, time_limit = challenge['key'], challenge['presses'], challenge['time_limit']
+    state.io.print(f"MASH '{key}' {presses} TIMES IN {time_limit} SECONDS!")
+    state.events.combat_start()
+    deadline = state.io.now() + time_limit
+    press_count = 0
+    with state.io.keyboard() as keyboard:
+        while press_count < presses:
+            event = await keyboard.next_event(deadline)
+            if event is None: break
+            if event.key == key:
                 press_count += 1
-                print(key, end='', flush=True)
-            if press_count >= presses:
-                print("\n")
-                typewriter_print("Success!")
-                state.increment_stat('combats_won')
-                time.sleep(2)
-                return True
-        return state.handle_death("Too slow!")
-
-    elif challenge_type == 'RIDDLE':
-        state.increment_stat('riddles_attempted')
-        typewriter_print(challenge.get('prompt', 'Solve:'))
-        typewriter_print(f"\"{challenge['riddle_text']}\"")
-        answer = input("> ").strip().lower()
-        if challenge['answer'].lower() in answer:
-            typewriter_print("Correct!")
-            state.increment_stat('riddles_correct')
-            time.sleep(2)
-            return True
-        if 'hint_text' in challenge:
-            state.increment_stat('hint_offers')
-            typewriter_print("Not quite. Hint? (y/n)")
-            if input("> ").strip().lower() == 'y':
-                state.increment_stat('hints_used')
-                typewriter_print(f"HINT: {challenge['hint_text']}")
-                answer = input("> ").strip().lower()
-                if challenge['answer'].lower() in answer:
-                    typewriter_print("Correct, with a hint!")
-                    state.increment_stat('riddles_correct')
-                    time.sleep(2)
-                    return True
-        return state.handle_death("Incorrect.")
+                state.events.combat_press(press_count, event.timestamp)
+                state.io.print(key, end='')
+    state.events.combat_end(press_count >= presses)
+    if press_count >= presses:
+        state.io.print("\n")
+        await state.io.typewriter("Success!")
+        state.increment_stat('combats_won')
+        await state.io.sleep(2)
+        return True
+    return await state.handle_death("Too slow!")
 
-    elif challenge_type == 'JUMP_CHASM':
-        typewriter_print(challenge.get('prompt', 'A chasm...'))
-        input("Press Enter to jump...")
-        state.increment_stat('jumps')
-        if random.random() < challenge['success_chance']:
-            typewriter_print("You land safely!")
-            time.sleep(2)
-            return True
-        return state.handle_death("You fall into the abyss.")
+@register_challenge('RIDDLE', lambda c: all(k in c for k in['riddle_text','answer','time_limit']), lambda c: {**c,'riddle_text':str(c['riddle_text']),'answer':str(c['answer']),'time_limit':float(c['time_limit'])})
+async def run_riddle(state, challenge):
+    state.increment_stat('riddles_attempted')
+    await state.io.typewriter(challenge.get('prompt', 'Solve:'))
+    await state.io.typewriter(f"\"{challenge['riddle_text']}\"")
+    state.events.puzzle_start()
+    answer = (await state.io.line("> ")).strip().lower()
+    state.events.puzzle_answer(challenge['answer'].lower() in answer)
+    if challenge['answer'].lower() in answer:
+        await state.io.typewriter("Correct!")
+        state.increment_stat('riddles_correct')
+        await state.io.sleep(2)
+        return True
+    if 'hint_text' in challenge:
+        state.increment_stat('hint_offers')
+        state.events.record("hint.offer")
+        await state.io.typewriter("Not quite. Hint? (y/n)")
+        if (await state.io.line("> ")).strip().lower() == 'y':
+            state.increment_stat('hints_used')
+            state.events.record("hint.use")
+            await state.io.typewriter(f"HINT: {challenge['hint_text']}")
+            hint_shown = state.events.now()
+            answer = (await state.io.line("> ")).strip().lower()
+            state.events.puzzle_answer(challenge['answer'].lower() in answer, hint_shown)
+            if challenge['answer'].lower() in answer:
+                await state.io.typewriter("Correct, with a hint!")
+                state.increment_stat('riddles_correct')
+                await state.io.sleep(2)
+                return True
+    return await state.handle_death("Incorrect.")
 
-    elif challenge_type == 'FIND_COLLECTIBLE':
-        typewriter_print(challenge.get('description'))
-        state.increment_stat('collectibles_found')
-        input("Press Enter to continue...")
+@register_challenge('JUMP_CHASM', lambda c: 'success_chance' in c, lambda c: {**c,'success_chance':min(1.0,max(0.0,float(c['success_chance'])))})
+async def run_jump_chasm(state, challenge):
+    await state.io.typewriter(challenge.get('prompt', 'A chasm...'))
+    await state.io.line("Press Enter to jump...")
+    state.increment_stat('jumps')
+    landed = state.rng.random() < challenge['success_chance']
+    state.events.record("jump.land" if landed else "jump.fall")
+    if landed:
+        await state.io.typewriter("You land safely!")
+        await state.io.sleep(2)
         return True
+    return await state.handle_death("You fall into the abyss.")
 
-    elif challenge_type == 'SEQUENCE_MEMORY':
-        state.increment_stat('riddles_attempted')
-        typewriter_print(challenge.get('prompt', 'Memorize:'))
-        sequence = challenge['sequence']
-        for item in sequence:
-            print(f"  {item}  ", end='', flush=True)
-            time.sleep(1.5)
-            print("\r" + " "*20 + "\r", end='', flush=True)
-        user_input_upper = input("Enter sequence: > ").strip().upper().split()
-        correct_sequence_upper = [item.upper() for item in sequence]
-        if user_input_upper == correct_sequence_upper:
-            typewriter_print("Perfect memory!")
-            state.increment_stat('riddles_correct')
-            time.sleep(2)
-            return True
-        return state.handle_death("Memory fails you.")
+@register_challenge('FIND_COLLECTIBLE', lambda c: 'description' in c, lambda c: {**c,'description':str(c['description'])})
+async def run_find_collectible(state, challenge):
+    await state.io.typewriter(challenge.get('description'))
+    state.increment_stat('collectibles_found')
+    state.events.record("collectible.found")
+    await state.io.line("Press Enter to continue...")
+    return True
 
-    elif challenge_type == 'DILEMMA':
-        options = challenge['options']
-        choice = get_player_choice(challenge.get('prompt', 'Choose...'), options)
-        if choice == 0:
-            state.run_outcome['path'] = 'combat'
-        else:
-            state.run_outcome['path'] = 'puzzle'
-        typewriter_print("You proceed.")
-        time.sleep(2)
+@register_challenge('SEQUENCE_MEMORY', lambda c: 'sequence' in c and isinstance(c['sequence'],list), lambda c: {**c,'sequence':[str(item) for item in c['sequence']]})
+async def run_sequence_memory(state, challenge):
+    state.increment_stat('riddles_attempted')
+    await state.io.typewriter(challenge.get('prompt', 'Memorize:'))
+    sequence = challenge['sequence']
+    for item in sequence:
+        state.io.print(f"  {item}  ", end='')
+        await state.io.sleep(1.5)
+        state.io.print("\r" + " "*20 + "\r", end='')
+    state.events.puzzle_start()
+    user_input_upper = (await state.io.line("Enter sequence: > ")).strip().upper().split()
+    correct_sequence_upper = [item.upper() for item in sequence]
+    state.events.puzzle_answer(user_input_upper == correct_sequence_upper)
+    if user_input_upper == correct_sequence_upper:
+        await state.io.typewriter("Perfect memory!")
+        state.increment_stat('riddles_correct')
+        await state.io.sleep(2)
         return True
+    return await state.handle_death("Memory fails you.")
 
+def _normalize_dilemma(challenge):
+    options=[str(option) for option in challenge['options']]
+    if not options: raise ValueError("no options")
+    return {**challenge,'options':options}
+@register_challenge('DILEMMA', lambda c: 'options' in c and isinstance(c['options'],list), _normalize_dilemma)
+async def run_dilemma(state, challenge):
+    options = challenge['options']
+    choice = await get_player_choice(challenge.get('prompt', 'Choose...'), options, state.io)
+    state.events.record("dilemma.choice", choice)
+    if choice == 0:
+        state.run_outcome['path'] = 'combat'
+    else:
+        state.run_outcome['path'] = 'puzzle'
+    await state.io.typewriter("You proceed.")
+    await state.io.sleep(2)
     return True
 
-def submit_run_report(state, knobs, game_context):
+_report_outbox = None
+_report_outbox_lock = threading.Lock()
+def get_report_outbox():
+    """The process-wide run-report outbox; started on first use so earlier spooled reports drain too.
+
+    Without CHRONICLE_API_KEY reports are only spooled, to be sent by the next run that has a key.
+    """
+    global _report_outbox
+    with _report_outbox_lock:
+        if _report_outbox is not None: return _report_outbox
+        from report_outbox import ReportOutbox
+        config = get_config()
+        _report_outbox = ReportOutbox(f"{config.backend_url}/sm/save", config.chronicle_api_key, batch_url=config.report_batch_url)
+        if config.chronicle_api_key: _report_outbox.start()
+        else: print("GAME WARNING: CHRONICLE_API_KEY not set; run reports are kept in the local spool.")
+        return _report_outbox
+
+def submit_run_report(state, knobs, game_context, traits=None):
     """
-    Constructs the ServerInput and POSTs it with the API key header.
+    Constructs the ServerInput and hands it to the outbox, which POSTs it with the API key header in the background.
     """
-    print("\nGAME: Compiling run report...")
-    server_input = { "schema_version": "1.0", "player_id": state.player_id, "session_id": f"sess_{uuid.uuid4().hex[:8]}", "run_index": state.run_index, "completed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "game_context": game_context, "run_outcome": state.run_outcome, "stats": state.stats, "config_used": {"mode": "challenge", "knobs": knobs, "layout_seed": f"seed_{random.randint(100000, 999999)}"}}
-    payload = {"serverInput": server_input}
-    url = f"{BACKEND_URL}/sm/save"
-    
-    # --- CHANGE: Added the API key to the request header ---
-    headers = {
-        "Content-Type": "application/json",
-        "X-API-Key": CHRONICLE_API_KEY
-    }
-    
-    print("GAME: Submitting run report to Supermemory backend...")
-    try:
-        # Pass the headers to the request
-        response = requests.post(url, json=payload, headers=headers)
-        
-        if response.status_code == 200:
-            print("GAME: Report successfully submitted!")
-            print(response.json())
-        else:
-            print(f"GAME ERROR: Failed to submit report. Status: {response.status_code}, Response: {response.text}")
-    except requests.exceptions.ConnectionError:
-        print(f"GAME CRITICAL ERROR: Could not connect to the backend at {BACKEND_URL}.")
+    state.io.print("\nGAME: Compiling run report...")
+    with span("report.submit",session_id=state.session_id):
+        server_input = generate_output_json(state, knobs)
+        server_input["game_context"] = game_context; server_input["config_used"]["layout_seed"] = f"seed_{state.seed}"
+        with span("report.enqueue"): get_report_outbox().enqueue(server_input)
+        from prepare_level import get_persona_cache
+        get_persona_cache().invalidate(state.player_id)  # the backend re-derives the persona from this report
+        from report_archive import get_report_archive
+        try:
+            with span("report.archive"): get_report_archive().append(server_input, state.events.deaths_by_type(), traits)  # the traits the knobs were tuned for stay local; they feed difficulty_model
+        except (OSError, ValueError) as e: state.io.print(f"GAME WARNING: Could not archive the run report locally. Error: {e}")
+        with span("events.export"): state.events.export_ndjson(os.path.join(EVENTS_DIR, f"{state.session_id}.ndjson"))
+    state.io.print("GAME: Run report saved. Submitting to Supermemory backend in the background...")
 
-def play_game(player_id, instructions, game_context):
-    knobs=instructions.get('knobs',{});content=instructions.get('content',{});run_index=1
-    state=GameState(player_id,run_index)
-    while True:
-        adventure_success=True
-        for scene in content.get('scenes',[]):
-            clear_screen();intro=scene.get('intro_text',"You proceed...");typewriter_print(intro);state.increment_stat('distance_traveled',50)
-            challenge_data=scene.get('challenge')
-            if isinstance(challenge_data,dict):
-                if not run_challenge(state,challenge_data):adventure_success=False;break
-            else:print(f"WARNING: Malformed challenge data. Skipping.");time.sleep(2)
-        if not adventure_success:continue
-        clear_screen();typewriter_print("You've reached the Spire's peak!")
-        final_boss_challenge={"type":"QTE","prompt":"The Dragon Ignis attacks!","key":"S","presses":15,"time_limit":4.0}
-        if not run_challenge(state,final_boss_challenge):continue
-        state.run_outcome['result']='win';state.stats['time_s']=int(time.time()-state.session_start_time)
-        submit_run_report(state,knobs,game_context)
-        clear_screen();typewriter_print("--- VICTORY! ---")
-        print(f"You rescued the princess, {player_id}!");print("Your performance has been saved to your Supermemory profile.")
-        break
+GAME_CONTEXT={"game_id":"mario-on-crack","game_title":"Dragon's Spire","genre_ids":["adventure"],"platform_ids":["pc"]}
+FINAL_BOSS_CHALLENGE={"type":"QTE","prompt":"The Dragon Ignis attacks!","key":"S","presses":15,"time_limit":4.0}
+
+def play_game(player_id, instructions, game_context, io=LIVE_IO, seed=None, submit=True):
+    """Plays a level on the calling thread and returns the final GameState (see play_game_async); `io` must not suspend."""
+    return run_sync(play_game_async(player_id, instructions, game_context, io, seed, submit))
+async def play_game_async(player_id, instructions, game_context, io=LIVE_IO, seed=None, submit=True):
+    """Plays a level and returns the final GameState; `instructions` is a CompiledLevel or a raw game_instructions dict (compiled here)."""
+    level=instructions if isinstance(instructions,CompiledLevel) else compile_level(instructions)
+    knobs=level.knobs;run_index=1
+    state=GameState(player_id,run_index,seed,io)
+    try:state.events.scene_count=len(level.scenes)
+    except TypeError:pass  # streamed levels do not know their length up front
+    with io.session(),span("game.session",player_id=player_id,session_id=state.session_id):
+        try:
+            while True:
+                adventure_success=True
+                for scene in level.scenes:
+                    challenge_type=scene.challenge.type if scene.challenge else None
+                    with span("game.scene",index=scene.index,challenge=challenge_type):
+                        state.events.scene_enter(scene.index,challenge_type)
+                        with span("render"):state.io.clear_screen();await state.io.typewriter(scene.intro_text)
+                        state.increment_stat('distance_traveled',50)
+                        if scene.challenge is not None:
+                            with span("challenge",type=challenge_type):passed=await scene.challenge.run(state)
+                            count("challenges_total",type=challenge_type,result="pass" if passed else "death")
+                            if not passed:state.events.scene_exit(cleared=False);adventure_success=False;break
+                        state.events.scene_exit()
+                if not adventure_success:continue
+                with span("game.scene",index=BOSS_SCENE,challenge=FINAL_BOSS_CHALLENGE['type']):
+                    state.events.scene_enter(BOSS_SCENE,FINAL_BOSS_CHALLENGE['type'])
+                    with span("render"):state.io.clear_screen();await state.io.typewriter("You've reached the Spire's peak!")
+                    with span("challenge",type="FINAL_BOSS"):passed=await run_challenge(state,FINAL_BOSS_CHALLENGE)
+                    count("challenges_total",type="FINAL_BOSS",result="pass" if passed else "death")
+                    state.events.scene_exit(cleared=passed)
+                    if not passed:continue
+                state.run_outcome['result']='win';state.stats['time_s']=int(state.events.now())
+                if submit:submit_run_report(state,knobs,game_context,level.traits)
+                state.io.clear_screen();await state.io.typewriter("--- VICTORY! ---")
+                state.io.print(f"You rescued the princess, {player_id}!");state.io.print("Your performance has been saved to your Supermemory profile.")
+                return state
+        finally:count("sessions_total",result=state.run_outcome['result'])  # a session left before the victory screen counts as a loss
 if __name__ == "__main__":
-    instructions_file="game_instructions.json";game_context={"game_id":"mario-on-crack","game_title":"Dragon's Spire","genre_ids":["adventure"],"platform_ids":["pc"]}
+    mark("modules imported")
+    args=[arg for arg in sys.argv[1:] if arg!="--record"];record=recording_enabled()
+    instructions_file=args[0] if args else "game_instructions.json";game_context=GAME_CONTEXT
     clear_screen()
     if not os.path.exists(instructions_file):print(f"FATAL: '{instructions_file}' not found! Run 'prepare_level.py <player_id>' first.");exit()
     print(f"--- LOADING LEVEL: '{instructions_file}' ---");
-    with open(instructions_file,'r')as f:instructions=json.load(f)
-    time.sleep(2)
-    player_id=instructions.get("meta",{}).get("player_id","unknown_player")
+    level=load_level(instructions_file);mark("level loaded")
+    for error in level.errors:print(f"WARNING: {error}. Challenge skipped.")
+    player_id=level.player_id or "unknown_player"
     if player_id=="unknown_player":print("FATAL ERROR: player_id not found in 'game_instructions.json'.");exit()
-    print(f"--- STARTING GAME FOR PLAYER: {player_id} ---");time.sleep(2)
-    play_game(player_id,instructions,game_context)
\ No newline at end of file
+    print(f"--- STARTING GAME FOR PLAYER: {player_id} ---")
+    if level.errors and sys.stdin.isatty():input("Press Enter to begin...")  # let the warnings be read before the first scene clears them
+    if get_config().chronicle_api_key:threading.Thread(target=get_report_outbox,daemon=True).start()  # drain earlier spooled reports without delaying the first scene
+    mark(FIRST_SCENE)
+    state=play_game(player_id,level,game_context,io=RecordingIO() if record else LIVE_IO)
+    if record:print(f"GAME: Session recorded to '{save_recording(state,level)}' (replay with 'python session_io.py <file>').")
+    unsent=get_report_outbox().close(timeout=10.0)
+    if unsent:print(f"GAME: Backend at {get_config().backend_url} unreachable. {unsent} report(s) kept locally and will be sent next time.")
\ No newline at end of file
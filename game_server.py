@@ -0,0 +1,361 @@
+# FILE: game_server.py (Many concurrent players in one process over TCP)
+
+"""Game server: one process, one asyncio event loop, every session a coroutine on that loop.
+
+Each TCP connection (``nc``/``telnet`` in line mode) gets its own ``GameState`` and a
+``ConnectionIO``, the network counterpart of ``session_io.LiveIO``, and plays
+``game_engine.play_game_async`` as a task on the server's loop. The challenge handlers are
+coroutines, so a session holds no thread while it waits on its player: ``line()`` awaits the
+connection's inbox until the client sends a newline, a QTE's ``next_event(deadline)`` is an inbox
+wait with the deadline as an event-loop timer, and the engine's pauses are loop timers cut short
+when the client hangs up. Output goes straight to the transport; when a client stops reading, its
+session waits for the transport to drain at its next pause or read, so a slow client stalls only
+its own session. ``--max-sessions`` caps how many players one process hosts at a time (512 by
+default); each costs a task and its buffers rather than an OS thread. QTE presses are the
+characters received before the deadline, so a line-mode client mashes by typing ``SSSS`` and
+pressing Enter.
+
+Player IDs typed by clients are not authenticated, so their runs are reported under
+``UNAUTHENTICATED_PREFIX`` + the typed name and never land in a real player's profile.
+
+``--load-test N`` starts the server on a free local port and drives it with N simulated clients,
+then reports input latency percentiles and throughput.
+
+Usage: python game_server.py [--level game_instructions.json] [--port 7777] [--max-sessions 512]
+       python game_server.py --load-test 300 --duration 10 --sleep-scale 0
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+import re
+import time
+
+from game_engine import GAME_CONTEXT, get_report_outbox, play_game_async
+from keyboard_input import KeyEvent
+from level_compiler import load_level
+from renderer import Renderer
+from session_io import SessionIO
+
+DEFAULT_PORT = 7777
+DEFAULT_MAX_SESSIONS = 512
+UNAUTHENTICATED_PREFIX = "unverified:"
+MAX_PLAYER_ID_LENGTH = 64
+IAC = 255
+TELNET_OPTION_COMMANDS = {251, 252, 253, 254}  # WILL, WONT, DO, DONT
+TELNET_SB, TELNET_SE = 250, 240
+
+
+def strip_telnet(data):
+    """Drop telnet command sequences (IAC ...) from a received chunk."""
+    if IAC not in data: return data
+    out = bytearray(); i = 0
+    while i < len(data):
+        byte = data[i]
+        if byte != IAC: out.append(byte); i += 1; continue
+        command = data[i + 1] if i + 1 < len(data) else None
+        if command == IAC: out.append(IAC); i += 2
+        elif command in TELNET_OPTION_COMMANDS: i += 3
+        elif command == TELNET_SB:
+            end = data.find(bytes([IAC, TELNET_SE]), i)
+            i = len(data) if end < 0 else end + 2
+        else: i += 2
+    return bytes(out)
+
+
+class GameConnection(asyncio.Protocol):
+    """Event-loop side of one client: queues what it receives, writes what the session sends."""
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.task = None
+        self.inbox = asyncio.Queue()
+        self.writable = asyncio.Event(); self.writable.set()
+        self.hung_up = asyncio.Event()
+        self.closed = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.open(self)
+
+    def data_received(self, data):
+        self.inbox.put_nowait((time.monotonic(), data))
+
+    def connection_lost(self, exc):
+        self.hang_up()
+
+    def hang_up(self):
+        """End the session: its next read sees EOF and any wait for writing or pausing returns."""
+        self.closed = True; self.hung_up.set()
+        self.inbox.put_nowait((time.monotonic(), None)); self.writable.set()
+
+    def pause_writing(self):
+        self.writable.clear()
+
+    def resume_writing(self):
+        self.writable.set()
+
+    def send(self, text):
+        if self.closed or self.transport.is_closing(): return
+        self.transport.write(text.replace("\r\n", "\n").replace("\n", "\r\n").encode("utf-8", "replace"))
+
+
+class _ConnectionStream:
+    """File-like target for a session's Renderer; one transport write per renderer flush."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def write(self, text):
+        self.connection.send(text)
+
+    def flush(self):
+        pass  # backpressure is awaited by ConnectionIO.drain, which a plain flush cannot do
+
+    def isatty(self):
+        return False
+
+
+class _ConnectionKeyboard:
+    def __init__(self, io):
+        self._io = io
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # Surplus presses (and the Enter that sent them) belong to the QTE, not to the next prompt.
+        self._io.pending = ""
+        return False
+
+    async def next_event(self, deadline=None):
+        io = self._io
+        while True:
+            while io.pending:
+                char, io.pending = io.pending[0], io.pending[1:]
+                if char not in "\r\n\x00": return KeyEvent(char.upper(), io.received_at)
+            if io.eof: raise EOFError("client disconnected")
+            if deadline is not None and deadline <= time.monotonic(): return None
+            await io.receive(deadline)
+
+
+class ConnectionIO(SessionIO):
+    """The engine's I/O for one network session. Its coroutines run on the server's event loop."""
+
+    def __init__(self, connection, instant=True, sleep_scale=1.0, drain_timeout=30.0):
+        self.connection = connection
+        self.out = Renderer(stream=_ConnectionStream(connection), instant=instant, allow_skip=False)
+        self.sleep_scale = sleep_scale
+        self.drain_timeout = drain_timeout
+        self.pending = ""
+        self.received_at = None
+        self.eof = False
+
+    async def drain(self):
+        """Wait (up to `drain_timeout`) until the client has read enough of what was sent."""
+        if self.connection.writable.is_set(): return
+        try: await asyncio.wait_for(self.connection.writable.wait(), self.drain_timeout)
+        except asyncio.TimeoutError: pass
+
+    async def receive(self, deadline=None):
+        """Wait for the next chunk from the client, until the monotonic `deadline` if one is given. Returns False on timeout."""
+        await self.drain()
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try: received_at, data = await asyncio.wait_for(self.connection.inbox.get(), timeout)
+        except asyncio.TimeoutError: return False
+        if data is None: self.eof = True
+        else: self.pending += strip_telnet(data).decode("utf-8", "replace"); self.received_at = received_at
+        return True
+
+    async def line(self, prompt=""):
+        self.print(prompt, end="")
+        while "\n" not in self.pending:
+            if self.eof: raise EOFError("client disconnected")
+            await self.receive()
+        text, self.pending = self.pending.split("\n", 1)
+        return text.rstrip("\r")
+
+    async def typewriter(self, text, delay=0.03):
+        if self.out.instant or delay <= 0 or not text:
+            self.out.typewriter(text, delay); await self.drain(); return
+        # Renderer.typewriter paces itself with blocking sleeps; here each frame is a loop timer.
+        start = time.monotonic(); shown = 0
+        while shown < len(text) and not self.connection.closed:
+            due = min(len(text), int((time.monotonic() - start) / delay) + 1)
+            if due > shown: self.print(text[shown:due], end=""); shown = due; await self.drain()
+            if shown < len(text): await asyncio.sleep(max(self.out.frame_interval, start + shown * delay - time.monotonic()))
+        self.print()
+
+    def keyboard(self):
+        return _ConnectionKeyboard(self)
+
+    def now(self):
+        return time.monotonic()
+
+    async def sleep(self, seconds):
+        await self.drain()
+        if self.sleep_scale <= 0 or self.connection.closed: return
+        try: await asyncio.wait_for(self.connection.hung_up.wait(), seconds * self.sleep_scale)
+        except asyncio.TimeoutError: pass
+
+
+class GameServer:
+    def __init__(self, level, *, max_sessions=DEFAULT_MAX_SESSIONS, instant=True, sleep_scale=1.0, submit=True):
+        self.level = level
+        self.max_sessions = max_sessions
+        self.instant = instant
+        self.sleep_scale = sleep_scale
+        self.submit = submit
+        self.loop = None
+        self.server = None
+        self.active = 0
+        self.connections = set()
+        self._guests = itertools.count(1)
+        self.stats = {"sessions": 0, "wins": 0, "disconnects": 0, "errors": 0, "rejected": 0, "peak_active": 0}
+
+    async def start(self, host="0.0.0.0", port=DEFAULT_PORT):
+        self.loop = asyncio.get_running_loop()
+        if self.submit: get_report_outbox()
+        self.server = await self.loop.create_server(lambda: GameConnection(self), host, port)
+        return self
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    def open(self, connection):
+        if self.active >= self.max_sessions:
+            self.stats["rejected"] += 1
+            connection.transport.write(b"GAME: Server is full, try again later.\r\n"); connection.transport.close(); return
+        self.active += 1; self.stats["sessions"] += 1; self.connections.add(connection)
+        self.stats["peak_active"] = max(self.stats["peak_active"], self.active)
+        connection.task = self.loop.create_task(self._run_session(connection))
+        connection.task.add_done_callback(lambda done: self._closed(connection, done))
+
+    def _closed(self, connection, done):
+        self.active -= 1; self.connections.discard(connection)
+        self.stats["disconnects" if done.cancelled() else done.result()] += 1
+        if not connection.transport.is_closing(): connection.transport.close()
+
+    async def _run_session(self, connection):
+        io = ConnectionIO(connection, self.instant, self.sleep_scale)
+        try:
+            io.print(f"--- {GAME_CONTEXT['game_title']} ---")
+            typed = (await io.line("Player ID: ")).strip()[:MAX_PLAYER_ID_LENGTH] or f"guest_{next(self._guests)}"
+            player_id = UNAUTHENTICATED_PREFIX + typed
+            await play_game_async(player_id, self.level, GAME_CONTEXT, io=io, submit=self.submit)
+            return "wins"
+        except EOFError:
+            return "disconnects"
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            # SystemExit from a handler would otherwise stop the event loop and every other session with it.
+            print(f"GAME SERVER ERROR: Session crashed. {type(e).__name__}: {e}")
+            return "errors"
+
+    async def serve_forever(self):
+        async with self.server: await self.server.serve_forever()
+
+    async def close(self):
+        """Stop accepting, hang up on every open session and wait for their tasks to finish."""
+        self.server.close()
+        sessions = [connection.task for connection in self.connections]
+        for connection in list(self.connections): connection.hang_up()
+        await asyncio.gather(*sessions, return_exceptions=True)
+        await self.server.wait_closed()
+
+
+# --- Load testing ---
+MASH = re.compile(r"MASH '(.)' (\d+) TIMES")
+SEQUENCE_ITEM = re.compile(r"  (\S+)  \r")
+GUESSES = ("map", "echo", "shadow", "time", "fire")
+
+
+async def simulated_client(host, port, player_id, duration, rng):
+    """A scripted player that answers every prompt as soon as it appears and starts a new session
+    after each one ends, until `duration` is up. Returns (latencies, inputs, sessions)."""
+    latencies = []; inputs = 0; sessions = 0
+    stop_at = time.monotonic() + duration
+    while time.monotonic() < stop_at:
+        reader, writer = await asyncio.open_connection(host, port)
+        sessions += 1; buffer = ""; sent_at = None
+        try:
+            while (remaining := stop_at - time.monotonic()) > 0:
+                try: data = await asyncio.wait_for(reader.read(4096), remaining)
+                except asyncio.TimeoutError: break
+                if not data: break
+                if sent_at is not None: latencies.append(time.monotonic() - sent_at); sent_at = None
+                buffer += data.decode("utf-8", "replace")
+                if (match := MASH.search(buffer)): reply = match.group(1) * int(match.group(2)) + "\n"
+                elif buffer.endswith("Player ID: "): reply = player_id + "\n"
+                elif buffer.endswith("...") or buffer.endswith("> "):
+                    if "(y/n)" in buffer: reply = "y\n"
+                    elif "[1]" in buffer: reply = f"{rng.randint(1, 2)}\n"
+                    elif "sequence" in buffer: reply = " ".join(SEQUENCE_ITEM.findall(buffer)) + "\n"
+                    else: reply = rng.choice(GUESSES) + "\n"
+                else: continue
+                writer.write(reply.encode()); sent_at = time.monotonic(); inputs += 1; buffer = ""
+        finally:
+            writer.close()
+    return latencies, inputs, sessions
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def load_test(level, clients, duration, sleep_scale=0.0, max_sessions=DEFAULT_MAX_SESSIONS, seed=0):
+    server = await GameServer(level, max_sessions=max_sessions, sleep_scale=sleep_scale, submit=False).start("127.0.0.1", 0)
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(simulated_client("127.0.0.1", server.port, f"bot_{i}", duration, random.Random(rng.random())) for i in range(clients)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.2)  # let disconnected sessions unwind before reading the counters
+    await server.close()
+    failures = [r for r in results if isinstance(r, BaseException)]
+    latencies = sorted(l for r in results if not isinstance(r, BaseException) for l in r[0])
+    inputs = sum(r[1] for r in results if not isinstance(r, BaseException))
+    print(f"LOAD: {clients} clients for {elapsed:.1f}s, {len(failures)} failed to run, peak {server.stats['peak_active']} concurrent sessions")
+    print(f"LOAD: {server.stats['sessions']} sessions, {server.stats['wins']} wins, {server.stats['rejected']} rejected, {server.stats['errors']} session errors")
+    print(f"LOAD: {inputs} inputs ({inputs / elapsed:.0f}/s)")
+    if latencies:
+        print(f"LOAD: response latency p50 {_percentile(latencies, 0.5) * 1000:.1f} ms, p95 {_percentile(latencies, 0.95) * 1000:.1f} ms, p99 {_percentile(latencies, 0.99) * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+    return server.stats, latencies
+
+
+async def main(args, level):
+    if args.load_test:
+        await load_test(level, args.load_test, args.duration, args.sleep_scale, args.max_sessions)
+        return
+    server = await GameServer(level, max_sessions=args.max_sessions, instant=not args.typewriter, sleep_scale=args.sleep_scale, submit=not args.no_submit).start(args.host, args.port)
+    print(f"GAME SERVER: Serving '{level.title}' on {args.host}:{server.port} (up to {args.max_sessions} sessions).")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host many concurrent game sessions over TCP.")
+    parser.add_argument("--level", default="game_instructions.json")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-sessions", type=int, default=DEFAULT_MAX_SESSIONS)
+    parser.add_argument("--typewriter", action="store_true", help="animate text instead of sending it at once")
+    parser.add_argument("--sleep-scale", type=float, default=1.0, help="multiplier for the engine's pauses (0 disables them)")
+    parser.add_argument("--no-submit", action="store_true", help="do not send run reports")
+    parser.add_argument("--load-test", type=int, metavar="CLIENTS", help="run N simulated clients against a local server and report")
+    parser.add_argument("--duration", type=float, default=10.0, help="load test length in seconds")
+    args = parser.parse_args()
+
+    level = load_level(args.level)
+    for error in level.errors: print(f"WARNING: {error}. Challenge skipped.")
+    try:
+        asyncio.run(main(args, level))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if not args.load_test and not args.no_submit: get_report_outbox().close(timeout=10.0)
@@ -0,0 +1,105 @@
+# FILE: keyboard_input.py (Event-driven keyboard input for QTEs)
+
+"""Timestamped, event-driven keyboard input.
+
+``KeyboardInput`` puts the terminal into cbreak mode once when entered and restores it on exit;
+nested ``with`` blocks reuse the outer one, so a game session can enter it once and every QTE
+inside reads from the same queue. Reads block on ``selectors`` with the time left until the
+caller's deadline, so waiting for a key costs no CPU, and every key arrives as a ``KeyEvent``
+stamped with ``time.monotonic()`` at the moment it was read off the terminal. Bytes go through an
+incremental UTF-8 decoder, so a character split across two reads is not lost.
+"""
+
+import codecs
+import os
+import sys
+import time
+from collections import deque, namedtuple
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import selectors, termios, tty
+
+KeyEvent = namedtuple("KeyEvent", ["key", "timestamp", "char"], defaults=(None,))  # key is upper-cased; char is as typed
+
+# msvcrt has no waitable console handle, so Windows falls back to a short sleep between polls.
+WINDOWS_POLL_INTERVAL = 0.005
+
+
+class KeyboardInput:
+    """Context manager delivering upper-cased ``KeyEvent``s through an in-memory queue.
+
+    Entering it again while it is already entered only empties the queue, and leaving that inner
+    block empties it once more, so each inner block sees just the keys pressed during it.
+
+    Usage:
+        with KeyboardInput() as keyboard:
+            event = keyboard.next_event(deadline)   # None once the deadline passes
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdin
+        self.events = deque()
+        self.eof = False
+        self._fd = None
+        self._saved_settings = None
+        self._selector = None
+        self._depth = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def __enter__(self):
+        self._depth += 1
+        if self._depth > 1: self.events.clear(); return self
+        if msvcrt is None:
+            self._fd = self.stream.fileno()
+            if os.isatty(self._fd):
+                self._saved_settings = termios.tcgetattr(self._fd)
+                tty.setcbreak(self._fd)
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self._fd, selectors.EVENT_READ)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth > 0: self.events.clear(); return False
+        if self._selector is not None:
+            self._selector.close(); self._selector = None
+        if self._saved_settings is not None:
+            termios.tcsetattr(self._fd, termios.TCSADRAIN, self._saved_settings); self._saved_settings = None
+        return False
+
+    def _push(self, text, timestamp):
+        for char in text: self.events.append(KeyEvent(char.upper(), timestamp, char))
+
+    def poll(self, timeout):
+        """Wait up to `timeout` seconds (None: until something arrives) and queue it. Returns events queued."""
+        before = len(self.events)
+        if self.eof: return 0
+        if msvcrt is not None:
+            end = None if timeout is None else time.monotonic() + max(timeout, 0)
+            while True:
+                if msvcrt.kbhit():
+                    while msvcrt.kbhit(): self._push(msvcrt.getwch(), time.monotonic())
+                    break
+                remaining = WINDOWS_POLL_INTERVAL if end is None else end - time.monotonic()
+                if remaining <= 0: break
+                time.sleep(min(WINDOWS_POLL_INTERVAL, remaining))
+        elif self._selector.select(None if timeout is None else max(timeout, 0)):
+            data = os.read(self._fd, 1024)
+            if not data: self.eof = True; self._push(self._decoder.decode(b"", final=True), time.monotonic())
+            else: self._push(self._decoder.decode(data), time.monotonic())
+        return len(self.events) - before
+
+    def next_event(self, deadline=None):
+        """Return the next ``KeyEvent``, blocking until `deadline` (a ``time.monotonic()`` value; None waits indefinitely).
+
+        Returns None once the deadline passes or the input has ended.
+        """
+        while not self.events:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if (remaining is not None and remaining <= 0) or self.eof: return None
+            self.poll(remaining)
+        return self.events.popleft()
+
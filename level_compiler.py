@@ -0,0 +1,222 @@
+# FILE: level_compiler.py (One-pass validation of game_instructions.json into compiled levels)
+
+"""Compile a level once at load time instead of re-checking raw dicts mid-run.
+
+Challenge types live in ``CHALLENGE_TYPES``, filled by ``register_challenge``: each type brings a
+validator, a normalizer (coerce numbers, upper-case QTE keys, ...) and the handler that plays it.
+``compile_level`` walks the whole level once and produces ``__slots__`` objects whose challenges
+are already bound to their handler, so the engine dispatches with one attribute call and a new
+challenge type is just one more ``register_challenge``. ``load_level`` caches compiled levels
+under ``cache/levels/`` keyed by a hash of the file's bytes, and ``validate_catalogue`` checks
+many level files in parallel.
+
+Usage: python level_compiler.py level1.json [level2.json ...] [--workers N]
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import pickle
+
+LEVEL_CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache", "levels")
+COMPILER_VERSION = "2"
+BUILTIN_TYPES_MODULE = "game_engine"  # registers the built-in challenge types when imported
+UNKNOWN_TYPE = "unknown challenge type"
+
+# Challenge type -> (validate(challenge) -> bool, normalize(challenge) -> dict, async handler(state, challenge) -> bool)
+CHALLENGE_TYPES = {}
+
+
+def register_challenge(challenge_type, validate, normalize=dict):
+    """Decorator registering `handler`, a coroutine function, as the player for `challenge_type`."""
+    def register(handler):
+        CHALLENGE_TYPES[challenge_type] = (validate, normalize, handler)
+        return handler
+    return register
+
+
+class LevelCompileError(ValueError):
+    def __init__(self, errors):
+        super().__init__("; ".join(errors)); self.errors = errors
+
+
+class CompiledChallenge:
+    __slots__ = ("type", "data", "handler")
+
+    def __init__(self, challenge_type, data, handler):
+        self.type = challenge_type; self.data = data; self.handler = handler
+
+    def run(self, state):
+        """The handler's coroutine; await it (or ``session_io.run_sync`` it) for whether the player passed."""
+        return self.handler(state, self.data)
+
+    # Handlers are re-bound from the registry on load rather than pickled by reference.
+    def __getstate__(self):
+        return (self.type, self.data)
+
+    def __setstate__(self, state):
+        self.type, self.data = state; self.handler = CHALLENGE_TYPES[self.type][2]
+
+
+class CompiledScene:
+    __slots__ = ("index", "intro_text", "challenge")
+
+    def __init__(self, index, intro_text, challenge):
+        self.index = index; self.intro_text = intro_text; self.challenge = challenge
+
+    def to_dict(self):
+        scene = {"intro_text": self.intro_text}
+        if self.challenge is not None: scene["challenge"] = self.challenge.data
+        return scene
+
+
+class CompiledLevel:
+    __slots__ = ("digest", "player_id", "knobs", "title", "scenes", "errors", "traits")
+
+    def __init__(self, digest, player_id, knobs, title, scenes, errors=(), traits=None):
+        self.digest = digest; self.player_id = player_id; self.knobs = knobs
+        self.title = title; self.scenes = scenes; self.errors = list(errors); self.traits = traits
+
+    def to_instructions(self):
+        """A plain ``game_instructions.json`` document that compiles back to this level."""
+        meta = {"player_id": self.player_id}
+        if self.traits: meta["traits"] = self.traits
+        return {"meta": meta, "knobs": self.knobs, "content": {"title": self.title, "scenes": [scene.to_dict() for scene in self.scenes]}}
+
+
+def compile_challenge(challenge):
+    """Validate and normalize one challenge dict. Raises ValueError with the reason if it is unusable."""
+    if not isinstance(challenge, dict): raise ValueError("challenge is not an object")
+    challenge_type = challenge.get('type')
+    if challenge_type not in CHALLENGE_TYPES: raise ValueError(f"{UNKNOWN_TYPE} '{challenge_type}'")
+    validate, normalize, handler = CHALLENGE_TYPES[challenge_type]
+    if not validate(challenge): raise ValueError(f"challenge of type '{challenge_type}' is missing data")
+    try: data = normalize(challenge)
+    except (TypeError, ValueError, KeyError) as e: raise ValueError(f"challenge of type '{challenge_type}' is malformed: {e}") from None
+    return CompiledChallenge(challenge_type, data, handler)
+
+
+def compile_scene(scene, index, errors=None):
+    """Compile one scene. A bad challenge is dropped (and reported) but the scene's text is kept."""
+    if not isinstance(scene, dict):
+        if errors is not None: errors.append(f"scene {index}: not an object")
+        return None
+    intro_text = scene.get('intro_text')
+    if not isinstance(intro_text, str): intro_text = "You proceed..."
+    try: challenge = compile_challenge(scene.get('challenge'))
+    except ValueError as e:
+        challenge = None
+        if errors is not None: errors.append(f"scene {index}: {e}")
+    return CompiledScene(index, intro_text, challenge)
+
+
+def compile_level(instructions, digest=None, strict=False):
+    """Compile a whole ``game_instructions.json`` document. With `strict`, any error raises LevelCompileError."""
+    errors = []
+    if not isinstance(instructions, dict): raise LevelCompileError(["level is not an object"])
+    content = instructions.get('content', {})
+    if not isinstance(content, dict): errors.append("'content' is not an object"); content = {}
+    raw_scenes = content.get('scenes', [])
+    if not isinstance(raw_scenes, list): errors.append("'scenes' is not a list"); raw_scenes = []
+    scenes = [compiled for index, scene in enumerate(raw_scenes) if (compiled := compile_scene(scene, index, errors)) is not None]
+    meta = instructions.get('meta', {})
+    if not isinstance(meta, dict): errors.append("'meta' is not an object"); meta = {}
+    if strict and errors: raise LevelCompileError(errors)
+    return CompiledLevel(digest, meta.get('player_id'), instructions.get('knobs', {}), content.get('title'), scenes, errors, meta.get('traits'))
+
+
+def level_digest(raw_bytes):
+    """Content hash of a level file, salted with the compiler version and the registered types."""
+    salt = f"{COMPILER_VERSION}:{','.join(sorted(CHALLENGE_TYPES))}:".encode("utf-8")
+    return hashlib.sha256(salt + raw_bytes).hexdigest()
+
+
+def _registry_errors(level):
+    return any(UNKNOWN_TYPE in error for error in level.errors)
+
+
+def load_level(path, cache_dir=LEVEL_CACHE_DIR, strict=False):
+    """Load and compile the level at `path`, reusing a cached compilation when the content is unchanged.
+
+    Levels naming a challenge type that is not registered in this process are never cached, so a
+    compile made before the type's module was imported cannot be served to a process that has it.
+    """
+    with open(path, 'rb') as f: raw_bytes = f.read()
+    digest = level_digest(raw_bytes)
+    cache_path = os.path.join(cache_dir, f"{digest}.pickle") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f: level = pickle.load(f)
+            if strict and level.errors: raise LevelCompileError(level.errors)
+            if not _registry_errors(level): return level
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+            pass
+    level = compile_level(json.loads(raw_bytes), digest, strict)
+    if cache_path and not _registry_errors(level):
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f: pickle.dump(level, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"WARNING: Could not cache compiled level: {e}")
+    return level
+
+
+def _validate_file(path, cache_dir=LEVEL_CACHE_DIR):
+    try:
+        return path, load_level(path, cache_dir).errors
+    except (OSError, ValueError) as e:
+        return path, [str(e)]
+
+
+def _import_handler_modules(modules):
+    """Pool initializer: fill a worker's registry by importing the modules that registered each type.
+
+    Forked workers inherit the parent's registry, but spawn and forkserver workers start with an
+    empty one, so every challenge would otherwise be reported as an unknown type.
+    """
+    import importlib
+    for module in modules:
+        try: importlib.import_module(module)
+        except ImportError as e: print(f"WARNING: Could not import challenge handlers from '{module}': {e}")
+
+
+def _handler_modules():
+    modules = {handler.__module__ for _, _, handler in CHALLENGE_TYPES.values()} | {BUILTIN_TYPES_MODULE}
+    return sorted(module for module in modules if module not in ("__main__", "__mp_main__"))
+
+
+def validate_catalogue(paths, workers=None, mp_context=None, cache_dir=LEVEL_CACHE_DIR):
+    """Compile every level in `paths` across a process pool, caching into `cache_dir`. Returns {path: [errors]}.
+
+    The built-in challenge types, and any registered from other importable modules, are available
+    in the workers whatever the multiprocessing start method (`mp_context`).
+    """
+    validate = functools.partial(_validate_file, cache_dir=cache_dir)
+    if workers == 1 or len(paths) < 2:
+        _import_handler_modules(_handler_modules())
+        return dict(map(validate, paths))
+    from concurrent.futures import ProcessPoolExecutor  # multiprocessing costs ~20 ms to import; only catalogue runs need it
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_import_handler_modules, initargs=(_handler_modules(),)) as pool:
+        return dict(pool.map(validate, paths, chunksize=max(1, len(paths) // ((workers or os.cpu_count() or 1) * 4))))
+
+
+if __name__ == "__main__":
+    # Go through the importable module so game_engine's built-in types land in the same registry.
+    import game_engine  # noqa: F401
+    from level_compiler import validate_catalogue
+
+    parser = argparse.ArgumentParser(description="Validate and precompile game_instructions.json levels.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    results = validate_catalogue(args.paths, args.workers)
+    bad = {path: errors for path, errors in results.items() if errors}
+    for path, errors in bad.items():
+        for error in errors: print(f"{path}: {error}")
+    print(f"Compiled {len(results)} level(s): {len(results) - len(bad)} clean, {len(bad)} with errors.")
+    raise SystemExit(1 if bad else 0)
@@ -0,0 +1,186 @@
+# FILE: level_stream.py (Play scene 1 while the LLM is still writing scenes 2-4)
+
+"""Streaming level generation.
+
+``SceneStreamParser`` consumes the model's output chunk by chunk and emits each object of the
+``"scenes"`` array the moment its closing brace arrives, so no scene waits for the whole
+adventure or for ``json.loads`` on the full text. ``StreamingLevel`` runs the model on a
+background thread and exposes the scenes as a replayable iterable that ``play_game`` can loop over
+(including after a death) while later scenes are still being produced. Scenes are compiled with
+``level_compiler.compile_scene`` as they arrive, so the engine plays them like any loaded level.
+
+Usage: python level_stream.py <player_id>   (prepares and plays in one process)
+"""
+
+import json
+import re
+import sys
+import threading
+import time
+
+from game_engine import is_scene_valid
+from level_compiler import CompiledLevel, compile_scene
+
+SCENES_KEY = re.compile(r'"scenes"\s*:\s*\[')
+TITLE_KEY = re.compile(r'"title"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+class SceneStreamParser:
+    """Incremental extractor for the top-level ``"scenes"`` array of an adventure."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.title = None
+        self.done = False
+        self._pos = 0
+        self._in_scenes = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = None
+
+    def feed(self, text):
+        """Add `text` and return the list of scene objects it completed."""
+        self.buffer += text
+        scenes = []
+        if self.title is None and (match := TITLE_KEY.search(self.buffer)):
+            self.title = json.loads(match.group(1))
+        if not self._in_scenes:
+            match = SCENES_KEY.search(self.buffer, self._pos)
+            if not match:
+                # Keep rescanning only the tail that could still hold a split '"scenes": [' token.
+                self._pos = max(0, len(self.buffer) - 32); return scenes
+            self._in_scenes = True; self._pos = match.end()
+        buffer = self.buffer
+        for index in range(self._pos, len(buffer)):
+            if self.done: break
+            char = buffer[index]
+            if self._in_string:
+                if self._escape: self._escape = False
+                elif char == '\\': self._escape = True
+                elif char == '"': self._in_string = False
+            elif char == '"': self._in_string = True
+            elif char == '{':
+                if self._depth == 0: self._start = index
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    try: scenes.append(json.loads(buffer[self._start:index + 1]))
+                    except ValueError: print("AGENT WARNING: Streamed scene was not valid JSON. Skipping.")
+            elif char == ']' and self._depth == 0:
+                self.done = True
+        self._pos = len(buffer)
+        return scenes
+
+
+def iter_scenes(chunks, parser=None):
+    """Yield compiled scenes from an iterable of text chunks as soon as each one is complete and valid."""
+    parser = parser or SceneStreamParser()
+    index = 0
+    for chunk in chunks:
+        for scene in parser.feed(chunk):
+            errors = []
+            compiled = compile_scene(scene, index, errors) if is_scene_valid(scene) else None
+            if compiled is None or errors:
+                print(f"AGENT WARNING: Streamed scene failed validation. Skipping: {json.dumps(scene)[:80]}"); continue
+            index += 1
+            yield compiled
+        if parser.done: break
+
+
+class StreamingScenes:
+    """Thread-safe, replayable scene list: iteration blocks for scenes that are not generated yet."""
+
+    def __init__(self):
+        self._scenes = []
+        self._cond = threading.Condition()
+        self.finished = False
+        self.error = None
+
+    def append(self, scene):
+        with self._cond: self._scenes.append(scene); self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond: self.finished = True; self.error = error; self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        with self._cond: return self._cond.wait_for(lambda: self.finished, timeout)
+
+    def snapshot(self):
+        with self._cond: return list(self._scenes)
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: index < len(self._scenes) or self.finished)
+                if index >= len(self._scenes): return
+                scene = self._scenes[index]
+            index += 1
+            yield scene
+
+
+class StreamingLevel:
+    """Runs one streaming generation on a background thread and collects its scenes."""
+
+    def __init__(self, prompt, model):
+        self.prompt = prompt
+        self.model = model
+        self.parser = SceneStreamParser()
+        self.scenes = StreamingScenes()
+        self.started_at = None
+        self.first_scene_s = None
+        self.total_s = None
+
+    def level(self, player_id, knobs, traits=None):
+        """A ``CompiledLevel`` for ``play_game`` whose scenes fill in while the model streams."""
+        return CompiledLevel(None, player_id, knobs, self.parser.title or "A Fated Encounter", self.scenes, traits=traits)
+
+    def _run(self):
+        error = None
+        try:
+            response = self.model.generate_content(self.prompt, stream=True)
+            for scene in iter_scenes((chunk.text for chunk in response), self.parser):
+                if self.first_scene_s is None: self.first_scene_s = time.perf_counter() - self.started_at
+                self.scenes.append(scene)
+        except Exception as e:
+            error = e
+            print(f"AGENT CRITICAL ERROR: Streaming generation failed. Error: {e}")
+        finally:
+            self.total_s = time.perf_counter() - self.started_at
+            self.scenes.finish(error)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        threading.Thread(target=self._run, name="level-stream", daemon=True).start()
+        return self
+
+    def to_content(self, timeout=None):
+        """Wait for the stream to end and return the complete, plain-dict adventure."""
+        self.scenes.wait(timeout)
+        return {"title": self.parser.title or "A Fated Encounter", "scenes": [scene.to_dict() for scene in self.scenes.snapshot()]}
+
+
+if __name__ == "__main__":
+    from game_engine import GAME_CONTEXT, get_report_outbox, play_game
+    from prepare_level import DEFAULT_PERSONA, build_generation_prompt, decide_knobs, fetch_persona_from_supermemory, get_llm
+
+    if len(sys.argv) < 2: print("Usage: python level_stream.py <player_id>"); sys.exit(1)
+    player_id = sys.argv[1]
+    persona_data, is_new_player = fetch_persona_from_supermemory(player_id)
+    if persona_data is None: persona_data, is_new_player = DEFAULT_PERSONA, True
+    knobs, _ = decide_knobs(persona_data, is_new_player)
+
+    print("AGENT: Streaming a new adventure...")
+    level = StreamingLevel(build_generation_prompt(persona_data), get_llm()).start()
+    if not next(iter(level.scenes), None):
+        print("AGENT CRITICAL ERROR: The stream produced no playable scenes."); sys.exit(1)
+    print(f"AGENT: First scene ready after {level.first_scene_s:.2f}s. Starting the game.")
+    play_game(player_id, level.level(player_id, knobs, persona_data.get('traits')), GAME_CONTEXT)
+
+    game_instructions = {"meta": {"player_id": player_id, "traits": persona_data.get('traits', {})}, "knobs": knobs, "content": level.to_content()}
+    with open("game_instructions.json", 'w') as f:
+        json.dump(game_instructions, f, indent=2)
+    print(f"AGENT: Full adventure took {level.total_s:.2f}s to generate; saved to 'game_instructions.json'.")
+    get_report_outbox().close(timeout=10.0)
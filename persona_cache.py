@@ -0,0 +1,178 @@
+# FILE: persona_cache.py (TTL cache in front of the /sm/personas endpoint)
+
+"""Cache for Supermemory persona lookups.
+
+Entries are keyed by ``(player_id, scope)`` and live in an in-memory LRU backed by a small on-disk
+store, so a fresh process preparing a level for an active player still skips the network. Within
+``ttl`` an entry is served as-is; past it but within ``stale_ttl`` it is served immediately while a
+small pool of ``refresh_workers`` threads revalidates it. Revalidation sends ``If-None-Match`` when
+the server gave us an ETag, so an unchanged persona costs a 304 instead of a full body. If the
+backend is unreachable, any cached entry, however old, is preferred over failing. The engine
+calls ``invalidate`` when it submits a run report, since the report changes the persona; that only
+marks the entry stale, so the next lookup revalidates it but an outage still has a copy to serve. The
+disk store keeps at most ``max_disk_entries`` files, dropping the least recently written.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache", "personas")
+DEFAULT_TTL = 300.0
+DEFAULT_STALE_TTL = 24 * 3600.0
+DEFAULT_MAX_DISK_ENTRIES = 10000
+PRUNE_EVERY = 256  # disk writes between checks of the store's size
+
+
+def _written_at(path):
+    try: return os.stat(path).st_mtime
+    except OSError: return 0.0
+
+
+class PersonaCache:
+    def __init__(self, url, api_key=None, *, ttl=DEFAULT_TTL, stale_ttl=DEFAULT_STALE_TTL, max_entries=256, max_disk_entries=DEFAULT_MAX_DISK_ENTRIES, refresh_workers=4, cache_dir=CACHE_DIR, timeout=5.0, session=None):
+        self.url = url
+        self.api_key = api_key
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.refresh_workers = refresh_workers
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "revalidated": 0, "fetched": 0, "errors": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = {}  # key -> Future of its background refresh
+        self._refresh_pool = None
+        self._writes = 0
+
+    # --- Storage ---
+    def _disk_path(self, key):
+        digest = hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key); return entry
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as fh: entry = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry; self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+
+    def _store(self, key, entry):
+        self._remember(key, entry)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._disk_path(key); tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as fh: json.dump(entry, fh)
+            os.replace(tmp_path, path)
+            with self._lock: self._writes += 1; prune = self._writes % PRUNE_EVERY == 0
+            if prune: self.prune()
+        except OSError as e:
+            print(f"AGENT WARNING: Could not write persona cache: {e}")
+
+    def prune(self):
+        """Delete the least recently written disk entries beyond `max_disk_entries`. Returns how many."""
+        paths = glob.glob(os.path.join(self.cache_dir, "*.json"))
+        if len(paths) <= self.max_disk_entries: return 0
+        removed = 0
+        for path in sorted(paths, key=_written_at)[:len(paths) - self.max_disk_entries]:
+            try: os.remove(path); removed += 1
+            except OSError: pass
+        return removed
+
+    def _count(self, name):
+        with self._lock: self.counters[name] += 1
+
+    def peek(self, player_id, scope="global"):
+        """The cached response for `player_id`, however old, without touching the network (None if absent)."""
+        entry = self._lookup((player_id, scope))
+        return entry["data"] if entry else None
+
+    def invalidate(self, player_id, scope="global"):
+        """Mark `player_id`'s cached persona stale, e.g. once a new run report makes it out of date.
+
+        The payload and ETag are kept: the next ``get`` revalidates with ``If-None-Match`` and still
+        falls back to this copy if the backend is unreachable.
+        """
+        key = (player_id, scope)
+        entry = self._lookup(key)
+        if entry: self._store(key, dict(entry, fetched_at=0.0))
+
+    # --- Network ---
+    def _fetch(self, key, entry):
+        """Fetch or revalidate `key`; returns the new entry. Raises requests exceptions on failure."""
+        player_id, scope = key
+        headers = {"X-API-Key": self.api_key}
+        if entry and entry.get("etag"): headers["If-None-Match"] = entry["etag"]
+        response = self.session.get(self.url, params={"player_id": player_id, "scope": scope, "limit": 1}, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and entry:
+            self._count("revalidated")
+            entry = dict(entry, fetched_at=time.time())
+        else:
+            response.raise_for_status()
+            self._count("fetched")
+            entry = {"data": response.json(), "etag": response.headers.get("ETag"), "fetched_at": time.time()}
+        self._store(key, entry)
+        return entry
+
+    def _refresh_in_background(self, key, entry):
+        with self._lock:
+            if key in self._refreshing: return
+            if self._refresh_pool is None: self._refresh_pool = ThreadPoolExecutor(self.refresh_workers, thread_name_prefix="persona-refresh")
+            self._refreshing[key] = self._refresh_pool.submit(self._background_refresh, key, entry)
+
+    def _background_refresh(self, key, entry):
+        try: self._fetch(key, entry)
+        except (requests.exceptions.RequestException, ValueError): self._count("errors")
+        finally:
+            with self._lock: self._refreshing.pop(key, None)
+
+    # --- Public API ---
+    def get(self, player_id, scope="global"):
+        """Return the decoded /sm/personas response for `player_id`, from cache when possible.
+
+        Raises the underlying ``requests`` exception only when nothing usable is cached.
+        """
+        key = (player_id, scope)
+        entry = self._lookup(key)
+        age = time.time() - entry["fetched_at"] if entry else None
+        if entry and age < self.ttl:
+            self._count("hits"); return entry["data"]
+        if entry and age < self.stale_ttl:
+            self._count("stale_hits")
+            self._refresh_in_background(key, entry)
+            return entry["data"]
+        self._count("misses")
+        try:
+            return self._fetch(key, entry)["data"]
+        except (requests.exceptions.RequestException, ValueError):
+            self._count("errors")
+            if entry: return entry["data"]
+            raise
+
+    def stats(self):
+        with self._lock: return dict(self.counters, entries=len(self._entries))
+
+    def wait(self, timeout=None):
+        """Wait for in-flight background refreshes, e.g. before a short-lived process exits."""
+        with self._lock: futures = list(self._refreshing.values())
+        if futures: wait(futures, timeout)
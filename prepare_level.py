@@ -1,76 +1,98 @@
 # FILE: prepare_level.py (Final, robust version for Supermemory integration)
 
-import google.generativeai as genai
 import json
 import sys
-import os
-import requests
 import time
-from dotenv import load_dotenv
-
-# --- CONFIGURATION ---
-BACKEND_URL = "http://192.168.0.199:7769"
+from config import get_config
+from content_pool import ContentPool
+from renderer import clear_screen, typewriter_print
+from startup import mark
+from tracing import count, observe, span
 
 # --- LLM Setup ---
-load_dotenv(); GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY: raise ValueError("GEMINI_API_KEY not found.")
-genai.configure(api_key=GEMINI_API_KEY); llm = genai.GenerativeModel('gemini-pro-latest')
-
-# --- Display Helpers ---
-def clear_screen():
-    """Clear the terminal screen."""
-    os.system('cls' if os.name == 'nt' else 'clear')
-
-def typewriter_print(text, delay=0.03):
-    """Print text with a typewriter effect."""
-    import time
-    for char in text:
-        print(char, end='', flush=True)
-        time.sleep(delay)
-    print()
-
-
-def fetch_persona_from_supermemory(player_id, scope="global"):
+# The SDK (google.generativeai), requests (persona_cache) and numpy (difficulty_model) are imported, and
+# their keys checked, the first time they are needed, so importing this module stays cheap and offline.
+_llm = None
+def get_llm():
+    """The Gemini model, configured on first use; raises config.ConfigError without GEMINI_API_KEY."""
+    global _llm
+    if _llm is None:
+        config = get_config(); api_key = config.require("gemini_api_key")
+        import google.generativeai as genai
+        genai.configure(api_key=api_key); _llm = genai.GenerativeModel(config.gemini_model)
+    return _llm
+
+# --- Persona Cache ---
+_persona_cache = None
+def get_persona_cache():
+    global _persona_cache
+    if _persona_cache is None:
+        from persona_cache import PersonaCache
+        config = get_config()
+        _persona_cache = PersonaCache(f"{config.backend_url}/sm/personas", api_key=config.chronicle_api_key)
+    return _persona_cache
+
+# Knobs fitted from past run reports (python difficulty_model.py fit ...); None until one has been fitted
+_difficulty_model = False
+def get_difficulty_model():
+    global _difficulty_model
+    if _difficulty_model is False:
+        from difficulty_model import DifficultyModel
+        _difficulty_model = DifficultyModel.load()
+    return _difficulty_model
+
+# Local fallback when the backend cannot provide any persona
+DEFAULT_PERSONA = {"traits": {"aggression": 0.5, "stealth": 0.5, "curiosity": 0.5, "puzzle_affinity": 0.5, "independence": 0.5, "resilience": 0.5, "goal_focus": 0.5}}
+
+
+def fetch_persona_from_supermemory(player_id, scope="global", log=print):
     """
     Makes a GET request to the backend. Now correctly handles the 'default' response for new players.
-    Returns a tuple: (persona_object, is_new_player_boolean)
+    Returns a tuple: (persona_object, is_new_player_boolean). Progress messages go to `log`.
     """
-    print(f"AGENT: Fetching '{scope}' persona for player '{player_id}'...")
-    url = f"{BACKEND_URL}/sm/personas?player_id={player_id}&scope={scope}&limit=1"
-    headers = {"X-API-Key": os.getenv("CHRONICLE_API_KEY")}
-    
+    log(f"AGENT: Fetching '{scope}' persona for player '{player_id}'...")
+    persona_cache = get_persona_cache()
+    import requests
     try:
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            # Case 1: Existing player found
-            if data.get('total', 0) > 0 and data['items'][0].get('persona'):
-                print("AGENT: Existing persona successfully fetched.")
-                return data['items'][0]['persona'], False # False means NOT a new player
-            # Case 2: New player detected, API provides a default persona
-            elif 'default' in data and data['default'].get('persona'):
-                print("AGENT: New player detected. Using default persona from API.")
-                # We extract the global persona from the default structure
-                return data['default']['persona']['global'], True # True means IS a new player
-            else:
-                print("AGENT WARNING: API response was not in the expected format. Using local default.")
-                return None, True
+        with span("persona.fetch", scope=scope): data = persona_cache.get(player_id, scope)
+        # Case 1: Existing player found
+        if data.get('total', 0) > 0 and data['items'][0].get('persona'):
+            log("AGENT: Existing persona successfully fetched."); count("persona_fetches_total", result="existing")
+            return data['items'][0]['persona'], False # False means NOT a new player
+        # Case 2: New player detected, API provides a default persona
+        elif 'default' in data and data['default'].get('persona'):
+            log("AGENT: New player detected. Using default persona from API."); count("persona_fetches_total", result="new")
+            # We extract the global persona from the default structure
+            return data['default']['persona']['global'], True # True means IS a new player
         else:
-            print(f"AGENT ERROR: Failed to fetch persona. Status: {response.status_code}"); return None, True
-    except requests.exceptions.ConnectionError:
-        print(f"AGENT CRITICAL ERROR: Could not connect to backend at {BACKEND_URL}."); return None, True
-
-def decide_knobs(persona, is_new_player):
+            log("AGENT WARNING: API response was not in the expected format. Using local default."); count("persona_fetches_total", result="unexpected")
+            return None, True
+    except requests.exceptions.HTTPError as e:
+        log(f"AGENT ERROR: Failed to fetch persona. Status: {e.response.status_code}"); count("persona_fetches_total", result="http_error"); return None, True
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        log(f"AGENT CRITICAL ERROR: Could not connect to backend at {get_config().backend_url}."); count("persona_fetches_total", result="unreachable"); return None, True
+    except ValueError:
+        log("AGENT WARNING: API response was not valid JSON. Using local default."); count("persona_fetches_total", result="invalid"); return None, True
+    except requests.exceptions.RequestException as e:
+        log(f"AGENT ERROR: Failed to fetch persona: {e}"); count("persona_fetches_total", result="request_error"); return None, True
+
+def decide_knobs(persona, is_new_player, log=print):
     """
     Decides knobs based on persona traits. Now makes the first level easier.
+    Returning players get the fitted difficulty model's knobs when one is available; the thresholds below are the fallback.
     """
-    print("AGENT: Deciding difficulty knobs...")
+    log("AGENT: Deciding difficulty knobs...")
     
     # --- THIS IS THE "EASY FIRST LEVEL" FIX ---
     if is_new_player:
-        print("AGENT -> New player detected. Applying 'Welcome Mat' difficulty settings.")
+        log("AGENT -> New player detected. Applying 'Welcome Mat' difficulty settings.")
         return {"enemy_count": 2, "enemy_speed": 0.7}, ["New player detected. Setting easier difficulty."]
 
+    difficulty_model = get_difficulty_model()
+    if difficulty_model is not None:
+        with span("knobs.model"): knobs = difficulty_model.knobs_for(persona)
+        return knobs, [f"Tuned from {difficulty_model.records} past runs to aim for about {difficulty_model.target:g} retries."]
+
     # Standard logic for returning players
     knobs = {"enemy_count": 3, "enemy_speed": 1.0}
     reasons = []
@@ -82,8 +104,8 @@ def decide_knobs(persona, is_new_player):
     if not reasons: reasons.append("Balanced profile. Using standard difficulty.")
     return knobs, reasons
 
-def generate_llm_content(persona):
-    """Generates creative content from the LLM with the final, strictest prompt."""
+def build_generation_prompt(persona):
+    """Builds the final, strictest adventure prompt for `persona`."""
     persona_summary = json.dumps(persona.get('traits', {}))
     
     # --- THIS IS THE FINAL, ULTRA-STRICT PROMPT ---
@@ -112,13 +134,31 @@ def generate_llm_content(persona):
 
     Generate the JSON object now.
     """
-    try:
-        print("AGENT: Asking SDK for a varied and creative adventure..."); response = llm.generate_content(prompt)
-        json_text = response.text.strip().replace('```json', '').replace('```', ''); parsed_json = json.loads(json_text)
-        if not isinstance(parsed_json, dict): raise ValueError("SDK did not return a dictionary.")
-        return parsed_json
-    except Exception as e:
-        print(f"AGENT CRITICAL ERROR: SDK failed to generate valid JSON. Error: {e}"); return None
+    return prompt
+
+def generate_llm_content(persona, model=None, log=print):
+    """Generates creative content from the LLM with the final, strictest prompt.
+
+    `model` is anything with a genai-style ``generate_content(prompt).text``; defaults to the Gemini model.
+    """
+    model = model or get_llm()
+    prompt = build_generation_prompt(persona)
+    with span("llm.generate") as generation:
+        try:
+            log("AGENT: Asking SDK for a varied and creative adventure...")
+            with span("llm.call"): response = model.generate_content(prompt); text = response.text
+            observe("llm_response_bytes", len(text))
+            with span("llm.parse"):
+                json_text = text.strip().replace('```json', '').replace('```', ''); parsed_json = json.loads(json_text)
+            if not isinstance(parsed_json, dict): raise ValueError("SDK did not return a dictionary.")
+            count("llm_generations_total", result="ok")
+            return parsed_json
+        except Exception as e:
+            generation.set(error=type(e).__name__); count("llm_generations_total", result="error")
+            log(f"AGENT CRITICAL ERROR: SDK failed to generate valid JSON. Error: {e}"); return None
+
+# --- Content Pool ---
+content_pool = ContentPool(generate_llm_content)
 
 # ... (display_generation_summary and main logic are the same, just paste them in)
 def display_generation_summary(player_id,persona,knob_reasons,content):
@@ -133,13 +173,14 @@ def display_generation_summary(player_id,persona,knob_reasons,content):
         challenge_counts={};
         for scene in content['scenes']:challenge_type=scene.get('challenge',{}).get('type','UNKNOWN');challenge_counts[challenge_type]=challenge_counts.get(challenge_type,0)+1
         print(f"  Our AI Storyteller has crafted a chapter called: '{content.get('title','A Fated Encounter')}'");print("  This adventure will feature:")
-        for challenge_type,count in challenge_counts.items():
-            challenge_description={"QTE":f"{count} test(s) of strength.","RIDDLE":f"{count} riddle(s) of intellect.","JUMP_CHASM":f"{count} leap(s) of faith.","SEQUENCE_MEMORY":f"{count} puzzle(s) of memory.","DILEMMA":f"{count} choice(s) with consequences.","FIND_COLLECTIBLE":f"{count} secret(s) to discover."}.get(challenge_type,f"{count} unknown trial(s).");typewriter_print(f"    - {challenge_description}",delay=0.04)
+        for challenge_type,occurrences in challenge_counts.items():
+            challenge_description={"QTE":f"{occurrences} test(s) of strength.","RIDDLE":f"{occurrences} riddle(s) of intellect.","JUMP_CHASM":f"{occurrences} leap(s) of faith.","SEQUENCE_MEMORY":f"{occurrences} puzzle(s) of memory.","DILEMMA":f"{occurrences} choice(s) with consequences.","FIND_COLLECTIBLE":f"{occurrences} secret(s) to discover."}.get(challenge_type,f"{occurrences} unknown trial(s).");typewriter_print(f"    - {challenge_description}",delay=0.04)
         print()
     else:print("  * The AI Storyteller failed to generate content.")
     print("="*60);print("  PREPARE YOURSELF...");print("="*60);time.sleep(3)
 
 if __name__ == "__main__":
+    mark("modules imported")
     if len(sys.argv) < 2: print("Usage: python prepare_level.py <player_id>"); sys.exit(1)
     player_id = sys.argv[1]
     
@@ -148,17 +189,23 @@ if __name__ == "__main__":
     
     if persona_data is None: 
         # Fallback if API fails completely
-        persona_data = {"traits": {"aggression": 0.5, "stealth": 0.5, "curiosity": 0.5, "puzzle_affinity": 0.5, "independence": 0.5, "resilience": 0.5, "goal_focus": 0.5}}
+        persona_data = DEFAULT_PERSONA
         is_new_player = True # Treat as new player if API fails
     
     # Pass the is_new_player flag to the knobs function
     knobs, knob_reasons = decide_knobs(persona_data, is_new_player)
     
-    content = generate_llm_content(persona_data)
+    content_pool.start()
+    with span("content_pool.serve"): content, pooled = content_pool.take_or_generate(persona_data)
+    count("content_pool_takes_total", result="hit" if pooled else "miss")
+    if pooled: print("AGENT: Serving a pre-generated adventure from the content pool.")
     
     if content:
-        game_instructions = {"meta": {"player_id": player_id}, "knobs": knobs, "content": content}
-        with open("game_instructions.json", 'w') as f:
+        game_instructions = {"meta": {"player_id": player_id, "traits": persona_data.get('traits', {})}, "knobs": knobs, "content": content}
+        with span("level.write"), open("game_instructions.json", 'w') as f:
             json.dump(game_instructions, f, indent=2)
         display_generation_summary(player_id, persona_data, knob_reasons, content)
-        print(f"\nSUCCESS! New instructions saved to 'game_instructions.json'.\nRun 'python game_engine.py' to play.")
\ No newline at end of file
+        print("\nSUCCESS! New instructions saved to 'game_instructions.json'.\nRun 'python game_engine.py' to play.")
+    get_persona_cache().wait(timeout=5.0)
+    # The refill queued by take_or_generate() ran during the summary screen; whatever is left is saved for 'python content_pool.py'.
+    if content_pool.close(timeout=0): print("AGENT: The content pool will be topped up by the next run.")
\ No newline at end of file
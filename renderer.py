@@ -0,0 +1,129 @@
+# FILE: renderer.py (Buffered ANSI terminal output shared by the game and the level preparer)
+
+"""Buffered terminal rendering.
+
+Output is composed in memory and written in one ``write``/``flush`` per frame rather than one per
+character. ``typewriter_print`` paces its reveal against a frame clock (``frame_rate`` frames per
+second): each frame writes every character that has become due since the last one, so the number
+of writes depends on the frame rate, not on the length of the text. Pressing Enter or Space while
+text is animating shows the rest at once; that key is consumed, while anything else typed meanwhile
+stays queued for the game. Instant mode (``set_instant(True)`` or ``INSTANT_TEXT=1`` in the
+environment) skips the animation entirely. ``clear_screen`` emits ANSI escape sequences instead of
+spawning ``clear``/``cls``.
+"""
+
+import itertools
+import os
+import sys
+import time
+
+CLEAR_SCREEN = "\x1b[2J\x1b[3J\x1b[H"
+SKIP_KEYS = {"\n", "\r", " "}
+DEFAULT_FRAME_RATE = 30
+
+
+def _enable_windows_ansi():
+    """Turn on VT escape processing for the Windows console (no-op elsewhere or when unsupported)."""
+    if os.name != 'nt': return
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)
+        mode = ctypes.c_uint32()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)): kernel32.SetConsoleMode(handle, mode.value | 0x0004)
+    except Exception:
+        pass
+
+
+class Renderer:
+    def __init__(self, stream=None, frame_rate=DEFAULT_FRAME_RATE, instant=None, allow_skip=True):
+        self._stream = stream
+        self.frame_interval = 1.0 / frame_rate
+        self.instant = os.getenv("INSTANT_TEXT", "") not in ("", "0") if instant is None else instant
+        self.allow_skip = allow_skip
+        self.session_keyboard = None  # set by LiveIO.session() while a game holds the terminal in cbreak mode
+        self._buffer = []
+        _enable_windows_ansi()
+
+    @property
+    def stream(self):
+        # Resolved per call so redirecting sys.stdout (tests, servers) is honoured.
+        return self._stream or sys.stdout
+
+    def write(self, text):
+        self._buffer.append(text)
+
+    def flush(self):
+        if self._buffer:
+            self.stream.write("".join(self._buffer)); self._buffer.clear()
+        self.stream.flush()
+
+    def clear_screen(self):
+        self.write(CLEAR_SCREEN); self.flush()
+
+    def _keyboard(self):
+        """A skip-key listener, only when reading keys cannot steal piped input meant for input()."""
+        if not self.allow_skip: return None
+        try:
+            if not (sys.stdin.isatty() and self.stream.isatty()): return None
+        except (AttributeError, ValueError):
+            return None
+        if self.session_keyboard is not None: return self.session_keyboard
+        from keyboard_input import KeyboardInput
+        return KeyboardInput()
+
+    def typewriter(self, text, delay=0.03, end="\n"):
+        if self.instant or delay <= 0 or not text:
+            self.write(text + end); self.flush(); return
+        keyboard = self._keyboard()
+        if keyboard is None or keyboard is self.session_keyboard:
+            # The session keyboard is already entered; re-entering it would empty its queue.
+            self._animate(text, delay, keyboard)
+        else:
+            with keyboard: self._animate(text, delay, keyboard)
+        self.write(end); self.flush()
+
+    @staticmethod
+    def _take_skip_key(keyboard, known):
+        """Remove the first skip key queued after the first `known` events; other keys stay queued."""
+        for index, event in enumerate(itertools.islice(keyboard.events, known, None), known):
+            if event.key in SKIP_KEYS: del keyboard.events[index]; return True
+        return False
+
+    def _animate(self, text, delay, keyboard):
+        known = len(keyboard.events) if keyboard is not None else 0  # keys typed before this text are not skips
+        start = time.monotonic()
+        shown = 0
+        while shown < len(text):
+            now = time.monotonic()
+            due = min(len(text), int((now - start) / delay) + 1)
+            if due > shown:
+                self.write(text[shown:due]); self.flush(); shown = due
+                if shown >= len(text): break
+            # Sleep until the next frame, or until the next character is due if that is later.
+            wait = max(self.frame_interval, start + shown * delay - time.monotonic())
+            if keyboard is None:
+                time.sleep(wait)
+            elif keyboard.poll(wait) and self._take_skip_key(keyboard, known):
+                self.write(text[shown:]); self.flush(); return
+
+
+_renderer = Renderer()
+
+
+def get_renderer():
+    return _renderer
+
+
+def set_instant(instant=True):
+    _renderer.instant = instant
+
+
+def clear_screen():
+    """Clear the terminal screen."""
+    _renderer.clear_screen()
+
+
+def typewriter_print(text, delay=0.03):
+    """Print text with a typewriter effect."""
+    _renderer.typewriter(text, delay)
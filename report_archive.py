@@ -0,0 +1,362 @@
+# FILE: report_archive.py (Local columnar store of run reports for fast aggregate queries)
+
+"""Columnar, memory-mapped run-report archive.
+
+Every report's fixed-width fields (the ``stats`` counters, outcome, completion time and, when the
+engine knows them, the persona traits its knobs were tuned for and deaths per challenge type) are appended to one little-endian
+binary file per column, so a scan reads only the columns it needs, straight from a ``np.memmap``
+without parsing or copying. Variable fields (player ID, knobs, ``game_context``, outcome strings)
+are dictionary-encoded: the column stores an integer code and ``dictionary.ndjson`` maps codes to
+values. Columns live in segments (``seg-000001/``) of up to ``SEGMENT_ROWS`` rows; a segment's
+``rows`` file is the commit point, rewritten atomically after its columns are appended, so a crash
+mid-append never exposes a partial row.
+
+Each row also keeps a 64-bit hash of its ``session_id``, so ``ingest`` skips reports that are
+already archived; the engine archives every run it submits, so most spooled reports are.
+
+    archive = ReportArchive()
+    archive.aggregate(group_by="knobs", metrics={"runs": "count", "win_rate": ("win", "mean")})
+    archive.deaths_by_type(where={"result": "win"})
+
+Usage: python report_archive.py ingest spool/run_reports logs/sm_responses.log
+       python report_archive.py summary [--group-by knobs] [--where result=win]
+"""
+
+import argparse
+import calendar
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single writer process per archive is assumed
+    fcntl = None
+
+ARCHIVE_DIR = os.path.join(os.path.dirname(__file__), "archive", "run_reports")
+SEGMENT_ROWS = 1 << 20
+STAT_COLUMNS = ("time_s", "deaths", "retries", "distance_traveled", "jumps", "hint_offers", "hints_used", "riddles_attempted", "riddles_correct", "combats_initiated", "combats_won", "collectibles_found")
+CHALLENGE_TYPES = ("QTE", "RIDDLE", "SEQUENCE_MEMORY", "DILEMMA", "JUMP_CHASM", "FIND_COLLECTIBLE")
+TRAIT_COLUMNS = ("aggression", "stealth", "curiosity", "puzzle_affinity", "independence", "resilience", "goal_focus")
+DICTIONARY_COLUMNS = ("player_id", "result", "path", "knobs", "game_context")
+MISSING_DEATHS = -1  # deaths_<type> for reports archived without per-type counts
+
+# Column name -> numpy dtype. Dictionary-encoded columns hold codes into dictionary.ndjson.
+COLUMNS = {
+    "completed_at": "<i8", "run_index": "<i4", "session": "<u8",
+    **{name: "<u4" for name in DICTIONARY_COLUMNS},
+    **{name: "<i4" for name in STAT_COLUMNS},
+    **{f"deaths_{name}": "<i2" for name in CHALLENGE_TYPES},
+    **{f"trait_{name}": "<f4" for name in TRAIT_COLUMNS},
+}
+AGGREGATES = ("count", "sum", "mean", "min", "max")
+
+
+def _reports_in(document):
+    """Run reports inside a JSON document: the document itself, a list of them, or a logged response body."""
+    if isinstance(document, list):
+        for item in document: yield from _reports_in(item)
+    elif isinstance(document, dict):
+        if isinstance(document.get('stats'), dict) and isinstance(document.get('config_used'), dict): yield document
+        elif 'body' in document and 'status_code' in document: yield from _reports_in(document['body'])
+
+
+def iter_reports(paths):
+    """Yield run reports from JSON files, NDJSON files, directories of either, and sm_logger logs."""
+    for path in paths:
+        if os.path.isdir(path):
+            yield from iter_reports(sorted(glob.glob(os.path.join(path, "*.json")) + glob.glob(os.path.join(path, "*.ndjson"))))
+        elif path.endswith(".log"):
+            from sm_logger import LogReader
+            for entry in LogReader(path).query(): yield from _reports_in(entry)
+        else:
+            with open(path, encoding="utf-8") as f:
+                if path.endswith((".ndjson", ".jsonl")):
+                    for line in f:
+                        if line.strip(): yield from _reports_in(json.loads(line))
+                else:
+                    yield from _reports_in(json.load(f))
+
+
+def _canonical(value):
+    return value if isinstance(value, str) else json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def session_hash(session_id):
+    """64-bit key of a ``session_id`` for the ``session`` column (0 is reserved for "unknown")."""
+    if not session_id: return 0
+    return int.from_bytes(hashlib.sha1(str(session_id).encode("utf-8")).digest()[:8], "little") or 1
+
+
+def _epoch(timestamp):
+    try: return calendar.timegm(time.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ"))
+    except (TypeError, ValueError): return 0
+
+
+class ReportArchive:
+    def __init__(self, path=ARCHIVE_DIR, segment_rows=SEGMENT_ROWS):
+        self.path = path
+        self.segment_rows = segment_rows
+        self._lock = threading.Lock()
+        self._values = {name: [] for name in DICTIONARY_COLUMNS}   # code -> canonical value
+        self._codes = {name: {} for name in DICTIONARY_COLUMNS}    # canonical value -> code
+        self._dictionary_offset = 0
+        os.makedirs(path, exist_ok=True)
+        self._load_dictionary()
+
+    # --- Dictionary side table ---
+    def _load_dictionary(self):
+        """Read dictionary entries added since the last call (by this or another writer)."""
+        try:
+            with open(os.path.join(self.path, "dictionary.ndjson"), "rb") as f:
+                f.seek(self._dictionary_offset); data = f.read()
+        except FileNotFoundError:
+            return
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            column, code, value = json.loads(line)
+            if code == len(self._values[column]): self._values[column].append(value); self._codes[column][value] = code
+        self._dictionary_offset += end
+
+    def _encode(self, column, value, new_entries):
+        key = _canonical(value)
+        code = self._codes[column].get(key)
+        if code is None:
+            code = len(self._values[column]); self._values[column].append(key); self._codes[column][key] = code
+            new_entries.append(json.dumps([column, code, key]) + "\n")
+        return code
+
+    def decode(self, column, code):
+        value = self._values[column][code]
+        return value if column in ("player_id", "result", "path") else json.loads(value)
+
+    # --- Segments ---
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.path, "seg-*")))
+
+    def rows_in(self, segment):
+        try:
+            with open(os.path.join(segment, "rows")) as f: return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _commit(self, segment, rows):
+        tmp_path = os.path.join(segment, "rows.tmp")
+        with open(tmp_path, "w") as f: f.write(str(rows)); f.flush(); os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(segment, "rows"))
+
+    def _writable_segment(self):
+        segments = self.segments()
+        if segments and self.rows_in(segments[-1]) < self.segment_rows: return segments[-1]
+        segment = os.path.join(self.path, f"seg-{len(segments) + 1:06d}")
+        os.makedirs(segment, exist_ok=True); self._commit(segment, 0)
+        return segment
+
+    # --- Writing ---
+    def _row(self, report, deaths_by_type, traits, new_entries):
+        stats = report.get('stats', {}); outcome = report.get('run_outcome', {}); config = report.get('config_used', {})
+        traits = traits or config.get('persona_traits') or {}  # reports spooled by older versions carried their traits
+        row = {"completed_at": _epoch(report.get('completed_at')), "run_index": report.get('run_index', 0), "session": session_hash(report.get('session_id')),
+               "player_id": self._encode("player_id", str(report.get('player_id')), new_entries),
+               "result": self._encode("result", str(outcome.get('result')), new_entries), "path": self._encode("path", str(outcome.get('path')), new_entries),
+               "knobs": self._encode("knobs", config.get('knobs', {}), new_entries), "game_context": self._encode("game_context", report.get('game_context', {}), new_entries)}
+        row.update({name: stats.get(name, 0) for name in STAT_COLUMNS})
+        row.update({f"deaths_{name}": (deaths_by_type or {}).get(name, MISSING_DEATHS if deaths_by_type is None else 0) for name in CHALLENGE_TYPES})
+        row.update({f"trait_{name}": traits.get(name, np.nan) for name in TRAIT_COLUMNS})
+        return row
+
+    def append(self, report, deaths_by_type=None, traits=None):
+        """Archive one run report; `deaths_by_type` maps challenge type -> deaths and `traits` holds the
+        persona traits the knobs were tuned for, when the caller has them (neither is sent to the backend)."""
+        self.append_many([(report, deaths_by_type, traits)])
+
+    def append_many(self, items, skip_archived=False):
+        """Archive many ``(report, deaths_by_type[, traits])`` tuples (or bare reports) in one locked, batched write.
+
+        With `skip_archived`, reports whose ``session_id`` is already archived (or repeated within
+        `items`) are left out. Returns how many reports were archived.
+        """
+        items = [(item + (None,) * (3 - len(item))) if isinstance(item, tuple) else (item, None, None) for item in items]
+        with self._lock, open(os.path.join(self.path, ".lock"), "a") as lock_file:
+            if fcntl: fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if skip_archived:
+                seen = set(self.session_hashes().tolist()); fresh = []
+                for item in items:
+                    key = session_hash(item[0].get('session_id'))
+                    if key and key in seen: continue
+                    seen.add(key); fresh.append(item)
+                items = fresh
+            if not items: return 0
+            self._load_dictionary()
+            new_entries = []
+            rows = [self._row(report, deaths, traits, new_entries) for report, deaths, traits in items]
+            if new_entries:
+                with open(os.path.join(self.path, "dictionary.ndjson"), "a", encoding="utf-8") as f: f.writelines(new_entries); f.flush(); os.fsync(f.fileno())
+                self._dictionary_offset = os.path.getsize(os.path.join(self.path, "dictionary.ndjson"))
+            while rows:
+                segment = self._writable_segment(); committed = self.rows_in(segment)
+                batch, rows = rows[:self.segment_rows - committed], rows[self.segment_rows - committed:]
+                for name, dtype in COLUMNS.items():
+                    column_path = os.path.join(segment, f"{name}.bin")
+                    with open(column_path, "ab") as f:
+                        f.truncate(committed * np.dtype(dtype).itemsize)  # drop any uncommitted tail from a crashed writer
+                        f.write(np.array([row[name] for row in batch], dtype=dtype).tobytes())
+                self._commit(segment, committed + len(batch))
+        return len(items)
+
+    # --- Reading ---
+    def column(self, segment, name, rows):
+        """Memory-mapped view of one column of a segment (no copy)."""
+        if name == "win": return self.column(segment, "result", rows) == self._codes["result"].get("win", -1)
+        return np.memmap(os.path.join(segment, f"{name}.bin"), dtype=COLUMNS[name], mode="r", shape=(rows,))
+
+    def session_hashes(self):
+        """``session_hash`` of every archived report (0 where the session is unknown)."""
+        parts = []
+        for segment in self.segments():
+            rows = self.rows_in(segment)
+            if rows and os.path.exists(os.path.join(segment, "session.bin")):  # segments older than the column have none
+                parts.append(np.asarray(self.column(segment, "session", rows)))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=COLUMNS["session"])
+
+    def __len__(self):
+        return sum(self.rows_in(segment) for segment in self.segments())
+
+    def _mask(self, segment, rows, where, since, until):
+        mask = np.ones(rows, dtype=bool)
+        if since is not None: mask &= self.column(segment, "completed_at", rows) >= since
+        if until is not None: mask &= self.column(segment, "completed_at", rows) <= until
+        for name, wanted in (where or {}).items():
+            values = self.column(segment, name, rows)
+            if callable(wanted): mask &= wanted(values); continue
+            wanted = list(wanted) if isinstance(wanted, (list, tuple, set)) else [wanted]
+            if name in DICTIONARY_COLUMNS:
+                wanted = [self._codes[name].get(_canonical(value), -1) for value in wanted]
+            mask &= np.isin(values, wanted)
+        return mask
+
+    def _groups(self, segment, rows, select, group_by):
+        """Per-row group index and the key columns of each group, without sorting rows where possible.
+
+        Dictionary columns are already dense codes; other columns are factorized with ``np.unique``.
+        The per-column indices are combined into one mixed-radix index, which is compacted with a
+        ``bincount`` when the key space is small and ``np.unique`` otherwise.
+        """
+        levels, indices = [], []
+        for name in group_by:
+            values = np.asarray(self.column(segment, name, rows))[select]
+            if name in DICTIONARY_COLUMNS: levels.append(np.arange(len(self._values[name]))); indices.append(values.astype(np.intp))
+            else: level, index = np.unique(values, return_inverse=True); levels.append(level); indices.append(index.reshape(-1))
+        if not group_by: return np.zeros((1, 0)), np.zeros(rows if isinstance(select, slice) else int(select.sum()), dtype=np.intp)
+        dims = tuple(max(len(level), 1) for level in levels)
+        combined = np.ravel_multi_index(indices, dims) if len(indices) > 1 else indices[0]
+        if np.prod(dims, dtype=np.float64) <= 4 * len(combined) + 1024:
+            present = np.flatnonzero(np.bincount(combined, minlength=int(np.prod(dims))))
+            remap = np.empty(int(np.prod(dims)), dtype=np.intp); remap[present] = np.arange(len(present))
+            inverse = remap[combined]
+        else:
+            present, inverse = np.unique(combined, return_inverse=True); inverse = inverse.reshape(-1)
+        keys = np.stack([level[index] for level, index in zip(levels, np.unravel_index(present, dims))], axis=1)
+        return keys, inverse
+
+    def aggregate(self, group_by=(), metrics=None, where=None, since=None, until=None):
+        """Group-by aggregate over every segment.
+
+        `group_by` is a column name or a tuple of them; `metrics` maps an output name to ``"count"`` or
+        ``(column, "sum" | "mean" | "min" | "max")``; `where` maps a column to a value, a collection of
+        values, or a predicate over the column array (dictionary columns take decoded values).
+        ``win`` is a virtual 0/1 column. Rows missing a float key (a trait that was not recorded) form
+        one group keyed None. Returns a list of dicts, one per group.
+        """
+        self._load_dictionary()
+        group_by = (group_by,) if isinstance(group_by, str) else tuple(group_by)
+        metrics = metrics or {"runs": "count"}
+        totals = {}
+        for segment in self.segments():
+            rows = self.rows_in(segment)
+            if not rows: continue
+            mask = self._mask(segment, rows, where, since, until)
+            if not mask.any(): continue
+            select = slice(None) if mask.all() else mask
+            keys, inverse = self._groups(segment, rows, select, group_by)
+            counts = np.bincount(inverse, minlength=len(keys))
+            partials = {}
+            for out_name, spec in metrics.items():
+                if spec == "count": continue
+                name, how = spec
+                values = np.asarray(self.column(segment, name, rows))[select].astype(np.float64)
+                if how in ("sum", "mean"): partials[out_name] = np.bincount(inverse, weights=values, minlength=len(keys))
+                elif how in ("min", "max"):
+                    result = np.full(len(keys), np.inf if how == "min" else -np.inf)
+                    (np.minimum if how == "min" else np.maximum).at(result, inverse, values); partials[out_name] = result
+                else: raise ValueError(f"unknown aggregate '{how}' (expected one of {AGGREGATES})")
+            for i, key in enumerate(map(tuple, keys.tolist())):
+                # Each segment factorizes on its own, and NaN != NaN: give every missing value one key.
+                key = tuple(None if value != value else value for value in key)
+                total = totals.setdefault(key, {"count": 0})
+                total["count"] += int(counts[i])
+                for out_name, spec in metrics.items():
+                    if spec == "count": continue
+                    how = spec[1]; value = float(partials[out_name][i])
+                    if out_name not in total: total[out_name] = value
+                    elif how in ("sum", "mean"): total[out_name] += value
+                    else: total[out_name] = (min if how == "min" else max)(total[out_name], value)
+        results = []
+        for key, total in sorted(totals.items(), key=lambda item: tuple((value is None, value or 0) for value in item[0])):
+            row = {name: (self.decode(name, int(value)) if name in DICTIONARY_COLUMNS else value) for name, value in zip(group_by, key)}
+            for out_name, spec in metrics.items():
+                if spec == "count": row[out_name] = total["count"]
+                elif spec[1] == "mean": row[out_name] = total[out_name] / total["count"]
+                else: row[out_name] = total[out_name]
+            results.append(row)
+        return results
+
+    def deaths_by_type(self, where=None, since=None, until=None):
+        """Total deaths per challenge type over reports archived with per-type counts."""
+        where = dict(where or {}, deaths_QTE=lambda values: values != MISSING_DEATHS)
+        [row] = self.aggregate((), {name: (f"deaths_{name}", "sum") for name in CHALLENGE_TYPES}, where, since, until) or [{name: 0.0 for name in CHALLENGE_TYPES}]
+        return {name: int(row[name]) for name in CHALLENGE_TYPES}
+
+
+_archive = None
+def get_report_archive():
+    """The process-wide archive under ``archive/run_reports/``, opened on first use."""
+    global _archive
+    if _archive is None: _archive = ReportArchive()
+    return _archive
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest and query the local run-report archive.")
+    parser.add_argument("command", choices=["ingest", "summary"])
+    parser.add_argument("paths", nargs="*", help="(ingest) report JSON/NDJSON files, directories of them, or sm_logger .log files")
+    parser.add_argument("--archive", default=ARCHIVE_DIR)
+    parser.add_argument("--group-by", action="append", default=None)
+    parser.add_argument("--where", action="append", default=[], metavar="COLUMN=VALUE")
+    parser.add_argument("--batch", type=int, default=10000)
+    args = parser.parse_args()
+
+    archive = ReportArchive(args.archive)
+    if args.command == "ingest":
+        # The engine archives every run it submits, so spooled and logged reports are usually archived already.
+        started = time.perf_counter(); batch = []; total = read = 0
+        for report in iter_reports(args.paths):
+            batch.append(report); read += 1
+            if len(batch) >= args.batch: total += archive.append_many(batch, skip_archived=True); batch = []
+        total += archive.append_many(batch, skip_archived=True)
+        print(f"ARCHIVE: Ingested {total} of {read} report(s) in {time.perf_counter() - started:.2f}s ({read - total} already archived); {len(archive)} archived in total.")
+    else:
+        where = {}
+        for clause in args.where:
+            name, _, value = clause.partition("=")
+            where[name] = value if name in DICTIONARY_COLUMNS and name not in ("knobs", "game_context") else json.loads(value)
+        started = time.perf_counter()
+        rows = archive.aggregate(args.group_by or ["knobs"], {"runs": "count", "win_rate": ("win", "mean"), "avg_deaths": ("deaths", "mean"), "avg_retries": ("retries", "mean"), "avg_time_s": ("time_s", "mean")}, where)
+        for row in rows: print(json.dumps(row))
+        print(f"ARCHIVE: deaths by challenge type {archive.deaths_by_type(where)}")
+        print(f"ARCHIVE: Scanned {len(archive)} report(s) in {(time.perf_counter() - started) * 1000:.1f} ms.")
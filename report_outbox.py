@@ -0,0 +1,184 @@
+# FILE: report_outbox.py (Durable background delivery of run reports)
+
+"""A persistent outbox for run reports bound for the Supermemory backend.
+
+``ReportOutbox.enqueue`` writes the report to a spool directory (one JSON file per
+``session_id``, written atomically) and returns immediately. A daemon worker thread drains the
+spool over a pooled ``requests.Session``, retrying with exponential backoff while the backend is
+unreachable, throttling or refusing the API key. Reports go one per POST to ``url``; with a
+``batch_url`` (``REPORT_BATCH_URL``) up to ``batch_size`` queued reports travel in one
+``{"serverInputs": [...]}`` POST instead, and a rejected batch is retried report by report (after a
+404/405/501, without batching from then on). Only a report the backend refuses outright (400, 413,
+415, 422) is moved to ``failed/``; a report is otherwise only deleted from disk once the backend
+acknowledged it, so an outage never loses data: anything still spooled is picked up by the next
+outbox that starts.
+The ``session_id`` (for a batch, a hash of its session IDs) doubles as the ``Idempotency-Key``
+header, so a retry after a lost response does not create a duplicate run on the server.
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from sm_logger import log_supermemory_response
+from tracing import count, span
+
+SPOOL_DIR = os.path.join(os.path.dirname(__file__), "spool", "run_reports")
+FAILED_DIR_NAME = "failed"
+REJECTED_STATUS = {400, 413, 415, 422}  # the payload itself was refused; anything else is retried
+BATCH_UNSUPPORTED_STATUS = {404, 405, 501}
+
+
+class ReportOutbox:
+    def __init__(self, url, api_key, *, batch_url=None, spool_dir=SPOOL_DIR, batch_size=10, timeout=5.0, base_backoff=1.0, max_backoff=60.0, session=None):
+        self.url = url
+        self.api_key = api_key
+        self.batch_url = batch_url
+        self.spool_dir = spool_dir
+        self.failed_dir = os.path.join(spool_dir, FAILED_DIR_NAME)
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.session = session or self._make_session()
+        self.sent = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._drained = threading.Event()
+        self._stopping = False
+        self._thread = None
+        os.makedirs(self.failed_dir, exist_ok=True)
+
+    @staticmethod
+    def _make_session():
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        session.mount("http://", adapter); session.mount("https://", adapter)
+        return session
+
+    # --- Producer side ---
+    def enqueue(self, server_input):
+        """Durably spool one ``serverInput`` and wake the worker. Returns the spool file path."""
+        path = os.path.join(self.spool_dir, f"{server_input['session_id']}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(server_input, fh, ensure_ascii=False)
+            fh.flush(); os.fsync(fh.fileno())
+        os.replace(tmp_path, path)
+        with self._lock: self._drained.clear(); self._wake.set()
+        return path
+
+    def pending(self):
+        """Spooled report paths, oldest first."""
+        stamped = []
+        for name in os.listdir(self.spool_dir):
+            if not name.endswith(".json"): continue
+            path = os.path.join(self.spool_dir, name)
+            try: stamped.append((os.stat(path).st_mtime_ns, path))
+            except FileNotFoundError: pass  # sent by another outbox sharing the spool since the listing
+        return [path for _, path in sorted(stamped)]
+
+    # --- Delivery ---
+    def _post(self, batch):
+        """POST one report to `url`, or several as one ``serverInputs`` request to `batch_url`."""
+        session_ids = [server_input['session_id'] for _, server_input in batch]
+        if len(batch) == 1: url, body, key = self.url, {"serverInput": batch[0][1]}, session_ids[0]
+        else: url, body, key = self.batch_url, {"serverInputs": [server_input for _, server_input in batch]}, hashlib.sha1(",".join(session_ids).encode("utf-8")).hexdigest()
+        headers = {"Content-Type": "application/json", "X-API-Key": self.api_key, "Idempotency-Key": key}
+        return self.session.post(url, json=body, headers=headers, timeout=self.timeout)
+
+    def _set_aside(self, path):
+        try: os.replace(path, os.path.join(self.failed_dir, os.path.basename(path)))
+        except FileNotFoundError: pass
+
+    def _send(self, batch):
+        """Deliver `batch` [(path, serverInput), ...]. Returns False if a retryable error stopped it."""
+        try:
+            with span("backend.save", reports=len(batch)) as save:
+                response = self._post(batch); save.set(status=response.status_code)
+        except requests.exceptions.RequestException:
+            count("backend_saves_total", status="unreachable"); return False
+        count("backend_saves_total", status=response.status_code)
+        log_supermemory_response(response)
+        if 200 <= response.status_code < 300:
+            for path, _ in batch:
+                try: os.remove(path)
+                except FileNotFoundError: pass
+            self.sent += len(batch)
+        elif len(batch) > 1 and (response.status_code in REJECTED_STATUS or response.status_code in BATCH_UNSUPPORTED_STATUS):
+            # One bad report rejects the whole request; find it by sending them one at a time.
+            if response.status_code in BATCH_UNSUPPORTED_STATUS: self.batch_url = None
+            for item in batch:
+                if not self._send([item]): return False
+        elif response.status_code in REJECTED_STATUS:
+            # The backend rejected the report itself; retrying would never succeed.
+            self._set_aside(batch[0][0])
+        else:
+            # Outages, throttling and auth errors (a rotated key, a proxy in front of the backend)
+            # all clear up eventually; keep the reports spooled and back off.
+            if response.status_code in (401, 403): print(f"GAME WARNING: Backend refused the API key (HTTP {response.status_code}); run reports stay spooled.")
+            return False
+        return True
+
+    def flush_once(self):
+        """Send up to ``batch_size`` spooled reports, as one request when `batch_url` is set.
+
+        Returns False if a retryable error stopped the batch.
+        """
+        batch = []
+        for path in self.pending()[:self.batch_size]:
+            try:
+                with open(path, "r", encoding="utf-8") as fh: batch.append((path, json.load(fh)))
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError):
+                self._set_aside(path)
+        if not batch: return True
+        if self.batch_url and len(batch) > 1: return self._send(batch)
+        for item in batch:
+            if not self._send([item]): return False
+        return True
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.clear()
+            try: delivered = self.flush_once()
+            except (requests.exceptions.RequestException, OSError) as e:
+                print(f"GAME WARNING: Run report delivery failed, will retry. Error: {e}"); delivered = False
+            if delivered:
+                self.failures = 0
+                with self._lock:
+                    drained = not self.pending()
+                    if drained: self._drained.set()
+                if drained: self._wake.wait()
+            else:
+                self.failures += 1
+                delay = min(self.max_backoff, self.base_backoff * 2 ** (self.failures - 1))
+                self._wake.wait(delay * random.uniform(0.5, 1.0))
+
+    # --- Lifecycle ---
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="report-outbox", daemon=True)
+            self._thread.start()
+        return self
+
+    def flush(self, timeout=None):
+        """Block until the spool is empty or `timeout` elapses. Returns True if everything was sent."""
+        self._wake.set()
+        return self._drained.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Give the worker up to `timeout` seconds to drain, then stop it. Returns reports left on disk."""
+        if self._thread is not None:
+            self.flush(timeout)
+            self._stopping = True; self._wake.set()
+            self._thread.join(1.0); self._thread = None
+        self.session.close()
+        return len(self.pending())
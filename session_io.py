@@ -0,0 +1,294 @@
+# FILE: session_io.py (Player input, clock and sleeps behind one object, with record/replay)
+
+"""Session I/O: where a game session gets its input, its clock and its pauses.
+
+The engine never calls ``input()``, ``print()``, ``time.monotonic()`` or ``time.sleep()``
+directly; it asks ``state.io``, which also owns the ``Renderer`` its output goes through.
+``LiveIO`` is the real terminal. ``RecordingIO`` wraps it and appends every line of
+input, every key event and every clock reading to a tape, in the order the engine asked for them.
+``ReplayIO`` answers the same questions from a tape without waiting, so together with the
+session's RNG seed a recorded session re-runs exactly (same deaths, stats and events digest) with
+every sleep and typewriter delay gone. Recording is opt-in (``python game_engine.py --record`` or
+``CHRONICLE_RECORD=1``, since a tape holds everything the player typed); recordings are saved
+under ``recordings/`` and double as a
+regression and performance corpus.
+
+The engine's handlers are coroutines: they ``await`` every call that can wait on the player
+(``line``, ``sleep``, ``typewriter`` and a keyboard's ``next_event``). The network server's I/O
+suspends there; every backend here answers without suspending, so ``run_sync`` drives a session
+to completion on the calling thread with no event loop.
+
+Usage: python session_io.py recordings/*.json [--verbose]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+from keyboard_input import KeyboardInput, KeyEvent
+from renderer import Renderer, get_renderer
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), "recordings")
+RECORDING_FORMAT = 1
+RECORD_VARIABLE = "CHRONICLE_RECORD"
+COMPARED_RESULTS = ("run_outcome", "stats", "events_digest")
+
+
+class ReplayDivergence(RuntimeError):
+    """The replayed session asked for something other than what the tape recorded next."""
+
+
+def run_sync(coroutine):
+    """Run a session coroutine whose awaits never suspend (every backend but the network's) to its result."""
+    try: coroutine.send(None)
+    except StopIteration as stop: return stop.value
+    coroutine.close()
+    raise RuntimeError("the session I/O suspended outside an event loop; run it with asyncio instead")
+
+
+class SessionIO:
+    """Output helpers shared by every I/O backend; subclasses provide `out` (a Renderer)."""
+    out = None
+
+    def print(self, *values, sep=" ", end="\n"):
+        self.out.write(sep.join(map(str, values)) + end); self.out.flush()
+
+    async def typewriter(self, text, delay=0.03):
+        self.out.typewriter(text, delay)
+
+    def clear_screen(self):
+        self.out.clear_screen()
+
+    def session(self):
+        """A context manager around a whole game session; backends that hold a terminal set it up here."""
+        return contextlib.nullcontext(self)
+
+
+ENTER_KEYS = ("\r", "\n")
+ERASE_KEYS = ("\x7f", "\b")
+END_OF_INPUT = "\x04"  # Ctrl-D
+
+
+class _BlockingKeyboard:
+    """Gives a blocking keyboard (``KeyboardInput``) the awaitable ``next_event`` the handlers use."""
+
+    def __init__(self, keyboard):
+        self._keyboard = keyboard
+
+    def __enter__(self):
+        self._keyboard.__enter__(); return self
+
+    def __exit__(self, *exc_info):
+        return self._keyboard.__exit__(*exc_info)
+
+    async def next_event(self, deadline=None):
+        return self._keyboard.next_event(deadline)
+
+
+class LiveIO(SessionIO):
+    """The real terminal. Inside ``session()`` the terminal stays in cbreak mode for the whole game:
+    QTEs and the typewriter's skip keys read the one session keyboard, and prompts are read from it
+    too, echoing as they go, instead of switching the terminal back for ``input()``."""
+    _keyboard = None
+
+    @property
+    def out(self):
+        return get_renderer()
+
+    @contextlib.contextmanager
+    def session(self):
+        if self._keyboard is not None or not sys.stdin.isatty(): yield self; return
+        with KeyboardInput() as keyboard:
+            self._keyboard = get_renderer().session_keyboard = keyboard
+            try: yield self
+            finally: self._keyboard = get_renderer().session_keyboard = None
+
+    async def line(self, prompt=""):
+        if self._keyboard is None: return input(prompt)
+        self.out.write(prompt); self.out.flush()
+        chars = []
+        while True:
+            event = self._keyboard.next_event()
+            if event is None or (event.char == END_OF_INPUT and not chars): self.print(); raise EOFError
+            if event.char in ENTER_KEYS: self.print(); return "".join(chars)
+            if event.char in ERASE_KEYS:
+                if chars: chars.pop(); self.out.write("\b \b"); self.out.flush()
+            elif event.char.isprintable():
+                chars.append(event.char); self.out.write(event.char); self.out.flush()
+
+    def keyboard(self):
+        return _BlockingKeyboard(self._keyboard or KeyboardInput())
+
+    def now(self):
+        return time.monotonic()
+
+    async def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+LIVE_IO = LiveIO()
+
+
+class _RecordingKeyboard:
+    def __init__(self, keyboard, tape):
+        self._keyboard = keyboard; self._tape = tape
+
+    def __enter__(self):
+        self._keyboard.__enter__(); return self
+
+    def __exit__(self, *exc_info):
+        return self._keyboard.__exit__(*exc_info)
+
+    async def next_event(self, deadline=None):
+        event = await self._keyboard.next_event(deadline)
+        self._tape.append(["key", None, None] if event is None else ["key", event.key, event.timestamp])
+        return event
+
+
+class RecordingIO(SessionIO):
+    """Passes through to `inner` and keeps a tape of everything the session read."""
+
+    def __init__(self, inner=LIVE_IO):
+        self.inner = inner
+        self.tape = []
+
+    @property
+    def out(self):
+        return self.inner.out
+
+    async def line(self, prompt=""):
+        text = await self.inner.line(prompt)
+        self.tape.append(["line", text, self.inner.now()])
+        return text
+
+    def keyboard(self):
+        return _RecordingKeyboard(self.inner.keyboard(), self.tape)
+
+    def now(self):
+        value = self.inner.now()
+        self.tape.append(["now", value])
+        return value
+
+    async def typewriter(self, text, delay=0.03):
+        await self.inner.typewriter(text, delay)
+
+    async def sleep(self, seconds):
+        await self.inner.sleep(seconds)
+
+    def session(self):
+        return self.inner.session()
+
+
+class _ReplayKeyboard:
+    def __init__(self, io):
+        self._io = io
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    async def next_event(self, deadline=None):
+        _, key, timestamp = self._io.take("key")
+        return None if key is None else KeyEvent(key, timestamp)
+
+
+class _Discard:
+    def write(self, text): pass
+    def flush(self): pass
+    def isatty(self): return False
+
+
+class ReplayIO(SessionIO):
+    """Serves a recorded tape back in order; sleeps are skipped and text is shown instantly (or not at all)."""
+
+    def __init__(self, tape, stream=None):
+        self.tape = tape
+        self.position = 0
+        self.out = Renderer(stream=stream or _Discard(), instant=True, allow_skip=False)
+
+    def take(self, kind):
+        if self.position >= len(self.tape): raise ReplayDivergence(f"tape ended but the session asked for '{kind}'")
+        entry = self.tape[self.position]
+        if entry[0] != kind: raise ReplayDivergence(f"tape entry {self.position} is '{entry[0]}' but the session asked for '{kind}'")
+        self.position += 1
+        return entry
+
+    async def line(self, prompt=""):
+        return self.take("line")[1]
+
+    def keyboard(self):
+        return _ReplayKeyboard(self)
+
+    def now(self):
+        return self.take("now")[1]
+
+    async def sleep(self, seconds):
+        pass
+
+    @property
+    def exhausted(self):
+        return self.position >= len(self.tape)
+
+
+def session_result(state):
+    return {"run_outcome": state.run_outcome, "stats": state.stats, "events_digest": state.events.digest()}
+
+
+def recording_enabled(argv=None):
+    """Whether the player opted in to recording, with ``--record`` in `argv` or ``CHRONICLE_RECORD``."""
+    return "--record" in (sys.argv[1:] if argv is None else argv) or os.getenv(RECORD_VARIABLE, "") not in ("", "0")
+
+
+def save_recording(state, level, directory=RECORDINGS_DIR):
+    """Write the finished session played through a RecordingIO to ``<directory>/<session_id>.json``."""
+    recording = {"format": RECORDING_FORMAT, "session_id": state.session_id, "player_id": state.player_id, "seed": state.seed, "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "level": level.to_instructions(), "tape": state.io.tape, "result": session_result(state)}
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{state.session_id}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f: json.dump(recording, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_recording(path):
+    with open(path, encoding="utf-8") as f: recording = json.load(f)
+    if recording.get("format") != RECORDING_FORMAT: raise ValueError(f"unsupported recording format {recording.get('format')!r}")
+    return recording
+
+
+def replay_recording(recording, quiet=True):
+    """Re-run a recording at full speed. Returns ``(state, mismatches)``; an empty list means an exact replay."""
+    import game_engine
+    io = ReplayIO(recording["tape"], None if quiet else sys.stdout)
+    state = game_engine.play_game(recording["player_id"], recording["level"], game_engine.GAME_CONTEXT, io=io, seed=recording["seed"], submit=False)
+    result = session_result(state)
+    mismatches = [key for key in COMPARED_RESULTS if result[key] != recording["result"][key]]
+    if not io.exhausted: mismatches.append(f"{len(io.tape) - io.position} tape entries left unread")
+    return state, mismatches
+
+
+if __name__ == "__main__":
+    # Go through the importable module so the engine and this CLI share one set of classes.
+    from session_io import ReplayDivergence, load_recording, replay_recording
+
+    parser = argparse.ArgumentParser(description="Replay recorded game sessions at full speed and check they reproduce.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--verbose", action="store_true", help="show the game's output while replaying")
+    args = parser.parse_args()
+
+    failed = 0; started = time.perf_counter()
+    for path in args.paths:
+        began = time.perf_counter()
+        try:
+            _, mismatches = replay_recording(load_recording(path), quiet=not args.verbose)
+        except (OSError, ValueError, KeyError, ReplayDivergence) as e:
+            mismatches = [str(e)]
+        failed += bool(mismatches)
+        print(f"{'DIVERGED' if mismatches else 'OK':8} {path} ({(time.perf_counter() - began) * 1000:.1f} ms){': ' + '; '.join(mismatches) if mismatches else ''}")
+    print(f"Replayed {len(args.paths)} session(s) in {time.perf_counter() - started:.2f}s: {len(args.paths) - failed} reproduced, {failed} diverged.")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,360 @@
+# FILE: simulator.py (Headless batch simulator for game_instructions.json levels)
+
+"""Run a level against bot policies without any terminal I/O or sleeps.
+
+The level is compiled with ``level_compiler.compile_level`` and every challenge is played by the
+engine's own registered handler, so the simulator has no copy of the rules to keep in sync.
+Scenes are played in order, a death sends the player back to the first scene, and the run ends
+after the final boss QTE, as in ``game_engine.play_game``. Instead of a terminal the handlers talk
+to a ``BotIO``: before each challenge the bot hook registered for its type (``bot_hook``) asks the
+``BotPolicy`` what to do and queues the matching lines and key presses, and sleeps only advance a
+simulated clock. A level using a type with no bot hook is rejected rather than skipped.
+Batches are fanned out over a process pool and folded into per-scene win/death/retry
+distributions, which is what level generation uses to sanity-check difficulty.
+
+Usage: python simulator.py [game_instructions.json] --runs 10000 --workers 4 --policy average
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Any
+
+from game_engine import FINAL_BOSS_CHALLENGE, STAT_NAMES, GameState
+from keyboard_input import KeyEvent
+from level_compiler import CompiledLevel, compile_challenge, compile_level, load_level
+from session_io import SessionIO, run_sync
+
+DEFAULT_MAX_ATTEMPTS = 50
+
+
+@dataclass
+class BotPolicy:
+    """A stochastic player model. Subclass and override its methods for scripted bots.
+
+    qte_press_rate is presses per second (inter-press gaps are exponential), qte_reaction_time
+    is the delay before the first press, and memory_error_rate is the chance of getting any
+    single item of a SEQUENCE_MEMORY challenge wrong.
+    """
+    name: str = "average"
+    qte_press_rate: float = 5.0
+    qte_reaction_time: float = 0.35
+    riddle_accuracy: float = 0.6
+    hint_acceptance: float = 0.8
+    hint_accuracy: float = 0.75
+    memory_error_rate: float = 0.05
+    dilemma_combat_bias: float = 0.5
+
+    def qte_press_times(self, challenge, rng):
+        """Seconds after the prompt at which each press lands, stopping once past the time limit."""
+        if self.qte_press_rate <= 0: return []
+        times, at = [], self.qte_reaction_time
+        for _ in range(challenge['presses']):
+            at += rng.expovariate(self.qte_press_rate); times.append(at)
+            if at > challenge['time_limit']: break
+        return times
+
+    def riddle_correct(self, challenge, rng):
+        return rng.random() < self.riddle_accuracy
+
+    def takes_hint(self, challenge, rng):
+        return rng.random() < self.hint_acceptance
+
+    def hinted_riddle_correct(self, challenge, rng):
+        return rng.random() < self.hint_accuracy
+
+    def sequence_correct(self, challenge, rng):
+        return rng.random() < (1.0 - self.memory_error_rate) ** len(challenge['sequence'])
+
+    def dilemma_choice(self, challenge, rng):
+        return 0 if rng.random() < self.dilemma_combat_bias else 1
+
+
+POLICIES = {
+    "novice": BotPolicy("novice", qte_press_rate=3.5, qte_reaction_time=0.6, riddle_accuracy=0.4, hint_accuracy=0.6, memory_error_rate=0.12),
+    "average": BotPolicy(),
+    "expert": BotPolicy("expert", qte_press_rate=7.5, qte_reaction_time=0.2, riddle_accuracy=0.85, hint_accuracy=0.95, memory_error_rate=0.01),
+    "perfect": BotPolicy("perfect", qte_press_rate=1000.0, qte_reaction_time=0.0, riddle_accuracy=1.0, hint_accuracy=1.0, memory_error_rate=0.0),
+}
+
+
+# --- Headless session I/O ---
+class BotInputError(RuntimeError):
+    """A handler asked for input its bot hook did not queue."""
+
+
+class _BotKeyboard:
+    def __init__(self, io):
+        self._io = io
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    async def next_event(self, deadline=None):
+        io = self._io
+        if io.keys and (deadline is None or io.keys[0].timestamp <= deadline):
+            event = io.keys.popleft(); io.clock = event.timestamp; return event  # presses are queued in order
+        if deadline is None: raise BotInputError("the handler waited for a key the bot never pressed")
+        io.keys.clear(); io.clock = max(io.clock, deadline)
+        return None
+
+
+class BotIO(SessionIO):
+    """Serves queued bot input to the handlers; output is dropped and sleeps advance `clock`."""
+
+    def __init__(self):
+        self.clock = 0.0
+        self.lines = deque()
+        self.keys = deque()
+
+    # What bot hooks call
+    def type(self, text):
+        self.lines.append(text)
+
+    def press(self, key, *after):
+        """Queue presses of `key` landing each `after` seconds from now (in increasing order)."""
+        now = self.clock
+        self.keys.extend([KeyEvent(key, now + seconds) for seconds in after])
+
+    def reset(self):
+        self.lines.clear(); self.keys.clear()
+
+    # What handlers call
+    def print(self, *values, sep=" ", end="\n"):
+        pass
+
+    async def typewriter(self, text, delay=0.03):
+        pass
+
+    def clear_screen(self):
+        pass
+
+    async def line(self, prompt=""):
+        if not self.lines: raise BotInputError(f"the handler asked for a line ({prompt.strip()!r}) the bot never typed")
+        return self.lines.popleft()
+
+    def keyboard(self):
+        return _BotKeyboard(self)
+
+    def now(self):
+        return self.clock
+
+    async def sleep(self, seconds):
+        self.clock += seconds
+
+
+class _NoEvents:
+    """Stands in for the EventRecorder: simulated runs only keep the stats counters."""
+    def _ignore(self, *args, **kwargs): return 0.0
+    record = now = death = scene_enter = scene_exit = combat_start = combat_press = combat_end = puzzle_start = puzzle_answer = _ignore
+
+
+NO_EVENTS = _NoEvents()
+
+
+class SimState:
+    """The part of ``GameState`` the challenge handlers use, without a session ID or event stream."""
+    __slots__ = ("player_id", "io", "rng", "events", "stats", "run_outcome")
+    increment_stat = GameState.increment_stat
+    handle_death = GameState.handle_death
+
+    def __init__(self, player_id, io, rng):
+        self.player_id = player_id; self.io = io; self.rng = rng; self.events = NO_EVENTS
+        self.stats = dict.fromkeys(STAT_NAMES, 0); self.run_outcome = {"result": "loss", "path": "exploration"}
+
+
+# --- Bot hooks: turn a policy's decisions into the input each challenge type reads ---
+# Challenge type -> hook(policy, challenge data, rng, io) queuing the bot's lines and key presses.
+BOT_HOOKS = {}
+
+
+def bot_hook(challenge_type):
+    """Decorator registering how a bot plays `challenge_type` (see ``level_compiler.register_challenge``)."""
+    def register(hook):
+        BOT_HOOKS[challenge_type] = hook
+        return hook
+    return register
+
+
+@bot_hook('QTE')
+def _play_qte(policy, challenge, rng, io):
+    io.press(challenge['key'], *policy.qte_press_times(challenge, rng))
+
+
+@bot_hook('RIDDLE')
+def _play_riddle(policy, challenge, rng, io):
+    if policy.riddle_correct(challenge, rng): io.type(challenge['answer']); return
+    io.type("")
+    if 'hint_text' not in challenge: return
+    if not policy.takes_hint(challenge, rng): io.type("n"); return
+    io.type("y"); io.type(challenge['answer'] if policy.hinted_riddle_correct(challenge, rng) else "")
+
+
+@bot_hook('SEQUENCE_MEMORY')
+def _play_sequence_memory(policy, challenge, rng, io):
+    io.type(" ".join(challenge['sequence']) if policy.sequence_correct(challenge, rng) else "")
+
+
+@bot_hook('DILEMMA')
+def _play_dilemma(policy, challenge, rng, io):
+    io.type(str(policy.dilemma_choice(challenge, rng) + 1))
+
+
+@bot_hook('JUMP_CHASM')
+@bot_hook('FIND_COLLECTIBLE')
+def _press_enter(policy, challenge, rng, io):
+    io.type("")
+
+
+FINAL_BOSS = compile_challenge(FINAL_BOSS_CHALLENGE)
+
+
+def unsupported_types(level):
+    """Challenge types in `level` that no bot hook knows how to play."""
+    return sorted({scene.challenge.type for scene in level.scenes if scene.challenge is not None} - BOT_HOOKS.keys())
+
+
+def simulate_challenge(state, challenge, policy):
+    """Play one compiled challenge through its engine handler, with input from its type's bot hook."""
+    hook = BOT_HOOKS.get(challenge.type)
+    if hook is None: raise ValueError(f"no bot hook for challenge type '{challenge.type}'; register one with simulator.bot_hook")
+    state.io.reset(); hook(policy, challenge.data, state.rng, state.io)
+    return run_sync(challenge.run(state))
+
+
+def simulate_run(level, policy, rng, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Play one run of a compiled level to victory (or until `max_attempts` is exhausted) and describe what happened.
+
+    Scene indices count the level's scenes from 0; the final boss is ``len(scenes)``.
+    """
+    scenes = level.scenes
+    state = SimState(level.player_id or 'bot', BotIO(), rng)
+    reached, deaths = Counter(), Counter()
+    for _ in range(max_attempts):
+        died_at = None
+        for index, scene in enumerate(scenes):
+            reached[index] += 1
+            state.increment_stat('distance_traveled', 50)
+            if scene.challenge is not None and not simulate_challenge(state, scene.challenge, policy):
+                died_at = index; break
+        if died_at is None:
+            reached[len(scenes)] += 1
+            if simulate_challenge(state, FINAL_BOSS, policy):
+                state.run_outcome['result'] = 'win'; break
+            died_at = len(scenes)
+        deaths[died_at] += 1
+    return {"result": state.run_outcome['result'], "path": state.run_outcome['path'], "stats": state.stats, "reached": reached, "deaths": deaths}
+
+
+def _empty_summary(scene_count):
+    return {"runs": 0, "wins": 0, "results": Counter(), "paths": Counter(), "retries": Counter(), "stats": Counter(), "reached": Counter(), "deaths": Counter(), "scene_count": scene_count}
+
+
+def _fold(summary, run):
+    summary['runs'] += 1
+    summary['wins'] += run['result'] == 'win'
+    summary['results'][run['result']] += 1
+    summary['paths'][run['path']] += 1
+    summary['retries'][run['stats']['retries']] += 1
+    summary['stats'].update(run['stats'])
+    summary['reached'].update(run['reached'])
+    summary['deaths'].update(run['deaths'])
+
+
+def _merge(summary, other):
+    for key in ('runs', 'wins'): summary[key] += other[key]
+    for key in ('results', 'paths', 'retries', 'stats', 'reached', 'deaths'): summary[key].update(other[key])
+
+
+def _simulate_chunk(level, policy, runs, seed, max_attempts):
+    rng = random.Random(seed)
+    summary = _empty_summary(len(level.scenes))
+    for _ in range(runs): _fold(summary, simulate_run(level, policy, rng, max_attempts))
+    return summary
+
+
+def _finalize(summary, scenes):
+    runs = summary['runs'] or 1
+    per_scene = []
+    for index in range(summary['scene_count'] + 1):
+        if index < len(scenes):
+            challenge = scenes[index].challenge
+            label = challenge.type if challenge is not None else 'NONE'
+        else:
+            label = 'FINAL_BOSS'
+        reached, deaths = summary['reached'][index], summary['deaths'][index]
+        per_scene.append({"scene": index, "type": label, "reached": reached, "deaths": deaths, "death_rate": deaths / reached if reached else 0.0, "deaths_per_run": deaths / runs})
+    return {
+        "runs": summary['runs'],
+        "win_rate": summary['wins'] / runs,
+        "results": dict(summary['results']),
+        "paths": dict(summary['paths']),
+        "retry_distribution": {str(k): v for k, v in sorted(summary['retries'].items())},
+        "avg_retries": sum(k * v for k, v in summary['retries'].items()) / runs,
+        "avg_stats": {k: v / runs for k, v in summary['stats'].items() if k != 'time_s'},
+        "scenes": per_scene,
+    }
+
+
+def simulate_batch(instructions, policy=None, runs=1000, workers=None, seed=None, max_attempts=DEFAULT_MAX_ATTEMPTS) -> dict[str, Any]:
+    """Simulate `runs` plays of a level and return aggregate distributions.
+
+    `instructions` is a CompiledLevel or a raw game_instructions dict (compiled here). The work is
+    split into one chunk per worker, each with its own derived seed, so a given (seed, workers)
+    pair always produces the same report. ``workers=1`` stays in-process.
+    """
+    level = instructions if isinstance(instructions, CompiledLevel) else compile_level(instructions)
+    missing = unsupported_types(level)
+    if missing: raise ValueError(f"no bot hook for challenge type(s) {', '.join(missing)}; register one with simulator.bot_hook")
+    policy = policy or POLICIES['average']
+    workers = max(1, min(workers or os.cpu_count() or 1, runs))
+    seed = random.randrange(2**32) if seed is None else seed
+    scenes = level.scenes
+    chunks = [runs // workers + (1 if i < runs % workers else 0) for i in range(workers)]
+    chunks = [(n, seed + i) for i, n in enumerate(chunks) if n]
+
+    started = time.perf_counter()
+    summary = _empty_summary(len(scenes))
+    if workers == 1:
+        for n, chunk_seed in chunks: _merge(summary, _simulate_chunk(level, policy, n, chunk_seed, max_attempts))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_simulate_chunk, level, policy, n, chunk_seed, max_attempts) for n, chunk_seed in chunks]
+            for future in futures: _merge(summary, future.result())
+    elapsed = time.perf_counter() - started
+
+    report = _finalize(summary, scenes)
+    report.update({"policy": asdict(policy), "seed": seed, "workers": workers, "max_attempts": max_attempts, "elapsed_s": elapsed, "runs_per_s": runs / elapsed if elapsed > 0 else 0.0})
+    return report
+
+
+def print_report(report):
+    print(f"SIM: {report['runs']} runs with policy '{report['policy']['name']}' in {report['elapsed_s']:.2f}s ({report['runs_per_s']:.0f} runs/s, {report['workers']} workers)")
+    print(f"SIM: win rate {report['win_rate']:.1%}, avg retries {report['avg_retries']:.2f}, results {report['results']}")
+    print(f"  {'scene':<6}{'type':<18}{'reached':>10}{'deaths':>10}{'death rate':>12}")
+    for scene in report['scenes']:
+        print(f"  {scene['scene']:<6}{scene['type']:<18}{scene['reached']:>10}{scene['deaths']:>10}{scene['death_rate']:>12.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless batch simulator for game_instructions.json levels.")
+    parser.add_argument("instructions", nargs="?", default="game_instructions.json")
+    parser.add_argument("--runs", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="average")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON.")
+    args = parser.parse_args()
+
+    report = simulate_batch(load_level(args.instructions), POLICIES[args.policy], args.runs, args.workers, args.seed, args.max_attempts)
+    if args.json: print(json.dumps(report, indent=2))
+    else: print_report(report)
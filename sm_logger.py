@@ -1,37 +1,283 @@
 import os
+import re
 import json
 import time
+import glob
+import zlib
+import queue
+import atexit
+import bisect
+import struct
+import calendar
+import threading
 from typing import Any
 
+from tracing import count, span
+
 LOG_DIR = os.path.join(os.path.dirname(__file__), "logs")
 DEFAULT_LOG_FILE = os.path.join(LOG_DIR, "sm_responses.log")
 
+# Rotation: the active file is rolled into a gzip segment once it reaches either limit.
+MAX_SEGMENT_BYTES = 64 * 1024 * 1024
+ROTATE_INTERVAL = 24 * 3600
+MAX_BATCH = 512
+# Entries waiting for the writer. While it is busy (a rotation gzips a whole segment) callers keep
+# going: entries past this many are dropped, counted, and noted in the log once it catches up.
+MAX_QUEUED = 65536
+# Rotated segments are gzip streams made of independent members of roughly this many raw bytes,
+# so the reader can decompress just the member holding a matching entry.
+GZIP_BLOCK_BYTES = 1024 * 1024
+
+# Sidecar index (<segment>.idx): header, then one record per entry.
+INDEX_MAGIC = b"SMIDX001"
+INDEX_HEADER = struct.Struct("<8sQ")    # magic, bytes of the segment covered by the index
+INDEX_RECORD = struct.Struct("<QIIqH")  # block offset, offset within block, length, epoch seconds, status code (0 = none)
+_ENTRY_PREFIX = re.compile(rb'^\{"timestamp": "([^"]+)", "status_code": (null|\d+)')
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# Entries are timestamped by their caller and written in queue order, so the index is time-ordered
+# only up to the few seconds an entry can wait in the queue; time-range lookups widen by this much.
+INDEX_ORDER_SLACK = 60
+
 
-def _ensure_log_dir():
-    os.makedirs(LOG_DIR, exist_ok=True)
+def _ensure_log_dir(path=DEFAULT_LOG_FILE):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
 
 
 def _safe_json(obj: Any):
+    """Make `obj` loggable. Text that holds JSON is decoded; everything else is serialized once, at write time."""
+    if isinstance(obj, (bytes, bytearray)):
+        obj = obj.decode("utf-8", errors="replace")
+    if isinstance(obj, str):
+        try:
+            return json.loads(obj)
+        except ValueError:
+            return obj
+    return obj
+
+
+_epoch_cache = {}
+
+
+def _epoch(timestamp: str) -> int:
+    epoch = _epoch_cache.get(timestamp)
+    if epoch is None:
+        try:
+            epoch = calendar.timegm(time.strptime(timestamp, TIMESTAMP_FORMAT))
+        except ValueError:
+            epoch = 0
+        if len(_epoch_cache) > 4096:
+            _epoch_cache.clear()
+        _epoch_cache[timestamp] = epoch
+    return epoch
+
+
+def _line_key(line: bytes):
+    """(epoch seconds, status code) of one NDJSON entry, read from its fixed prefix when possible."""
+    match = _ENTRY_PREFIX.match(line)
+    if match:
+        status = match.group(2)
+        return _epoch(match.group(1).decode("ascii")), 0 if status == b"null" else int(status)
     try:
-        return json.loads(json.dumps(obj))
-    except Exception:
+        entry = json.loads(line)
+        return _epoch(entry.get("timestamp") or ""), int(entry.get("status_code") or 0)
+    except (ValueError, TypeError, AttributeError):
+        return 0, 0
+
+
+def _write_index(path, covered, records, append=False):
+    """Write a sidecar index, or with `append` add `records` to an existing one and bump its header."""
+    with open(path, "r+b" if append else "wb") as fh:
+        if append:
+            fh.seek(0, os.SEEK_END)
+        else:
+            fh.write(INDEX_HEADER.pack(INDEX_MAGIC, covered))
+        fh.write(b"".join(INDEX_RECORD.pack(*record) for record in records))
+        if append:
+            fh.seek(0)
+            fh.write(INDEX_HEADER.pack(INDEX_MAGIC, covered))
+
+
+def _compress_segment(src):
+    """Gzip `src` into blockwise members at `src`.gz, write its sidecar index and remove `src`."""
+    dst = f"{src}.gz"
+    records = []
+    with open(src, "rb") as fin, open(f"{dst}.tmp", "wb") as fout:
+        block, block_len = [], 0
+        lines = iter(fin)
+        while True:
+            line = next(lines, None)
+            if line is not None and line.strip():
+                block.append(line); block_len += len(line)
+            if block and (line is None or block_len >= GZIP_BLOCK_BYTES):
+                offset, inner = fout.tell(), 0
+                for entry in block:
+                    records.append((offset, inner, len(entry.rstrip(b"\n")), *_line_key(entry)))
+                    inner += len(entry)
+                compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+                fout.write(compressor.compress(b"".join(block)) + compressor.flush())
+                block, block_len = [], 0
+            if line is None:
+                break
+        covered = fout.tell()
+    os.replace(f"{dst}.tmp", dst)
+    _write_index(f"{dst}.idx", covered, records)
+    os.remove(src)
+    return dst
+
+
+class _Target:
+    __slots__ = ("path", "fh", "size", "started")
+
+
+class LogWriter:
+    """Background writer: entries are queued by the caller and appended in batches by one thread.
+
+    The queue holds at most `max_queued` entries. When it is full, ``submit`` drops the entry
+    rather than block the game or the report outbox on the disk; ``dropped`` counts them, and the
+    writer appends one entry per log recording how many went missing.
+    """
+
+    def __init__(self, max_bytes=MAX_SEGMENT_BYTES, rotate_interval=ROTATE_INTERVAL, max_batch=MAX_BATCH, max_queued=MAX_QUEUED):
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.max_batch = max_batch
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._unreported = {}  # path -> entries dropped since the last note written to it
+        self._targets = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, path, line):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="sm-logger", daemon=True)
+                    self._thread.start()
         try:
-            return json.loads(str(obj))
-        except Exception:
-            return str(obj)
+            self._queue.put_nowait((path, line))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                self._unreported[path] = self._unreported.get(path, 0) + 1
+            count("sm_log_entries_dropped_total")
+
+    def flush(self, timeout=None):
+        """Block until everything submitted so far is on disk (or dropped)."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        started = time.monotonic()
+        try:
+            self._queue.put((None, done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(None if timeout is None else max(0.0, timeout - (time.monotonic() - started)))
+
+    def close(self, timeout=5.0):
+        self.flush(timeout)
+        for target in list(self._targets.values()):
+            target.fh.close()
+        self._targets.clear()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        with span("sm_logger.write_batch", entries=len(batch)):
+            self._write_grouped(batch)
+
+    def _write_grouped(self, batch):
+        grouped, waiters = {}, []
+        for path, line in batch:
+            if path is None:
+                waiters.append(line)
+            else:
+                grouped.setdefault(path, []).append(line)
+        if self._unreported:
+            with self._lock:
+                unreported, self._unreported = self._unreported, {}
+            for path, dropped in unreported.items():
+                note = {"timestamp": time.strftime(TIMESTAMP_FORMAT, time.gmtime()), "status_code": None, "headers": None, "body": {"sm_logger_dropped_entries": dropped}}
+                grouped.setdefault(path, []).append(json.dumps(note) + "\n")
+        for path, lines in grouped.items():
+            try:
+                self._append(path, lines); count("sm_log_entries_written_total", len(lines))
+            except Exception as e:
+                # If writing fails, fall back to printing to stdout so caller can still see info
+                print("SM_LOGGER ERROR: failed to write log:", e)
+                for line in lines:
+                    print(line, end="")
+        for waiter in waiters:
+            waiter.set()
+
+    def _open(self, path):
+        target = self._targets.get(path)
+        if target is None:
+            _ensure_log_dir(path)
+            target = _Target()
+            target.path = path
+            target.fh = open(path, "ab")
+            target.size = target.fh.tell()
+            target.started = time.time()
+            if target.size:
+                with open(path, "rb") as fh:
+                    first = _line_key(fh.readline())[0]
+                target.started = first or target.started
+            self._targets[path] = target
+        return target
+
+    def _append(self, path, lines):
+        target = self._open(path)
+        if target.size and (target.size >= self.max_bytes or time.time() - target.started >= self.rotate_interval):
+            self._rotate(target)
+            target = self._open(path)
+        data = "".join(lines).encode("utf-8")
+        target.fh.write(data)
+        target.fh.flush()
+        target.size += len(data)
+
+    def _rotate(self, target):
+        target.fh.close()
+        del self._targets[target.path]
+        # <name>.<UTC time>-<n> keeps segments in chronological order when sorted by name.
+        stamp, n = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime()), 0
+        while glob.glob(f"{glob.escape(target.path)}.{stamp}-{n:03d}*"):
+            n += 1
+        segment = f"{target.path}.{stamp}-{n:03d}"
+        os.replace(target.path, segment)
+        if os.path.exists(f"{target.path}.idx"):
+            os.remove(f"{target.path}.idx")
+        _compress_segment(segment)
+
+
+_writer = LogWriter()
+atexit.register(_writer.close)
+
+
+def flush_logs(timeout=None):
+    """Wait until queued log entries have been written (e.g. before reading the log back)."""
+    return _writer.flush(timeout)
 
 
 def log_supermemory_response(response, *, filename: str | None = None):
     """Log a requests.Response (or dict-like) to a timestamped JSON entry inside the log file.
 
     If `filename` is provided it's written relative to the repository; otherwise the default
-    `logs/sm_responses.log` is used (newline-delimited JSON entries).
+    `logs/sm_responses.log` is used (newline-delimited JSON entries). The entry is serialized
+    here and handed to a background writer, so the caller never waits on the disk.
     """
-    _ensure_log_dir()
     target = filename if filename else DEFAULT_LOG_FILE
 
     entry = {
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "timestamp": time.strftime(TIMESTAMP_FORMAT, time.gmtime()),
         "status_code": None,
         "headers": None,
         "body": None,
@@ -56,13 +302,179 @@ def log_supermemory_response(response, *, filename: str | None = None):
         entry["body"] = str(response)
 
     # Append newline-delimited JSON
-    try:
-        with open(target, "a", encoding="utf-8") as fh:
-            fh.write(json.dumps(entry, ensure_ascii=False))
-            fh.write("\n")
-    except Exception as e:
-        # If writing fails, fall back to printing to stdout so caller can still see info
-        print("SM_LOGGER ERROR: failed to write log:", e)
-        print(json.dumps(entry, ensure_ascii=False, indent=2))
+    with span("sm_logger.serialize"): line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+    _writer.submit(target, line); count("sm_log_entries_total")
 
     return entry
+
+
+class _Index:
+    """Read-only sequence over a sidecar index's raw records; each one is unpacked only when accessed."""
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        self._data = data
+
+    def __len__(self):
+        return len(self._data) // INDEX_RECORD.size
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return INDEX_RECORD.unpack_from(self._data, i * INDEX_RECORD.size)
+
+
+def _index_epoch(record):
+    return record[3]
+
+
+class LogReader:
+    """Query the active log and its gzip segments through sidecar offset indexes.
+
+    Indexes are built on first use (and extended as the active file grows), so a query such as
+    ``LogReader().query(since=time.time() - 3600, exclude_status=200)`` only reads the entries it
+    returns instead of scanning every line. A time range is located in each index by bisection, so
+    it costs the same however large the index has grown.
+    """
+
+    def __init__(self, path: str = DEFAULT_LOG_FILE):
+        self.path = path
+
+    def segments(self):
+        """Rotated segments oldest first, then the active file."""
+        paths = sorted(glob.glob(f"{glob.escape(self.path)}.*.gz"))
+        if os.path.exists(self.path):
+            paths.append(self.path)
+        return paths
+
+    def _load_index(self, idx_path):
+        """Raw index records and the segment bytes they cover, or (None, 0) without a usable index."""
+        try:
+            with open(idx_path, "rb") as fh:
+                data = fh.read()
+            magic, covered = INDEX_HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None, 0
+        if magic != INDEX_MAGIC:
+            return None, 0
+        body = data[INDEX_HEADER.size:]
+        return body[:len(body) - len(body) % INDEX_RECORD.size], covered
+
+    def _index_gzip(self, segment):
+        records, offset, leftover = [], 0, b""
+        with open(segment, "rb") as fh:
+            while True:
+                decompressor = zlib.decompressobj(31)
+                parts, fed, data = [], 0, leftover
+                while not decompressor.eof:
+                    if not data:
+                        data = fh.read(64 * 1024)
+                        if not data:
+                            break
+                    fed += len(data)
+                    parts.append(decompressor.decompress(data))
+                    data = b""
+                if not fed or not decompressor.eof:
+                    break
+                leftover = decompressor.unused_data
+                inner = 0
+                for line in b"".join(parts).splitlines(keepends=True):
+                    if line.strip():
+                        records.append((offset, inner, len(line.rstrip(b"\n")), *_line_key(line)))
+                    inner += len(line)
+                offset += fed - len(leftover)
+        _write_index(f"{segment}.idx", offset, records)
+
+    def _index_active(self, segment, indexed, covered):
+        size = os.path.getsize(segment)
+        append = indexed and covered <= size
+        if not append:
+            covered = 0
+        new = []
+        with open(segment, "rb") as fh:
+            fh.seek(covered)
+            chunk = fh.read(size - covered)
+        end = chunk.rfind(b"\n") + 1
+        offset = covered
+        for line in chunk[:end].splitlines(keepends=True):
+            if line.strip():
+                new.append((offset, 0, len(line.rstrip(b"\n")), *_line_key(line)))
+            offset += len(line)
+        if new or not append:
+            _write_index(f"{segment}.idx", covered + end, new, append=append)
+
+    def index(self, segment):
+        """The segment's index, built or extended first if it is missing or behind the segment."""
+        idx_path = f"{segment}.idx"
+        body, covered = self._load_index(idx_path)
+        if segment.endswith(".gz"):
+            if body is None:
+                self._index_gzip(segment)
+                body, _ = self._load_index(idx_path)
+        elif body is None or covered != os.path.getsize(segment):
+            self._index_active(segment, body is not None, covered)
+            body, _ = self._load_index(idx_path)
+        return _Index(body or b"")
+
+    def query(self, since=None, until=None, status=None, exclude_status=None, limit=None):
+        """Yield log entries matching every given filter, oldest first.
+
+        `since`/`until` are epoch seconds (inclusive); `status`/`exclude_status` are a status code
+        or a collection of them, with 0 standing for entries that had no status code.
+        """
+        wanted = {status} if isinstance(status, int) else set(status) if status is not None else None
+        unwanted = {exclude_status} if isinstance(exclude_status, int) else set(exclude_status or ())
+        returned = 0
+        for segment in self.segments():
+            index = self.index(segment)
+            # Entries are indexed in write order, which is time order up to INDEX_ORDER_SLACK seconds,
+            # so the time range is found by bisection and only the rows inside it are checked.
+            lo = 0 if since is None else bisect.bisect_left(index, since - INDEX_ORDER_SLACK, key=_index_epoch)
+            hi = len(index) if until is None else bisect.bisect_right(index, until + INDEX_ORDER_SLACK, lo=lo, key=_index_epoch)
+            matches = [r for r in map(index.__getitem__, range(lo, hi))
+                       if (since is None or r[3] >= since) and (until is None or r[3] <= until)
+                       and (wanted is None or r[4] in wanted) and r[4] not in unwanted]
+            if not matches:
+                continue
+            with open(segment, "rb") as fh:
+                block_offset, block = None, b""
+                for offset, inner, length, _, _ in matches:
+                    if segment.endswith(".gz"):
+                        if offset != block_offset:
+                            fh.seek(offset)
+                            decompressor = zlib.decompressobj(31)
+                            block = b""
+                            while not decompressor.eof:
+                                chunk = fh.read(64 * 1024)
+                                if not chunk:
+                                    break
+                                block += decompressor.decompress(chunk)
+                            block_offset = offset
+                        raw = block[inner:inner + length]
+                    else:
+                        fh.seek(offset)
+                        raw = fh.read(length)
+                    try:
+                        yield json.loads(raw)
+                    except ValueError:
+                        continue
+                    returned += 1
+                    if limit is not None and returned >= limit:
+                        return
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query logs/sm_responses.log (and rotated segments) via the offset index.")
+    parser.add_argument("--file", default=DEFAULT_LOG_FILE)
+    parser.add_argument("--last", type=float, help="Only entries from the last N seconds.")
+    parser.add_argument("--status", type=int, action="append")
+    parser.add_argument("--exclude-status", type=int, action="append")
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    since = time.time() - args.last if args.last else None
+    for entry in LogReader(args.file).query(since=since, status=args.status, exclude_status=args.exclude_status, limit=args.limit):
+        print(json.dumps(entry, ensure_ascii=False))
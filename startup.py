@@ -0,0 +1,109 @@
+# FILE: startup.py (Import-time and startup-time measurement)
+
+"""Startup timing.
+
+With ``CHRONICLE_STARTUP_TIMING`` set, the CLIs print a ``STARTUP:`` line to stderr at each
+milestone (modules imported, level loaded, first scene), in milliseconds since the process was
+launched when the variable holds the launch time (``time.time()``), or since this module was
+imported when it is just ``1``. Run as a script, it measures cold starts in fresh interpreters:
+the import time of each entry module (with its slowest imports from ``-X importtime``) and the
+time from launching ``game_engine.py`` to its first scene, and exits 1 if any exceeds the budget.
+
+Usage: CHRONICLE_STARTUP_TIMING=1 python game_engine.py
+       python startup.py [--budget 1.0] [--repeat 5] [--level game_instructions.json]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+TIMING_VARIABLE = "CHRONICLE_STARTUP_TIMING"
+ENTRY_MODULES = ("game_engine", "prepare_level", "session_io", "game_server", "simulator", "batch_prepare", "level_stream")
+FIRST_SCENE = "first scene"
+_imported_at = time.time()
+
+
+def _origin():
+    value = os.getenv(TIMING_VARIABLE, "")
+    try: launched = float(value)
+    except ValueError: return _imported_at
+    return launched if launched > 1e9 else _imported_at  # a flag like "1" rather than a timestamp
+
+
+def mark(label):
+    """Report a startup milestone when timing is enabled; a no-op otherwise."""
+    if os.getenv(TIMING_VARIABLE, "") in ("", "0"): return
+    print(f"STARTUP: {label} at {(time.time() - _origin()) * 1000:.1f} ms", file=sys.stderr, flush=True)
+
+
+def _environment(**extra):
+    return {**os.environ, "PYTHONDONTWRITEBYTECODE": "1", **extra}
+
+
+def measure_import(module, repeat=5):
+    """Best-of-`repeat` cold import time of `module` in seconds, and its slowest imports (module, seconds)."""
+    best, slowest = None, []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)), env=_environment())
+        if result.returncode != 0: raise RuntimeError(f"importing {module} failed: {result.stderr.strip().splitlines()[-1]}")
+        rows = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line or "cumulative" in line: continue
+            _, cumulative, name = line.split("|")
+            rows.append((name.strip(), int(cumulative) / 1e6, len(name) - len(name.lstrip())))
+        end = max(i for i, row in enumerate(rows) if row[0] == module)
+        _, total, depth = rows[end]
+        if best is None or total < best:
+            # importtime lists a module's imports just before it, each indented two more spaces
+            start = end
+            while start > 0 and rows[start - 1][2] > depth: start -= 1
+            best, slowest = total, sorted(((name, seconds) for name, seconds, d in rows[start:end] if d == depth + 2), key=lambda row: -row[1])[:5]
+    return best, slowest
+
+
+def measure_first_scene(level, repeat=5, timeout=30.0):
+    """Best-of-`repeat` seconds from launching ``game_engine.py <level>`` to its first scene mark."""
+    best = None
+    for _ in range(repeat):
+        launched = time.time()
+        process = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "game_engine.py"), level], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                                   env=_environment(**{TIMING_VARIABLE: repr(launched), "INSTANT_TEXT": "1"}))
+        watchdog = threading.Timer(timeout, process.kill); watchdog.start()
+        try:
+            elapsed = None
+            for line in process.stderr:
+                if line.startswith(f"STARTUP: {FIRST_SCENE} at "): elapsed = time.time() - launched; break
+        finally:
+            watchdog.cancel(); process.kill(); process.wait()
+        if elapsed is None: raise RuntimeError(f"game_engine.py never reached its first scene (exit code {process.returncode})")
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold import and startup times of the game's entry points.")
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds any import or the start to the first scene may take")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--level", default="game_instructions.json")
+    parser.add_argument("--modules", nargs="+", default=list(ENTRY_MODULES))
+    args = parser.parse_args()
+
+    over_budget = []
+    for module in args.modules:
+        try:
+            seconds, slowest = measure_import(module, args.repeat)
+        except RuntimeError as e:
+            print(f"STARTUP ERROR: {e}"); over_budget.append(module); continue
+        print(f"STARTUP: import {module:14} {seconds * 1000:7.1f} ms  (slowest: {', '.join(f'{name} {s * 1000:.0f} ms' for name, s in slowest)})")
+        if seconds > args.budget: over_budget.append(module)
+    try:
+        seconds = measure_first_scene(os.path.abspath(args.level), args.repeat)
+        print(f"STARTUP: launch to first scene {seconds * 1000:7.1f} ms")
+        if seconds > args.budget: over_budget.append(FIRST_SCENE)
+    except RuntimeError as e:
+        print(f"STARTUP ERROR: {e}"); over_budget.append(FIRST_SCENE)
+    print(f"STARTUP: {'over' if over_budget else 'within'} the {args.budget:g}s budget{': ' + ', '.join(over_budget) if over_budget else ''}.")
+    sys.exit(1 if over_budget else 0)
@@ -0,0 +1,81 @@
+# FILE: tests/conftest.py (Shared fixtures: import path, a scriptable stub backend, no writes into the repo)
+
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubBackend:
+    """A local HTTP server standing in for the Supermemory backend.
+
+    POSTs are recorded in `posts` as ``(path, headers, body)`` and answered with the next status
+    from `statuses` (200 once it runs out); GETs are recorded in `gets` as ``(path, headers)`` and
+    answered with `persona`, or with a bare 304 when their ``If-None-Match`` equals `etag`.
+    """
+
+    def __init__(self):
+        self.posts = []
+        self.gets = []
+        self.statuses = []
+        self.persona = {"total": 0, "items": []}
+        self.etag = None
+        self.lock = threading.Lock()
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status, body, etag=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status); self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(data)))
+                if etag: self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                with backend.lock: backend.gets.append((self.path, dict(self.headers))); etag = backend.etag
+                if etag and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304); self.send_header("ETag", etag); self.end_headers(); return
+                self._reply(200, backend.persona, etag)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with backend.lock:
+                    backend.posts.append((self.path, dict(self.headers), body))
+                    status = backend.statuses.pop(0) if backend.statuses else 200
+                self._reply(status, {"ok": 200 <= status < 300})
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown(); self.server.server_close()
+
+
+@pytest.fixture
+def backend():
+    server = StubBackend()
+    yield server
+    server.close()
+
+
+@pytest.fixture(autouse=True)
+def _sandbox(tmp_path, monkeypatch):
+    """Keep response logs, event exports, spooled run reports and the report archive out of the working tree.
+
+    The outbox installed here is never started, so a submitted report only lands in the temp spool.
+    """
+    import game_engine, report_archive, sm_logger
+    from report_outbox import ReportOutbox
+    monkeypatch.setattr(sm_logger, "DEFAULT_LOG_FILE", str(tmp_path / "logs" / "sm_responses.log"))
+    monkeypatch.setattr(game_engine, "EVENTS_DIR", str(tmp_path / "events"))
+    monkeypatch.setattr(game_engine, "_report_outbox", ReportOutbox("http://127.0.0.1:9/sm/save", None, spool_dir=str(tmp_path / "spool")))
+    monkeypatch.setattr(report_archive, "_archive", report_archive.ReportArchive(str(tmp_path / "archive")))
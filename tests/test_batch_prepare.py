@@ -0,0 +1,66 @@
+import json
+import os
+import threading
+import types
+
+import pytest
+
+import batch_prepare
+import prepare_level
+from batch_prepare import BatchPreparer, level_path
+from content_pool import StubModel
+from persona_cache import PersonaCache
+
+PERSONAS = {"bold": {"traits": {"aggression": 0.9}}, "calm": {"traits": {"aggression": 0.2}}, "doomed": {"traits": {"doomed": 1.0}}}
+PLAYERS = [f"bold_{i}" for i in range(5)] + [f"calm_{i}" for i in range(5)] + ["doomed_0", "doomed_1", "ghost_0"]
+
+
+class _CountingModel(StubModel):
+    """A StubModel that keeps every prompt it is sent and refuses the doomed persona's."""
+
+    def __init__(self):
+        super().__init__(seed=1)
+        self.prompts = []; self.lock = threading.Lock()
+
+    def calls(self, persona):
+        return sum(json.dumps(PERSONAS[persona]["traits"]) in prompt for prompt in self.prompts)
+
+    def generate_content(self, prompt, stream=False):
+        with self.lock: self.prompts.append(prompt)
+        if '"doomed"' in prompt: return types.SimpleNamespace(text="Sorry, I can't help with that.")
+        return super().generate_content(prompt, stream)
+
+
+@pytest.fixture(autouse=True)
+def offline(tmp_path, monkeypatch):
+    """Personas by name prefix (ghosts have none), no fitted difficulty model, no network."""
+    monkeypatch.setattr(batch_prepare, "fetch_persona_from_supermemory", lambda player_id, log=print: (PERSONAS.get(player_id.split("_")[0]), False))
+    monkeypatch.setattr(prepare_level, "_persona_cache", PersonaCache("http://127.0.0.1:9/sm/personas", cache_dir=str(tmp_path / "personas")))
+    monkeypatch.setattr(prepare_level, "_difficulty_model", None)
+
+
+def _run(out_dir, model, **options):
+    preparer = BatchPreparer(out_dir, model=model, fetch_workers=4, generate_workers=2, **options)
+    for player_id in PLAYERS: preparer.submit(player_id)
+    preparer.close()
+    return preparer.counters
+
+
+def test_players_with_the_same_persona_share_one_generation(tmp_path):
+    model = _CountingModel()
+    counters = _run(str(tmp_path / "levels"), model)
+    assert model.calls("bold") == 1 and model.calls("calm") == 1 and 1 <= model.calls("doomed") <= 2
+    assert counters["written"] == 10 and counters["generated"] == 2
+    assert counters["deduplicated"] == len(PLAYERS) - 1 - len(model.prompts)  # the ghost never asks
+    with open(level_path(str(tmp_path / "levels"), "bold_3"), encoding="utf-8") as f: level = json.load(f)
+    assert level["meta"] == {"player_id": "bold_3", "traits": {"aggression": 0.9}} and level["knobs"]["enemy_count"] == 4
+    assert sorted(os.listdir(tmp_path / "levels")) == sorted(os.path.basename(level_path("", player_id)) for player_id in PLAYERS[:10])
+
+
+def test_failures_are_counted_and_retried_with_skip_existing(tmp_path):
+    out_dir = str(tmp_path / "levels")
+    counters = _run(out_dir, _CountingModel())
+    assert (counters["queued"], counters["failed"], counters["no_persona"]) == (13, 3, 1)
+    assert counters["written"] + counters["failed"] == counters["queued"]
+    again = _run(out_dir, _CountingModel(), skip_existing=True)
+    assert (again["skipped"], again["queued"], again["written"], again["failed"]) == (10, 3, 0, 3)
@@ -0,0 +1,29 @@
+import benchmarks
+from benchmarks import compare
+
+
+def test_compare_flags_regressions_by_metric_direction():
+    baseline = {"render": {"chars_per_s": 1000.0, "frame_ms": 10.0, "latency_us": 10.0, "cpu_percent": 5.0, "frames": 60}}
+    results = {"render": {"chars_per_s": 700.0, "frame_ms": 12.0, "latency_us": 14.0, "cpu_percent": 1.0, "frames": 10}}
+    rows = {metric: row for _, metric, *row in compare(results, baseline, tolerance=0.25)}
+    assert rows["chars_per_s"] == [700.0, 1000.0, -0.3, True]   # higher is better: 30% slower
+    assert rows["frame_ms"][3] is False                          # lower is better: 20% is within tolerance
+    assert rows["latency_us"][3] is True                         # ... 40% is not
+    assert rows["cpu_percent"][3] is False                       # an improvement
+    assert rows["frames"][3] is False                            # no known direction, never a regression
+
+
+def test_compare_without_a_baseline_value():
+    rows = compare({"qte": {"qte_latency_p50_us": 40.0}, "new": {"new_per_s": 1.0}}, {"qte": {"qte_latency_p50_us": 0}}, 0.25)
+    assert rows == [("qte", "qte_latency_p50_us", 40.0, None, None, False), ("new", "new_per_s", 1.0, None, None, False)]
+
+
+def test_benchmarks_return_directional_metrics(tmp_path):
+    metrics = benchmarks.BENCHMARKS["level_load"](str(tmp_path), True)
+    assert metrics and all(value > 0 and name.endswith(benchmarks.HIGHER_IS_BETTER + benchmarks.LOWER_IS_BETTER) for name, value in metrics.items())
+
+
+def test_qte_benchmark_reads_keys_through_a_terminal(tmp_path):
+    metrics = benchmarks.BENCHMARKS["qte"](str(tmp_path), True)
+    assert set(metrics) == {"qte_cpu_percent", "qte_latency_p50_us", "qte_latency_p99_us"}
+    assert 0 < metrics["qte_latency_p50_us"] <= metrics["qte_latency_p99_us"]
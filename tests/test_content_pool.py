@@ -0,0 +1,58 @@
+import os
+import threading
+
+from content_pool import PENDING_FILE, STUB_ADVENTURE, ContentPool, StubModel, bucket_key
+from prepare_level import generate_llm_content
+
+PERSONA = {"traits": {"aggression": 0.9, "curiosity": 0.1}}
+
+
+def _stub_generate(persona):
+    return generate_llm_content(persona, model=StubModel(seed=1), log=lambda message: None)
+
+
+def test_take_pops_a_ready_adventure_from_a_warm_bucket(tmp_path):
+    pool = ContentPool(_stub_generate, per_bucket=2, pool_dir=str(tmp_path))
+    assert pool.fill(PERSONA) == 2
+    assert pool.take(PERSONA) == STUB_ADVENTURE
+    assert pool.size(PERSONA["traits"]) == 1
+    assert pool.stats()["hits"] == 1 and pool.stats()["generated"] == 2
+
+
+def test_cold_miss_queues_a_refill_for_the_bucket(tmp_path):
+    generated = []
+    pool = ContentPool(lambda persona: generated.append(persona) or _stub_generate(persona), per_bucket=2, pool_dir=str(tmp_path)).start()
+    assert pool.take(PERSONA) is None
+    assert pool.close(timeout=10.0) == 0
+    assert pool.size(PERSONA["traits"]) == 2
+    assert generated[0] == {"traits": {"aggression": 0.833, "curiosity": 0.167}}  # the bucket's centre, not the player
+    assert pool.stats()["misses"] == 1
+
+
+def test_close_saves_unfinished_refills_for_the_next_start(tmp_path):
+    release = threading.Event()
+    pool = ContentPool(lambda persona: release.wait(10) and None, pool_dir=str(tmp_path)).start()
+    pool.request_refill(PERSONA); pool.request_refill({"traits": {"aggression": 0.1}})
+    assert pool.close(timeout=0) == 2  # the LLM is still busy with the first bucket
+    release.set()
+    with open(os.path.join(tmp_path, PENDING_FILE), encoding="utf-8") as fh:
+        assert fh.read().split() == sorted([bucket_key(PERSONA["traits"]), "aggression=0"])
+    resumed = ContentPool(_stub_generate, per_bucket=1, pool_dir=str(tmp_path)).start()
+    assert resumed.close(timeout=10.0) == 0
+    assert resumed.size(PERSONA["traits"]) == 1 and not os.path.exists(os.path.join(tmp_path, PENDING_FILE))
+
+
+def test_cold_miss_generates_for_the_player_before_refilling_the_bucket(tmp_path):
+    calls = []; lock = threading.Lock(); in_flight = [0]
+    def generate(persona):
+        with lock: in_flight[0] += 1; calls.append((persona, in_flight[0]))
+        try: return _stub_generate(persona)
+        finally:
+            with lock: in_flight[0] -= 1
+    pool = ContentPool(generate, per_bucket=2, pool_dir=str(tmp_path)).start()
+    assert pool.take_or_generate(PERSONA) == (STUB_ADVENTURE, False)
+    assert calls[0][0] is PERSONA  # the player's own traits, not the bucket's centre
+    assert pool.close(timeout=10.0) == 0
+    assert len(calls) == 3 and max(overlap for _, overlap in calls) == 1  # the refill started after the player's call
+    assert pool.take_or_generate(PERSONA) == (STUB_ADVENTURE, True)
+    assert pool.stats()["misses"] == 1 and pool.stats()["hits"] == 1
@@ -0,0 +1,70 @@
+import pytest
+
+import prepare_level
+from difficulty_model import MIN_RECORDS, DifficultyModel, RunHistory
+from report_archive import ReportArchive
+
+SETTINGS = ({"enemy_count": 2, "enemy_speed": 0.7}, {"enemy_count": 3, "enemy_speed": 1.0}, {"enemy_count": 4, "enemy_speed": 1.2})
+EASY, HARD = SETTINGS[0], SETTINGS[2]
+
+
+def _runs(per_cell=20):
+    """Runs where timid players (aggression 0) retry more as enemies are added and aggressive ones
+    (aggression 1) retry less: retries = count - 1 + aggression * (6 - 2 * count)."""
+    runs = []
+    for aggression in (0.0, 1.0):
+        for knobs in SETTINGS:
+            for i in range(per_cell):
+                retries = knobs["enemy_count"] - 1 + int(aggression) * (6 - 2 * knobs["enemy_count"])
+                report = {"player_id": f"p{i}", "session_id": f"sess_{aggression}_{knobs['enemy_count']}_{i}", "run_outcome": {"result": "win"},
+                          "stats": {"retries": retries, "deaths": retries}, "config_used": {"knobs": knobs}}
+                runs.append((report, None, {"aggression": aggression}))
+    return runs
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = ReportArchive(str(tmp_path / "archive"))
+    archive.append_many(_runs())
+    return archive
+
+
+def test_history_from_archive_keeps_rows_with_traits_and_knobs(archive):
+    archive.append_many([({"session_id": "sess_untuned", "stats": {"retries": 9}, "config_used": {"knobs": EASY}}, None, None)])
+    history = RunHistory.from_archive(archive)
+    assert len(history) == 120
+    assert sorted(set(history.traits[:, 0])) == [0.0, 1.0] and set(history.traits[:, 1]) == {0.5}
+
+
+def test_fitted_model_recommends_knobs_that_hit_the_target(archive):
+    model = DifficultyModel.fit(RunHistory.from_archive(archive), target=1.0)
+    assert model.records == 120 and len(model.knob_grid) == 3
+    timid, aggressive = {"traits": {"aggression": 0.0}}, {"traits": {"aggression": 1.0}}
+    assert model.knobs_for_cohort([timid, aggressive]) == [EASY, HARD]
+
+
+def test_rarely_seen_settings_are_never_recommended(archive):
+    rare = {"enemy_count": 9, "enemy_speed": 2.0}
+    archive.append_many([({"session_id": f"sess_rare_{i}", "stats": {"retries": 1}, "config_used": {"knobs": rare}}, None, {"aggression": 1.0}) for i in range(3)])
+    model = DifficultyModel.fit(RunHistory.from_archive(archive))
+    assert model.records == 123 and rare not in model.knobs_for_cohort([{"traits": {"aggression": a / 10}} for a in range(11)])
+    with pytest.raises(ValueError, match="two knob settings"):
+        DifficultyModel.fit(RunHistory.from_archive(archive), min_support=41)
+
+
+def test_too_little_history_falls_back_to_the_thresholds(monkeypatch):
+    history = RunHistory.from_reports([report for report, _, _ in _runs(per_cell=2)], lambda player_id: {"aggression": 1.0})
+    assert len(history) < MIN_RECORDS
+    with pytest.raises(ValueError, match="at least"):
+        DifficultyModel.fit(history)
+    monkeypatch.setattr(prepare_level, "_difficulty_model", None)  # what get_difficulty_model() holds with no saved model
+    knobs, reasons = prepare_level.decide_knobs({"traits": {"aggression": 0.9, "resilience": 0.2}}, False, log=lambda message: None)
+    assert knobs == {"enemy_count": 4, "enemy_speed": 0.8} and len(reasons) == 2
+
+
+def test_saved_model_drives_decide_knobs(archive, tmp_path, monkeypatch):
+    path = DifficultyModel.fit(RunHistory.from_archive(archive)).save(str(tmp_path / "model.npz"))
+    monkeypatch.setattr(prepare_level, "_difficulty_model", DifficultyModel.load(path))
+    knobs, reasons = prepare_level.decide_knobs({"traits": {"aggression": 1.0}}, False, log=lambda message: None)
+    assert knobs == HARD and "120 past runs" in reasons[0]
+    assert prepare_level.decide_knobs({"traits": {"aggression": 1.0}}, True, log=lambda message: None)[0] == {"enemy_count": 2, "enemy_speed": 0.7}
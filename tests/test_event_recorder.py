@@ -0,0 +1,60 @@
+import json
+
+from event_recorder import BOSS_SCENE, EventRecorder
+
+
+class _Clock:
+    def __init__(self): self.now = 100.0
+    def __call__(self): return self.now
+
+
+def _recorder(capacity=8, scene_count=None):
+    clock = _Clock()
+    return EventRecorder(capacity=capacity, scene_count=scene_count, clock=clock), clock
+
+
+def test_ring_keeps_the_newest_events_oldest_first():
+    events, clock = _recorder(capacity=8)
+    events.scene_enter(0, "QTE"); events.combat_start()
+    for press in range(1, 21):
+        clock.now += 0.1; events.combat_press(press)
+    clock.now += 0.1; events.combat_end(True)
+    assert len(events) == 8 and events.dropped == 15
+    kept = list(events.iter_events())
+    assert [kind for _, kind, _, _ in kept] == ["combat.press"] * 7 + ["combat.win"]
+    assert [value for _, _, _, value in kept[:7]] == [14.0, 15.0, 16.0, 17.0, 18.0, 19.0, 20.0]
+    assert [round(t, 1) for t, _, _, _ in kept] == [1.4, 1.5, 1.6, 1.7, 1.8, 1.9, 2.0, 2.1]
+
+
+def test_digest_summarizes_a_fixed_set_of_kinds_after_wraparound():
+    events, clock = _recorder(capacity=4)
+    for scene in range(3):
+        events.scene_enter(scene, "QTE"); events.combat_start()
+        for press in range(1, 31): events.combat_press(press)
+        events.combat_end(scene != 1)
+        if scene == 1: events.death()
+        events.scene_exit(scene != 1)
+    events.scene_enter(3, "RIDDLE"); events.puzzle_start(); events.puzzle_answer(True)
+    assert events.digest() == [{"type": "death", "count": 1}, {"type": "fail.retry", "count": 1}, {"type": "combat.start", "count": 3}, {"type": "combat.win", "count": 2}, {"type": "puzzle.attempt", "count": 1}]
+    assert events.count("combat.press") == 90 and events.deaths_by_type()["QTE"] == 1
+
+
+def test_exploration_ratio_is_the_share_of_scenes_reached():
+    events, _ = _recorder(scene_count=4)
+    events.scene_enter(0); events.scene_enter(1); events.death(); events.scene_enter(0); events.scene_enter(1); events.scene_enter(BOSS_SCENE)
+    assert events.exploration_ratio() == 0.5
+    assert _recorder(scene_count=4)[0].exploration_ratio() == 0.0
+    streamed, _ = _recorder()  # no scene count: the furthest scene reached bounds the level
+    streamed.scene_enter(0); streamed.scene_enter(2)
+    assert streamed.exploration_ratio() == round(2 / 3, 3)
+
+
+def test_ndjson_export_matches_the_ring(tmp_path):
+    events, clock = _recorder(capacity=5)
+    events.scene_enter(0, "RIDDLE")
+    for _ in range(6):
+        clock.now += 0.5; events.puzzle_start(); events.puzzle_answer(False)
+    with open(events.export_ndjson(str(tmp_path / "events" / "sess.ndjson")), encoding="utf-8") as fh:
+        rows = [json.loads(line) for line in fh]
+    assert rows == [{"t": round(t, 4), "type": kind, "scene": scene, "value": value} for t, kind, scene, value in events.iter_events()]
+    assert len(rows) == 5 and rows[-1]["type"] == "puzzle.fail" and rows[0]["t"] <= rows[-1]["t"]
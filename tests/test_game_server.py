@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+
+import game_engine  # noqa: F401  (registers the built-in challenge types)
+import game_server
+from game_server import GameServer, load_test, strip_telnet
+from level_compiler import compile_level
+
+LEVEL = compile_level({"meta": {"player_id": "p1"}, "knobs": {}, "content": {"title": "Test Spire", "scenes": [
+    {"intro_text": "A fork.", "challenge": {"type": "DILEMMA", "options": ["Fight", "Sneak"]}},
+    {"intro_text": "A guard.", "challenge": {"type": "QTE", "key": "s", "presses": 4, "time_limit": 5}},
+    {"intro_text": "A riddle.", "challenge": {"type": "RIDDLE", "riddle_text": "What has cities but no houses?", "answer": "map", "time_limit": 30}},
+]}})
+
+
+async def _read_until(reader, marker, timeout=5.0):
+    text = ""
+    while marker not in text: text += (await asyncio.wait_for(reader.read(4096), timeout)).decode("utf-8", "replace")
+    return text
+
+
+def _serve(scenario, level=LEVEL, **options):
+    """Run `scenario(server)` against a GameServer on a free local port, then close it."""
+    async def run():
+        server = await GameServer(level, sleep_scale=0, submit=False, **options).start("127.0.0.1", 0)
+        try: return server, await scenario(server)
+        finally: await server.close()
+    return asyncio.run(run())
+
+
+def test_strip_telnet():
+    assert strip_telnet(b"\xff\xfb\x01ab\xff\xffc\xff\xfa\x18\x00xterm\xff\xf0d") == b"ab\xffcd"
+    assert strip_telnet(b"plain") == b"plain"
+
+
+def test_a_client_plays_a_session_to_victory():
+    async def scenario(server):
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        await _read_until(reader, "Player ID: "); writer.write(b"alice\r\n")
+        await _read_until(reader, "> "); writer.write(b"1\r\n")
+        await _read_until(reader, "TIMES"); writer.write(b"SSSS\r\n")
+        await _read_until(reader, "> "); writer.write(b"a map\r\n")
+        await _read_until(reader, "TIMES"); writer.write(b"S" * 15 + b"\r\n")
+        text = await _read_until(reader, "saved to your Supermemory profile")
+        writer.close()
+        return text
+    server, text = _serve(scenario)
+    assert "You rescued the princess, unverified:alice!" in text
+    assert server.stats["wins"] == 1 and server.stats["errors"] == 0
+
+
+def test_sessions_beyond_the_limit_are_turned_away():
+    async def scenario(server):
+        first = await asyncio.open_connection("127.0.0.1", server.port)
+        await _read_until(first[0], "Player ID: ")
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        text = await _read_until(reader, "\n")
+        first[1].close(); writer.close()
+        return text
+    server, text = _serve(scenario, max_sessions=1)
+    assert "Server is full" in text and server.stats["rejected"] == 1
+
+
+def test_close_hangs_up_on_idle_sessions():
+    async def scenario(server):
+        clients = [await asyncio.open_connection("127.0.0.1", server.port) for _ in range(5)]
+        for reader, _ in clients: await _read_until(reader, "Player ID: ")
+        return clients
+    started = time.monotonic()
+    server, _ = _serve(scenario)
+    assert time.monotonic() - started < 5.0
+    assert server.stats["disconnects"] == 5 and server.active == 0
+
+
+def test_load_test_drives_concurrent_clients():
+    stats, latencies = asyncio.run(load_test(LEVEL, clients=25, duration=1.0))
+    assert stats["sessions"] >= 25 and stats["errors"] == 0 and stats["peak_active"] >= 25
+    assert latencies and latencies[len(latencies) // 2] < 0.5
+
+
+def test_a_session_ended_by_system_exit_counts_as_an_error(monkeypatch):
+    async def exit_mid_game(*args, **kwargs): raise SystemExit(3)
+    monkeypatch.setattr(game_server, "play_game_async", exit_mid_game)
+    async def scenario(server):
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        await _read_until(reader, "Player ID: "); writer.write(b"alice\r\n")
+        await reader.read()  # the server hangs up once the session is over
+        writer.close()
+    server, _ = _serve(scenario)
+    assert server.stats["errors"] == 1 and server.active == 0
+
+
+def test_qte_deadlines_expire_on_the_event_loop_without_threads():
+    level = compile_level({"meta": {"player_id": "p1"}, "knobs": {}, "content": {"title": "Quick", "scenes": [
+        {"intro_text": "A guard.", "challenge": {"type": "QTE", "key": "s", "presses": 4, "time_limit": 0.2}}]}})
+    async def scenario(server):
+        threads = threading.active_count()
+        clients = [await asyncio.open_connection("127.0.0.1", server.port) for _ in range(20)]
+        for i, (reader, writer) in enumerate(clients): await _read_until(reader, "Player ID: "); writer.write(f"p{i}\r\n".encode())
+        texts = [await _read_until(reader, "Too slow!") for reader, _ in clients]  # nobody mashes
+        for _, writer in clients: writer.close()
+        return texts, threading.active_count() - threads
+    server, (texts, extra_threads) = _serve(scenario, level=level)
+    assert len(texts) == 20 and extra_threads == 0 and server.stats["errors"] == 0
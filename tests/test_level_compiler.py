@@ -0,0 +1,76 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+import game_engine  # noqa: F401  (registers the built-in challenge types)
+import level_compiler
+from level_compiler import CHALLENGE_TYPES, LevelCompileError, compile_level, load_level, register_challenge, validate_catalogue
+from session_io import run_sync
+
+
+# Registered at import, so spawned catalogue workers get it by importing this module.
+@register_challenge('TEST_LEVER', lambda c: 'pulls' in c, lambda c: {**c, 'pulls': int(c['pulls'])})
+async def run_test_lever(state, challenge):
+    return challenge['pulls'] > 0
+
+
+def _level(*challenges):
+    return {"meta": {"player_id": "p1"}, "knobs": {}, "content": {"title": "t", "scenes": [{"intro_text": f"scene {i}", "challenge": c} for i, c in enumerate(challenges)]}}
+
+
+def _write(path, document):
+    with open(path, "w", encoding="utf-8") as f: json.dump(document, f)
+    return str(path)
+
+
+def test_compile_normalizes_and_binds_handlers():
+    level = compile_level(_level({"type": "QTE", "key": "s", "presses": "5", "time_limit": "2.5"}, {"type": "TEST_LEVER", "pulls": "2"}))
+    qte, lever = (scene.challenge for scene in level.scenes)
+    assert qte.data == {"type": "QTE", "key": "S", "presses": 5, "time_limit": 2.5}
+    assert qte.handler is CHALLENGE_TYPES['QTE'][2] and run_sync(lever.run(None)) is True
+    assert level.errors == []
+
+
+def test_bad_challenges_are_dropped_or_rejected():
+    document = _level({"type": "NOPE"}, {"type": "QTE", "key": "S"})
+    level = compile_level(document)
+    assert [scene.intro_text for scene in level.scenes] == ["scene 0", "scene 1"]
+    assert [scene.challenge for scene in level.scenes] == [None, None]
+    assert "unknown challenge type 'NOPE'" in level.errors[0] and "missing data" in level.errors[1]
+    with pytest.raises(LevelCompileError):
+        compile_level(document, strict=True)
+
+
+def test_malformed_meta_and_content_are_reported_not_raised():
+    level = compile_level({"meta": ["p1"], "knobs": {}, "content": "scenes"})
+    assert (level.player_id, level.traits, level.title, level.scenes) == (None, None, None, [])
+    assert level.errors == ["'content' is not an object", "'meta' is not an object"]
+    with pytest.raises(LevelCompileError, match="'meta' is not an object"):
+        compile_level({**_level({"type": "TEST_LEVER", "pulls": 1}), "meta": "p1"}, strict=True)
+
+
+def test_load_level_serves_the_cached_compilation(tmp_path, monkeypatch):
+    path = _write(tmp_path / "level.json", _level({"type": "TEST_LEVER", "pulls": 1}))
+    cache_dir = str(tmp_path / "cache")
+    first = load_level(path, cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    monkeypatch.setattr(level_compiler, "compile_level", lambda *args: pytest.fail("recompiled a cached level"))
+    second = load_level(path, cache_dir)
+    assert second.digest == first.digest and second.scenes[0].challenge.handler is run_test_lever
+
+
+def test_levels_with_unregistered_types_are_not_cached(tmp_path):
+    path = _write(tmp_path / "level.json", _level({"type": "NOT_YET_REGISTERED"}))
+    cache_dir = str(tmp_path / "cache")
+    assert load_level(path, cache_dir).errors
+    assert not os.path.exists(cache_dir)
+
+
+def test_catalogue_validates_in_spawned_workers(tmp_path):
+    good = [_write(tmp_path / f"good{i}.json", _level({"type": "QTE", "key": "S", "presses": 3, "time_limit": 1}, {"type": "TEST_LEVER", "pulls": i})) for i in range(3)]
+    bad = _write(tmp_path / "bad.json", _level({"type": "NOPE"}))
+    results = validate_catalogue(good + [bad], workers=2, mp_context=multiprocessing.get_context("spawn"), cache_dir=str(tmp_path / "cache"))
+    assert all(results[path] == [] for path in good)
+    assert "unknown challenge type 'NOPE'" in results[bad][0]
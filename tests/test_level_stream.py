@@ -0,0 +1,69 @@
+import json
+import threading
+import types
+
+import game_engine  # noqa: F401  (registers the built-in challenge types)
+from content_pool import STUB_ADVENTURE, StubModel
+from level_stream import SceneStreamParser, StreamingLevel, iter_scenes
+
+
+class GatedModel:
+    """Streams `text` in two halves and holds the second one back until `release` is set."""
+
+    def __init__(self, text, split, fail=False):
+        self.text = text; self.split = split; self.fail = fail
+        self.release = threading.Event()
+
+    def generate_content(self, prompt, stream=False):
+        assert stream
+        yield types.SimpleNamespace(text=self.text[:self.split])
+        self.release.wait(10)
+        if self.fail: raise ConnectionError("stream dropped")
+        yield types.SimpleNamespace(text=self.text[self.split:])
+
+
+def _text(adventure=STUB_ADVENTURE):
+    return "```json\n" + json.dumps(adventure, indent=2) + "\n```"
+
+
+def test_parser_emits_each_scene_as_it_closes():
+    adventure = {"title": "Braces {in} \"strings\"", "scenes": [{"intro_text": "A } brace and a \\\" quote.", "challenge": {"type": "FIND_COLLECTIBLE", "description": "{"}}] + STUB_ADVENTURE["scenes"]}
+    parser, scenes = SceneStreamParser(), []
+    for char in _text(adventure): scenes.extend(parser.feed(char))
+    assert scenes == adventure["scenes"] and parser.title == adventure["title"] and parser.done
+
+
+def test_stub_model_stream_compiles_every_scene():
+    chunks = (chunk.text for chunk in StubModel(seed=1, chunk_size=7).generate_content("prompt", stream=True))
+    scenes = list(iter_scenes(chunks))
+    assert [scene.index for scene in scenes] == [0, 1, 2, 3]
+    assert [(scene.intro_text, scene.challenge.type) for scene in scenes] == [(scene["intro_text"], scene["challenge"]["type"]) for scene in STUB_ADVENTURE["scenes"]]
+
+
+def test_invalid_streamed_scenes_are_skipped_and_indices_stay_dense():
+    adventure = {"title": "t", "scenes": [{"intro_text": "bad", "challenge": {"type": "QTE"}}] + STUB_ADVENTURE["scenes"][:2]}
+    scenes = list(iter_scenes([_text(adventure)]))
+    assert [(scene.index, scene.intro_text) for scene in scenes] == [(0, STUB_ADVENTURE["scenes"][0]["intro_text"]), (1, STUB_ADVENTURE["scenes"][1]["intro_text"])]
+
+
+def test_first_scene_is_playable_before_the_stream_ends():
+    text = _text()
+    model = GatedModel(text, text.index('"intro_text"', text.index('"intro_text"') + 1))  # just after scene 0 closes
+    level = StreamingLevel("prompt", model).start()
+    first = next(iter(level.scenes))
+    assert first.index == 0 and not level.scenes.finished and level.first_scene_s is not None
+    model.release.set()
+    content = level.to_content(timeout=10)
+    assert level.scenes.finished and level.scenes.error is None
+    assert content["title"] == STUB_ADVENTURE["title"] and len(content["scenes"]) == 4
+    assert [scene.index for scene in level.level("p1", {}).scenes] == [0, 1, 2, 3]  # replayable after a death
+
+
+def test_a_failed_stream_keeps_the_scenes_it_produced():
+    text = _text()
+    model = GatedModel(text, text.index('"intro_text"', text.index('"intro_text"') + 1), fail=True)
+    level = StreamingLevel("prompt", model).start()
+    model.release.set()
+    assert level.scenes.wait(10)
+    assert isinstance(level.scenes.error, ConnectionError)
+    assert [scene.index for scene in level.scenes] == [0]
@@ -0,0 +1,41 @@
+import os
+
+from persona_cache import PersonaCache
+
+PERSONA = {"total": 1, "items": [{"persona": {"traits": {"speed": 0.8}}}]}
+
+
+def _cache(url, tmp_path, **kwargs):
+    return PersonaCache(f"{url}/sm/personas", "key", cache_dir=str(tmp_path / "personas"), **kwargs)
+
+
+def test_fresh_entry_is_served_without_the_network(backend, tmp_path):
+    backend.persona = PERSONA
+    cache = _cache(backend.url, tmp_path)
+    assert cache.get("p1") == PERSONA
+    assert cache.get("p1") == PERSONA
+    assert len(backend.gets) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["fetched"] == 1
+
+
+def test_invalidated_entry_revalidates_with_its_etag(backend, tmp_path):
+    backend.persona, backend.etag = PERSONA, '"v1"'
+    cache = _cache(backend.url, tmp_path)
+    cache.get("p1")
+    cache.invalidate("p1")
+    assert cache.peek("p1") == PERSONA
+    assert cache.get("p1") == PERSONA
+    assert [headers.get("If-None-Match") for _, headers in backend.gets] == [None, '"v1"']
+    assert cache.stats()["revalidated"] == 1
+    assert cache.get("p1") == PERSONA and len(backend.gets) == 2  # fresh again after the 304
+
+
+def test_invalidated_entry_survives_a_restart_and_an_outage(backend, tmp_path):
+    backend.persona, backend.etag = PERSONA, '"v1"'
+    cache = _cache(backend.url, tmp_path)
+    cache.get("p1")
+    cache.invalidate("p1")
+    assert len(os.listdir(tmp_path / "personas")) == 1
+    offline = PersonaCache("http://127.0.0.1:9/sm/personas", "key", cache_dir=str(tmp_path / "personas"), timeout=0.5)
+    assert offline.get("p1") == PERSONA
+    assert offline.stats()["misses"] == 1 and offline.stats()["errors"] == 1
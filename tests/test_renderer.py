@@ -0,0 +1,59 @@
+import io
+import time
+from collections import deque
+
+from keyboard_input import KeyEvent
+from renderer import CLEAR_SCREEN, Renderer
+
+TEXT = "The dragon's shadow sweeps across the bridge."
+
+
+class _StubKeyboard:
+    """The session keyboard as the renderer sees it: a queue of events and a poll that, on its
+    first calls, delivers one batch of `typed` keys each."""
+
+    def __init__(self, queued="", *typed):
+        self.events = deque(KeyEvent(char.upper(), 0.0, char) for char in queued)
+        self.typed = list(typed)
+        self.polls = 0
+
+    def poll(self, timeout):
+        self.polls += 1
+        if not self.typed: time.sleep(timeout); return 0
+        keys = self.typed.pop(0)
+        self.events.extend(KeyEvent(char.upper(), time.monotonic(), char) for char in keys)
+        return len(keys)
+
+
+def _renderer(keyboard, monkeypatch, **options):
+    out = io.StringIO()
+    renderer = Renderer(stream=out, **options)
+    monkeypatch.setattr(renderer, "_keyboard", lambda: keyboard)
+    renderer.session_keyboard = keyboard  # the game's keyboard is already entered; the renderer only reads it
+    return renderer, out
+
+
+def test_skip_key_flushes_the_rest_and_leaves_other_keys_queued(monkeypatch):
+    keyboard = _StubKeyboard(" q", "a", " b")  # a space typed before the text is not a skip
+    renderer, out = _renderer(keyboard, monkeypatch, instant=False)
+    started = time.monotonic()
+    renderer.typewriter(TEXT, delay=0.2)
+    assert time.monotonic() - started < 1.0 and keyboard.polls == 2
+    assert out.getvalue() == TEXT + "\n"
+    assert [event.char for event in keyboard.events] == [" ", "q", "a", "b"]
+
+
+def test_other_keys_do_not_cut_the_animation_short(monkeypatch):
+    keyboard = _StubKeyboard("", "x", "y")
+    renderer, out = _renderer(keyboard, monkeypatch, instant=False, frame_rate=200)
+    renderer.typewriter("abcdef", delay=0.01)
+    assert out.getvalue() == "abcdef\n" and [event.key for event in keyboard.events] == ["X", "Y"]
+
+
+def test_instant_mode_writes_each_call_at_once(monkeypatch):
+    keyboard = _StubKeyboard("", " ")
+    renderer, out = _renderer(keyboard, monkeypatch, instant=True)
+    renderer.typewriter(TEXT); renderer.clear_screen(); renderer.write("a"); renderer.write("b")
+    assert out.getvalue() == TEXT + "\n" + CLEAR_SCREEN
+    renderer.flush()
+    assert out.getvalue().endswith(CLEAR_SCREEN + "ab") and keyboard.polls == 0 and len(keyboard.events) == 0
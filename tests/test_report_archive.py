@@ -0,0 +1,85 @@
+import math
+import random
+import time
+
+import pytest
+
+from report_archive import CHALLENGE_TYPES, ReportArchive
+
+KNOBS = ({"enemy_count": 2, "enemy_speed": 0.7}, {"enemy_count": 4, "enemy_speed": 1.2})
+START = 1_700_000_000
+
+
+def _reports(count, seed=3):
+    rng = random.Random(seed); items = []
+    for i in range(count):
+        report = {"player_id": f"p{i % 3}", "session_id": f"sess_{i}", "run_index": i,
+                  "completed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(START + i * 60)),
+                  "run_outcome": {"result": rng.choice(["win", "loss"]), "path": "exploration"},
+                  "stats": {"deaths": rng.randint(0, 5), "time_s": rng.randint(30, 300), "jumps": rng.randint(0, 9)},
+                  "config_used": {"knobs": rng.choice(KNOBS)}}
+        deaths = {name: rng.randint(0, 2) for name in CHALLENGE_TYPES}
+        traits = {"aggression": rng.choice([0.25, 0.75])} if i % 4 else None  # every fourth run has no traits
+        items.append((report, deaths, traits))
+    return items
+
+
+def _expected(items, key, keep=lambda report: True):
+    groups = {}
+    for report, _, _ in items:
+        if keep(report): groups.setdefault(key(report), []).append(report)
+    return groups
+
+
+@pytest.fixture
+def archived(tmp_path):
+    items = _reports(40)
+    archive = ReportArchive(str(tmp_path / "archive"))
+    assert archive.append_many(items) == 40
+    return archive, items
+
+
+def test_aggregate_matches_a_plain_python_group_by(archived):
+    archive, items = archived
+    rows = archive.aggregate("knobs", {"runs": "count", "deaths": ("deaths", "sum"), "win_rate": ("win", "mean"), "fastest": ("time_s", "min"), "slowest": ("time_s", "max")})
+    expected = _expected(items, lambda report: report["config_used"]["knobs"]["enemy_count"])
+    assert len(rows) == len(expected)
+    for row in rows:
+        reports = expected[row["knobs"]["enemy_count"]]
+        assert row["runs"] == len(reports)
+        assert row["deaths"] == sum(report["stats"]["deaths"] for report in reports)
+        assert row["win_rate"] == pytest.approx(sum(report["run_outcome"]["result"] == "win" for report in reports) / len(reports))
+        assert row["fastest"] == min(report["stats"]["time_s"] for report in reports)
+        assert row["slowest"] == max(report["stats"]["time_s"] for report in reports)
+
+
+def test_where_and_time_range_filter_rows(archived):
+    archive, items = archived
+    since, until = START + 10 * 60, START + 29 * 60
+    rows = archive.aggregate("player_id", {"runs": "count", "jumps": ("jumps", "sum")}, where={"result": "win"}, since=since, until=until)
+    expected = _expected(items, lambda report: report["player_id"], lambda report: report["run_outcome"]["result"] == "win" and 10 <= report["run_index"] <= 29)
+    assert {row["player_id"]: (row["runs"], row["jumps"]) for row in rows} == {player: (len(reports), sum(report["stats"]["jumps"] for report in reports)) for player, reports in expected.items()}
+
+
+def test_deaths_by_type_sums_per_challenge_type(archived):
+    archive, items = archived
+    wins = [deaths for report, deaths, _ in items if report["run_outcome"]["result"] == "win"]
+    assert archive.deaths_by_type(where={"result": "win"}) == {name: sum(deaths[name] for deaths in wins) for name in CHALLENGE_TYPES}
+
+
+def test_missing_traits_form_one_group_across_segments(tmp_path):
+    items = _reports(40)
+    archive = ReportArchive(str(tmp_path / "archive"), segment_rows=16)
+    archive.append_many(items)
+    assert len(archive.segments()) == 3
+    rows = archive.aggregate("trait_aggression", {"runs": "count"})
+    assert [row["trait_aggression"] for row in rows] == [0.25, 0.75, None]
+    assert rows[-1]["runs"] == sum(traits is None for _, _, traits in items)
+    assert sum(row["runs"] for row in rows) == 40 and not any(isinstance(row["trait_aggression"], float) and math.isnan(row["trait_aggression"]) for row in rows)
+
+
+def test_ingesting_archived_sessions_again_is_a_no_op(archived):
+    archive, items = archived
+    reports = [report for report, _, _ in items]
+    assert archive.append_many(reports + [dict(reports[0], session_id="sess_new")] * 2, skip_archived=True) == 1
+    assert len(archive) == 41
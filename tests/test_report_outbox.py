@@ -0,0 +1,102 @@
+import os
+import time
+
+import pytest
+
+from report_outbox import FAILED_DIR_NAME, ReportOutbox
+
+
+def _report(session_id):
+    return {"schema_version": "1.0", "player_id": "p1", "session_id": session_id, "stats": {"deaths": 0}, "config_used": {"knobs": {}}}
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return str(tmp_path / "spool")
+
+
+def test_retries_with_backoff_until_the_backend_recovers(backend, spool):
+    backend.statuses = [503, 503, 200]
+    outbox = ReportOutbox(f"{backend.url}/sm/save", "key", spool_dir=spool, base_backoff=0.05, max_backoff=0.2).start()
+    started = time.monotonic()
+    outbox.enqueue(_report("sess_a"))
+    assert outbox.flush(timeout=10.0)
+    assert outbox.close() == 0
+    assert [path for path, _, _ in backend.posts] == ["/sm/save"] * 3
+    assert all(headers["Idempotency-Key"] == "sess_a" and headers["X-API-Key"] == "key" for _, headers, _ in backend.posts)
+    assert backend.posts[-1][2] == {"serverInput": _report("sess_a")}
+    assert time.monotonic() - started >= 0.05 * 0.5 + 0.1 * 0.5  # two jittered backoffs
+    assert outbox.sent == 1
+
+
+def test_unreachable_backend_keeps_reports_spooled(spool):
+    outbox = ReportOutbox("http://127.0.0.1:9/sm/save", "key", spool_dir=spool, timeout=0.5)
+    outbox.enqueue(_report("sess_a"))
+    assert outbox.flush_once() is False
+    assert outbox.close() == 1
+    assert ReportOutbox("http://127.0.0.1:9/sm/save", "key", spool_dir=spool).pending()[0].endswith("sess_a.json")
+
+
+def test_rejected_report_is_set_aside(backend, spool):
+    backend.statuses = [400]
+    outbox = ReportOutbox(f"{backend.url}/sm/save", "key", spool_dir=spool)
+    outbox.enqueue(_report("sess_bad"))
+    assert outbox.flush_once() is True
+    assert outbox.pending() == []
+    assert os.listdir(os.path.join(spool, FAILED_DIR_NAME)) == ["sess_bad.json"]
+
+
+def test_batches_queued_reports_into_one_request(backend, spool):
+    outbox = ReportOutbox(f"{backend.url}/sm/save", "key", batch_url=f"{backend.url}/sm/save_batch", spool_dir=spool, batch_size=10)
+    for i in range(4): outbox.enqueue(_report(f"sess_{i}"))
+    assert outbox.flush_once() is True
+    assert len(backend.posts) == 1
+    path, headers, body = backend.posts[0]
+    assert path == "/sm/save_batch"
+    assert sorted(report["session_id"] for report in body["serverInputs"]) == [f"sess_{i}" for i in range(4)]
+    assert outbox.pending() == [] and outbox.sent == 4
+
+
+def test_unsupported_batch_endpoint_falls_back_to_single_posts(backend, spool):
+    backend.statuses = [404]
+    outbox = ReportOutbox(f"{backend.url}/sm/save", "key", batch_url=f"{backend.url}/sm/save_batch", spool_dir=spool)
+    for i in range(3): outbox.enqueue(_report(f"sess_{i}"))
+    assert outbox.flush_once() is True
+    assert [path for path, _, _ in backend.posts] == ["/sm/save_batch"] + ["/sm/save"] * 3
+    assert outbox.batch_url is None and outbox.pending() == []
+
+
+def test_worker_survives_a_report_vanishing_from_the_spool(backend, spool, monkeypatch):
+    outbox = ReportOutbox(f"{backend.url}/sm/save", "key", spool_dir=spool)
+    path = outbox.enqueue(_report("sess_gone"))
+    real_stat = os.stat
+    def stat_after_removal(p, *args, **kwargs):
+        if p == path: os.remove(p)  # another outbox sent it between listdir and stat
+        return real_stat(p, *args, **kwargs)
+    with monkeypatch.context() as patch:
+        patch.setattr(os, "stat", stat_after_removal)
+        assert outbox.pending() == []
+    outbox.start(); outbox.enqueue(_report("sess_next"))
+    assert outbox.flush(timeout=10.0)
+    assert outbox.close() == 0
+    assert [body["serverInput"]["session_id"] for _, _, body in backend.posts] == ["sess_next"]
+
+
+@pytest.mark.parametrize("status", [401, 403, 404])
+def test_auth_and_missing_endpoint_errors_keep_reports_spooled(backend, spool, status):
+    backend.statuses = [status]
+    outbox = ReportOutbox(f"{backend.url}/sm/save", "key", spool_dir=spool)
+    outbox.enqueue(_report("sess_a"))
+    assert outbox.flush_once() is False
+    assert os.listdir(os.path.join(spool, FAILED_DIR_NAME)) == []
+    assert outbox.flush_once() is True  # the key was fixed; the same report goes through
+    assert outbox.pending() == [] and outbox.sent == 1
+
+
+def test_unauthorized_batch_is_not_split_or_set_aside(backend, spool):
+    backend.statuses = [401]
+    outbox = ReportOutbox(f"{backend.url}/sm/save", "key", batch_url=f"{backend.url}/sm/save_batch", spool_dir=spool)
+    for i in range(3): outbox.enqueue(_report(f"sess_{i}"))
+    assert outbox.flush_once() is False
+    assert [path for path, _, _ in backend.posts] == ["/sm/save_batch"]
+    assert len(outbox.pending()) == 3 and os.listdir(os.path.join(spool, FAILED_DIR_NAME)) == []
@@ -0,0 +1,109 @@
+import io
+import itertools
+import os
+import random
+
+import pytest
+
+import game_engine
+from keyboard_input import KeyboardInput, KeyEvent
+from renderer import Renderer
+from session_io import RecordingIO, ReplayDivergence, SessionIO, load_recording, recording_enabled, replay_recording, save_recording
+
+LEVEL = {"meta": {"player_id": "p1"}, "knobs": {"enemy_count": 3}, "content": {"title": "Test Spire", "scenes": [
+    {"intro_text": "A riddle.", "challenge": {"type": "RIDDLE", "riddle_text": "What has cities but no houses?", "answer": "map", "hint_text": "Paper.", "time_limit": 30}},
+    {"intro_text": "A chasm.", "challenge": {"type": "JUMP_CHASM", "success_chance": 0.5}},
+    {"intro_text": "A guard.", "challenge": {"type": "QTE", "key": "s", "presses": 5, "time_limit": 2}},
+    {"intro_text": "A fork.", "challenge": {"type": "DILEMMA", "options": ["Fight", "Sneak"]}},
+]}}
+
+
+class _Discard:
+    def write(self, text): pass
+    def flush(self): pass
+    def isatty(self): return False
+
+
+class _ScriptedKeyboard:
+    def __init__(self, io):
+        self.io = io
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    async def next_event(self, deadline=None):
+        self.io.clock += self.io.rng.expovariate(4.0)
+        return None if self.io.clock > deadline else KeyEvent("S", self.io.clock)
+
+
+class ScriptedIO(SessionIO):
+    """A player with a fake clock: cycles through `answers` and mashes S at a random pace."""
+
+    def __init__(self, answers, seed=5):
+        self.out = Renderer(stream=_Discard(), instant=True, allow_skip=False)
+        self.answers = itertools.cycle(answers); self.rng = random.Random(seed); self.clock = 1000.0
+
+    async def line(self, prompt=""):
+        self.clock += self.rng.random() * 3
+        return next(self.answers)
+
+    def keyboard(self):
+        return _ScriptedKeyboard(self)
+
+    def now(self):
+        self.clock += 0.001
+        return self.clock
+
+    async def sleep(self, seconds):
+        self.clock += seconds
+
+
+@pytest.fixture
+def recording(tmp_path):
+    io = RecordingIO(ScriptedIO(["wrong", "y", "map", "", "1", "", "map"]))
+    state = game_engine.play_game("p1", LEVEL, game_engine.GAME_CONTEXT, io=io, seed=11, submit=False)
+    assert state.run_outcome["result"] == "win"
+    return load_recording(save_recording(state, game_engine.compile_level(LEVEL), str(tmp_path)))
+
+
+def test_recorded_session_replays_exactly(recording):
+    state, mismatches = replay_recording(recording)
+    assert mismatches == []
+    assert state.stats == recording["result"]["stats"] and state.events.digest() == recording["result"]["events_digest"]
+
+
+def test_replay_is_deterministic_across_runs(recording):
+    first, _ = replay_recording(recording)
+    second, _ = replay_recording(recording)
+    assert (first.stats, first.events.digest(), first.run_outcome) == (second.stats, second.events.digest(), second.run_outcome)
+
+
+def test_a_truncated_tape_raises(recording):
+    with pytest.raises(ReplayDivergence):
+        replay_recording({**recording, "tape": recording["tape"][:len(recording["tape"]) // 2]})
+
+
+def test_recording_is_opt_in(monkeypatch):
+    monkeypatch.delenv("CHRONICLE_RECORD", raising=False)
+    assert not recording_enabled([])
+    assert recording_enabled(["level.json", "--record"])
+    monkeypatch.setenv("CHRONICLE_RECORD", "1")
+    assert recording_enabled([])
+
+
+def test_typewriter_skip_keeps_other_keys_for_the_session(monkeypatch):
+    reader, writer = os.pipe()
+    with open(reader, "rb", buffering=0) as stream, KeyboardInput(stream=stream) as keyboard:
+        os.write(writer, b"q"); keyboard.poll(1.0)       # typed before the text started
+        os.write(writer, b"a ")                          # typed while it animates; the space skips
+        out = io.StringIO()
+        renderer = Renderer(stream=out, instant=False)
+        monkeypatch.setattr(renderer, "_keyboard", lambda: keyboard)
+        renderer.session_keyboard = keyboard
+        renderer.typewriter("A long line of text.", delay=0.05)
+        assert out.getvalue() == "A long line of text.\n"
+        assert [event.key for event in keyboard.events] == ["Q", "A"]
+    os.close(writer)
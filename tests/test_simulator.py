@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+import game_engine
+from level_compiler import compile_challenge, compile_level
+from simulator import FINAL_BOSS, POLICIES, BotIO, SimState, simulate_batch, simulate_challenge, simulate_run
+
+LEVEL = {"meta": {"player_id": "p1"}, "knobs": {}, "content": {"title": "t", "scenes": [
+    {"intro_text": "a", "challenge": {"type": "RIDDLE", "riddle_text": "r", "answer": "map", "hint_text": "h", "time_limit": 30}},
+    {"intro_text": "b", "challenge": {"type": "JUMP_CHASM", "success_chance": "0.8"}},
+    {"intro_text": "c", "challenge": {"type": "QTE", "key": "s", "presses": 6, "time_limit": 2.0}},
+    {"intro_text": "d", "challenge": {"type": "SEQUENCE_MEMORY", "sequence": ["A", "B", "C", "D"]}},
+    {"intro_text": "e", "challenge": {"type": "DILEMMA", "options": ["Fight", "Sneak"]}},
+    {"intro_text": "f", "challenge": {"type": "FIND_COLLECTIBLE", "description": "A coin."}},
+]}}
+
+
+class _BotChallenge:
+    """Stands in for a compiled challenge inside play_game, feeding the bot's input before it runs."""
+
+    def __init__(self, challenge, policy):
+        self.challenge = challenge; self.policy = policy; self.type = challenge.type
+
+    async def run(self, state):
+        return simulate_challenge(state, self.challenge, self.policy)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_simulated_runs_match_the_engine(seed, monkeypatch):
+    policy = POLICIES['novice']
+    level = compile_level(LEVEL)
+    for scene in level.scenes: scene.challenge = _BotChallenge(scene.challenge, policy)
+    async def boss(state, challenge): return simulate_challenge(state, compile_challenge(challenge), policy)
+    monkeypatch.setattr(game_engine, "run_challenge", boss)
+    state = game_engine.play_game("p1", level, game_engine.GAME_CONTEXT, io=BotIO(), seed=seed, submit=False)
+
+    simulated = simulate_run(compile_level(LEVEL), policy, random.Random(seed), max_attempts=1000)
+    engine_stats = {k: v for k, v in state.stats.items() if k != 'time_s'}
+    assert {k: v for k, v in simulated['stats'].items() if k != 'time_s'} == engine_stats
+    assert (simulated['result'], simulated['path']) == (state.run_outcome['result'], state.run_outcome['path'])
+    assert sum(simulated['deaths'].values()) == state.stats['deaths']
+
+
+def test_game_state_and_sim_state_play_a_challenge_alike():
+    for seed in range(20):
+        results = []
+        for state in (game_engine.GameState("p1", 1, seed=seed, io=BotIO()), SimState("p1", BotIO(), random.Random(seed))):
+            results.append((simulate_challenge(state, FINAL_BOSS, POLICIES['average']), state.stats))
+        assert results[0] == results[1]
+
+
+def test_batches_are_reproducible_for_a_seed():
+    first = simulate_batch(LEVEL, POLICIES['average'], runs=200, workers=1, seed=3)
+    second = simulate_batch(compile_level(LEVEL), POLICIES['average'], runs=200, workers=1, seed=3)
+    assert first['scenes'] == second['scenes'] and first['retry_distribution'] == second['retry_distribution']
+    assert first['scenes'][-1]['type'] == 'FINAL_BOSS' and first['scenes'][-1]['reached'] >= first['runs']
+
+
+def test_perfect_bot_only_dies_to_chance():
+    report = simulate_batch(LEVEL, POLICIES['perfect'], runs=50, workers=1, seed=1)
+    assert report['win_rate'] == 1.0
+    assert sum(scene['deaths'] for i, scene in enumerate(report['scenes']) if i != 1) == 0  # only the chasm is left to chance
+
+
+def test_types_without_a_bot_hook_are_rejected(monkeypatch):
+    monkeypatch.setitem(game_engine.CHALLENGE_TYPES, 'UNHOOKED', (lambda c: True, dict, lambda state, c: True))
+    level = {"content": {"scenes": [{"intro_text": "a", "challenge": {"type": "QTE", "key": "S", "presses": 1, "time_limit": 1}}, {"intro_text": "b", "challenge": {"type": "UNHOOKED"}}]}}
+    with pytest.raises(ValueError, match="UNHOOKED"):
+        simulate_batch(level, runs=1, workers=1)
@@ -0,0 +1,57 @@
+import glob
+import json
+import os
+import time
+
+import pytest
+
+import sm_logger
+from sm_logger import LogReader, LogWriter
+
+START = 1_700_000_000
+STATUSES = (200, 500, None)
+
+
+def _line(i):
+    entry = {"timestamp": time.strftime(sm_logger.TIMESTAMP_FORMAT, time.gmtime(START + i * 10)), "status_code": STATUSES[i % 3], "headers": None, "body": {"i": i}}
+    return json.dumps(entry) + "\n"
+
+
+@pytest.fixture
+def log_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(sm_logger, "GZIP_BLOCK_BYTES", 400)  # several gzip members per segment
+    path = str(tmp_path / "logs" / "sm_responses.log")
+    writer = LogWriter(max_bytes=2000)
+    for i in range(120):
+        writer.submit(path, _line(i))
+        if i % 10 == 9: writer.flush()  # one batch per ten entries, so rotations fall between them
+    writer.close()
+    return path
+
+
+def _ids(entries):
+    return [entry["body"]["i"] for entry in entries]
+
+
+def test_rotated_segments_are_gzip_members_with_sidecar_indexes(log_path):
+    segments = LogReader(log_path).segments()
+    assert len(segments) > 2 and all(path.endswith(".gz") for path in segments[:-1]) and segments[-1] == log_path
+    assert all(os.path.exists(f"{path}.idx") for path in segments[:-1])
+    assert _ids(LogReader(log_path).query()) == list(range(120))
+
+
+def test_query_by_time_and_status_across_segments(log_path):
+    reader = LogReader(log_path)
+    assert _ids(reader.query(since=START + 250, until=START + 900)) == list(range(25, 91))
+    assert _ids(reader.query(since=START + 250, until=START + 900, status=500)) == [i for i in range(25, 91) if i % 3 == 1]
+    assert _ids(reader.query(exclude_status=[200, 0])) == [i for i in range(120) if i % 3 == 1]
+    assert _ids(reader.query(since=START + 1000, limit=3)) == [100, 101, 102]
+    assert _ids(reader.query(until=START - 1)) == []
+
+
+def test_the_active_index_is_extended_as_the_log_grows(log_path):
+    reader = LogReader(log_path)
+    assert _ids(reader.query(since=START + 1190)) == [119]
+    with open(log_path, "a", encoding="utf-8") as fh: fh.write(_line(120))
+    assert _ids(reader.query(since=START + 1190)) == [119, 120]
+    assert len(glob.glob(f"{log_path}*.idx")) == len(reader.segments())
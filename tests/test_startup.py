@@ -0,0 +1,18 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("google.generativeai", "requests", "numpy")
+
+
+@pytest.mark.parametrize("module", ["game_engine", "prepare_level"])
+def test_importing_an_entry_module_leaves_heavy_dependencies_unloaded(module):
+    # A fresh interpreter: this test process has long since imported all three.
+    code = f"import json, sys, {module}; print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
@@ -0,0 +1,100 @@
+import io
+import json
+import threading
+
+import pytest
+
+import game_engine
+import tracing
+from keyboard_input import KeyEvent
+from renderer import Renderer
+from session_io import SessionIO
+
+LEVEL = {"meta": {"player_id": "p1"}, "knobs": {}, "content": {"title": "t", "scenes": [{"intro_text": "a", "challenge": {"type": "FIND_COLLECTIBLE", "description": "A coin."}}]}}
+
+
+@pytest.fixture
+def traced(tmp_path, monkeypatch):
+    """Tracing on, writing into `tmp_path`; switched off and forgotten afterwards."""
+    for name in ("_enabled", "_trace_path", "_metrics_path"): monkeypatch.setattr(tracing, name, getattr(tracing, name))
+    tracing.reset(); tracing.enable(str(tmp_path / "trace.json"), str(tmp_path / "metrics.prom"), metrics_interval=0)
+    yield tmp_path
+    tracing.reset()
+
+
+def test_spans_are_written_as_chrome_trace_events(traced):
+    with tracing.span("outer", level="l1"):
+        with tracing.span("inner") as inner: inner.set(bytes=42)
+    with pytest.raises(KeyError), tracing.span("failing"): raise KeyError("x")
+    def on_worker():
+        with tracing.span("on.worker"): pass
+    worker = threading.Thread(target=on_worker, name="worker-1")
+    worker.start(); worker.join()
+    tracing.flush()
+    with open(traced / "trace.json", encoding="utf-8") as f: document = json.load(f)
+    assert document["displayTimeUnit"] == "ms" and document["otherData"] == {"dropped_spans": 0}
+    spans = {event["name"]: event for event in document["traceEvents"] if event["ph"] == "X"}
+    assert set(spans) == {"outer", "inner", "failing", "on.worker"}
+    for event in spans.values(): assert {"ts", "dur", "pid", "tid", "args"} <= event.keys() and event["dur"] >= 0
+    outer, inner = spans["outer"], spans["inner"]
+    assert outer["args"] == {"level": "l1"} and inner["args"] == {"bytes": 42} and spans["failing"]["args"] == {"error": "KeyError"}
+    assert outer["ts"] <= inner["ts"] and inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"] and outer["tid"] == inner["tid"]
+    names = {event["tid"]: event["args"]["name"] for event in document["traceEvents"] if event["ph"] == "M" and event["name"] == "thread_name"}
+    assert names[spans["on.worker"]["tid"]] == "worker-1" and names[outer["tid"]] == threading.current_thread().name
+
+
+def test_counters_and_histograms_in_prometheus_text(traced):
+    tracing.count("sessions_total", result="win"); tracing.count("sessions_total", 2, result="win"); tracing.count("sessions_total", result="loss")
+    tracing.count("odd_labels_total", player='say "hi"\nback\\slash')
+    tracing.observe("press_seconds", 0.003); tracing.observe("press_seconds", 0.2); tracing.observe("press_seconds", 99.0)
+    tracing.flush()
+    lines = (traced / "metrics.prom").read_text(encoding="utf-8").splitlines()
+    assert lines == tracing.prometheus_text().splitlines()
+    assert "# TYPE chronicle_sessions_total counter" in lines
+    assert 'chronicle_sessions_total{result="loss"} 1' in lines and 'chronicle_sessions_total{result="win"} 3' in lines
+    assert 'chronicle_odd_labels_total{player="say \\"hi\\"\\nback\\\\slash"} 1' in lines
+    assert "# TYPE chronicle_press_seconds histogram" in lines
+    buckets = {line.split('le="')[1].split('"')[0]: int(line.rsplit(" ", 1)[1]) for line in lines if line.startswith("chronicle_press_seconds_bucket")}
+    assert len(buckets) == len(tracing.BUCKETS) + 1
+    assert (buckets["0.0025"], buckets["0.005"], buckets["0.1"], buckets["0.25"], buckets["60.0"], buckets["+Inf"]) == (0, 1, 1, 2, 2, 3)
+    assert "chronicle_press_seconds_count 3" in lines and "chronicle_press_seconds_sum 99.203" in lines
+
+
+class _PlayerIO(SessionIO):
+    """Answers prompts from `lines` (EOF once they run out) and mashes S every 10 ms of a fake clock."""
+
+    def __init__(self, lines):
+        self.out = Renderer(stream=io.StringIO(), instant=True, allow_skip=False)
+        self.lines = list(lines); self.clock = 0.0
+
+    async def line(self, prompt=""):
+        if not self.lines: raise EOFError
+        return self.lines.pop(0)
+
+    def keyboard(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    async def next_event(self, deadline=None):
+        self.clock += 0.01
+        return KeyEvent("S", self.clock)
+
+    def now(self):
+        return self.clock
+
+    async def sleep(self, seconds):
+        self.clock += seconds
+
+
+def test_every_session_outcome_is_counted(traced):
+    assert game_engine.play_game("p1", LEVEL, game_engine.GAME_CONTEXT, io=_PlayerIO([""]), submit=False).run_outcome["result"] == "win"
+    with pytest.raises(EOFError):
+        game_engine.play_game("p1", LEVEL, game_engine.GAME_CONTEXT, io=_PlayerIO([]), submit=False)
+    lines = tracing.prometheus_text().splitlines()
+    assert 'chronicle_sessions_total{result="win"} 1' in lines and 'chronicle_sessions_total{result="loss"} 1' in lines
+    assert 'chronicle_challenges_total{result="pass",type="FINAL_BOSS"} 1' in lines
@@ -0,0 +1,224 @@
+# FILE: tracing.py (Timing spans, counters and histograms for level prep and gameplay)
+
+"""Low-overhead instrumentation.
+
+``span(name, **attrs)`` times a block; spans opened inside it on the same thread nest under it;
+``count`` and ``observe`` feed labelled counters and histograms, and every span also lands in the
+``span_duration_seconds`` histogram. Until tracing is enabled all three return immediately (``span``
+hands back one shared no-op object), so instrumented code pays a global lookup and a call.
+
+Enable it with environment variables, read once when this module is imported, or with ``enable``:
+
+    CHRONICLE_TRACE=trace.json      Chrome trace-event JSON; open in https://ui.perfetto.dev or
+                                    chrome://tracing for a per-thread timeline / flame view
+    CHRONICLE_METRICS=metrics.prom  Prometheus text exposition format (node_exporter textfile style)
+
+Both files are rewritten atomically by ``flush()``, which runs at exit and may be called any time;
+the metrics file is also refreshed every ``CHRONICLE_METRICS_INTERVAL`` seconds (default 15) so a
+long-running process such as ``game_server.py`` can be scraped while it runs.
+
+    with span("llm.generate", model=name) as s:
+        ...; s.set(bytes=len(text))
+    count("personas_total", source="cache")
+    observe("qte_press_interval_seconds", gap)
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+TRACE_VARIABLE = "CHRONICLE_TRACE"
+METRICS_VARIABLE = "CHRONICLE_METRICS"
+INTERVAL_VARIABLE = "CHRONICLE_METRICS_INTERVAL"
+DEFAULT_METRICS_INTERVAL = 15.0
+METRIC_PREFIX = "chronicle_"
+MAX_TRACE_EVENTS = 200_000  # later spans still reach the metrics, just not the trace file
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled = False
+_trace_path = None
+_metrics_path = None
+_origin_ns = time.perf_counter_ns()
+_events = []
+_dropped = 0
+_counters = {}     # (name, labels) -> value
+_histograms = {}   # (name, labels) -> [bucket counts..., +Inf count, sum]
+_thread_names = {}
+_flusher = None
+_lock = threading.Lock()
+
+
+class _NoopSpan:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc_info): return False
+    def set(self, **attrs): pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "started_ns")
+
+    def __init__(self, name, attrs):
+        self.name = name; self.attrs = attrs; self.started_ns = 0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.started_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended_ns = time.perf_counter_ns()
+        if exc_type is not None: self.attrs["error"] = exc_type.__name__
+        _record_span(self, ended_ns)
+        return False
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _observe(key, value):
+    histogram = _histograms.get(key)
+    if histogram is None: histogram = _histograms[key] = [0] * (len(BUCKETS) + 2) + [0.0]
+    histogram[bisect_left(BUCKETS, value)] += 1  # index len(BUCKETS) is the +Inf bucket
+    histogram[-2] += 1; histogram[-1] += value
+
+
+def _record_span(span, ended_ns):
+    global _dropped
+    duration_ns = ended_ns - span.started_ns
+    thread = threading.current_thread()
+    with _lock:
+        _observe(("span_duration_seconds", (("span", span.name),)), duration_ns / 1e9)
+        if len(_events) < MAX_TRACE_EVENTS:
+            _events.append({"name": span.name, "ph": "X", "ts": (span.started_ns - _origin_ns) / 1000, "dur": duration_ns / 1000, "pid": os.getpid(), "tid": thread.ident, "args": span.attrs})
+            _thread_names[thread.ident] = thread.name
+        else:
+            _dropped += 1
+
+
+# --- Public API ---
+def span(name, **attrs):
+    """A context manager timing the enclosed block as `name`; a shared no-op while tracing is off."""
+    if not _enabled: return _NOOP
+    return Span(name, attrs)
+
+
+def count(name, amount=1, **labels):
+    """Add `amount` to the counter `name` with `labels`."""
+    if not _enabled: return
+    key = (name, _labels(labels))
+    with _lock: _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, **labels):
+    """Record `value` (seconds, bytes, ...) in the histogram `name` with `labels`."""
+    if not _enabled: return
+    with _lock: _observe((name, _labels(labels)), value)
+
+
+def enabled():
+    return _enabled
+
+
+def enable(trace_path=None, metrics_path=None, metrics_interval=DEFAULT_METRICS_INTERVAL):
+    """Start collecting; `flush()` (and process exit) writes whichever of the two files were given."""
+    global _enabled, _trace_path, _metrics_path, _flusher
+    _trace_path = trace_path or _trace_path; _metrics_path = metrics_path or _metrics_path
+    if not _enabled: atexit.register(flush)
+    _enabled = True
+    if _metrics_path and metrics_interval and _flusher is None:
+        _flusher = threading.Thread(target=_refresh_metrics, args=(metrics_interval,), name="metrics-flush", daemon=True); _flusher.start()
+
+
+def _refresh_metrics(interval):
+    while True:
+        time.sleep(interval)
+        if _enabled:
+            try: _write(_metrics_path, prometheus_text())
+            except OSError: pass
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    """Forget everything collected so far."""
+    global _dropped
+    with _lock: _events.clear(); _counters.clear(); _histograms.clear(); _thread_names.clear(); _dropped = 0
+
+
+# --- Export ---
+def _metric_name(name):
+    return METRIC_PREFIX + "".join(c if c.isalnum() else "_" for c in name)
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs: return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def prometheus_text():
+    """Every counter and histogram in the Prometheus text exposition format."""
+    with _lock: counters = dict(_counters); histograms = {key: list(value) for key, value in _histograms.items()}
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} counter")
+        lines.extend(f"{metric}{_label_text(labels)} {value}" for (n, labels), value in sorted(counters.items()) if n == name)
+    for name in sorted({name for name, _ in histograms}):
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} histogram")
+        for (n, labels), histogram in sorted(histograms.items()):
+            if n != name: continue
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, histogram):
+                cumulative += bucket
+                lines.append(f"{metric}_bucket{_label_text(labels, [('le', repr(bound))])} {cumulative}")
+            lines.append(f"{metric}_bucket{_label_text(labels, [('le', '+Inf')])} {histogram[-2]}")
+            lines.append(f"{metric}_sum{_label_text(labels)} {histogram[-1]!r}")
+            lines.append(f"{metric}_count{_label_text(labels)} {histogram[-2]}")
+    return "\n".join(lines) + "\n"
+
+
+def trace_document():
+    """Spans so far as a Chrome trace-event document, with thread names for the timeline."""
+    with _lock: events = list(_events); names = dict(_thread_names); dropped = _dropped
+    pid = os.getpid()
+    metadata = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}} for tid, name in names.items()]
+    return {"traceEvents": metadata + events, "displayTimeUnit": "ms", "otherData": {"dropped_spans": dropped}}
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f: f.write(text)
+    os.replace(tmp_path, path)
+
+
+def flush():
+    """Write the trace and metrics files configured for this process."""
+    try:
+        if _trace_path: _write(_trace_path, json.dumps(trace_document(), default=str))
+        if _metrics_path: _write(_metrics_path, prometheus_text())
+    except OSError as e:
+        print(f"TRACING ERROR: Could not write trace/metrics files. Error: {e}")
+
+
+if os.getenv(TRACE_VARIABLE) or os.getenv(METRICS_VARIABLE):
+    enable(os.getenv(TRACE_VARIABLE), os.getenv(METRICS_VARIABLE), float(os.getenv(INTERVAL_VARIABLE) or DEFAULT_METRICS_INTERVAL))